@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Benchmarks of the matcher.
+
+Time the compilation of every query type, the validators on large author
+lists and ``match`` end to end against a fake search client replaying
+canned responses, and write the results as JSON so that runs can be
+compared over time::
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+import mock
+from flask import Flask
+from invenio_search import InvenioSearch
+
+import inspire_matcher
+from inspire_matcher import InspireMatcher
+from inspire_matcher.api import match, match_batch
+from inspire_matcher.core import (
+    _authors_query_cache,
+    _compile_authors_query,
+    _compile_exact,
+    _compile_fuzzy,
+    _compile_nested,
+    _compile_nested_prefix,
+    compile,
+)
+from inspire_matcher.templates import QueryTemplate
+from inspire_matcher.validators import authors_titles_validator
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+
+LAST_NAMES = [
+    "Smith",
+    "Garcia",
+    "Mueller",
+    "Rossi",
+    "Wang",
+    "Li",
+    "Kim",
+    "Novak",
+    "Dubois",
+    "Ivanov",
+]
+
+BENCHMARKS = []
+
+
+def benchmark(name, number):
+    """Register a benchmark.
+
+    The decorated function takes the application, does the setup and
+    returns the callable to time, which is called ``number`` times per
+    repetition.
+    """
+
+    def decorator(func):
+        BENCHMARKS.append((name, number, func))
+        return func
+
+    return decorator
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+def generate_authors(count, seed):
+    generator = random.Random(seed)
+    return [
+        {
+            "full_name": "%s%d, %s."
+            % (
+                generator.choice(LAST_NAMES),
+                i % 500,
+                chr(ord("A") + generator.randrange(26)),
+            ),
+        }
+        for i in range(count)
+    ]
+
+
+class FakeSearchClient(object):
+    """A search client replaying canned responses in a loop."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = 0
+
+    def search(self, **kwargs):
+        response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return response
+
+    def msearch(self, body, **kwargs):
+        return {"responses": [self.search() for _ in body[1::2]]}
+
+
+@benchmark("compile.exact", number=10000)
+def bench_compile_exact(app):
+    query = {
+        "path": "arxiv_eprints.value",
+        "search_path": "arxiv_eprints.value.raw",
+        "type": "exact",
+    }
+    record = load_fixture("harvest_record_1601.02340.json")
+    return lambda: _compile_exact(query, record)
+
+
+@benchmark("compile.fuzzy", number=10000)
+def bench_compile_fuzzy(app):
+    query = {
+        "clauses": [
+            {"boost": 20, "path": "abstracts"},
+            {"boost": 20, "path": "titles"},
+            {"boost": 10, "path": "authors[:3]"},
+        ],
+        "type": "fuzzy",
+    }
+    record = load_fixture("harvest_record_1712.05946.json")
+    return lambda: _compile_fuzzy(query, record)
+
+
+@benchmark("compile.nested", number=10000)
+def bench_compile_nested(app):
+    query = {
+        "paths": ["first_name", "last_name"],
+        "search_paths": ["authors.first_name", "authors.last_name"],
+        "type": "nested",
+        "inner_hits": {"_source": ["authors.full_name"]},
+    }
+    record = {"first_name": "Juan Martin", "last_name": "Maldacena"}
+    return lambda: _compile_nested(query, record)
+
+
+@benchmark("compile.nested-prefix", number=10000)
+def bench_compile_nested_prefix(app):
+    query = {
+        "paths": ["first_name", "last_name"],
+        "search_paths": ["authors.first_name", "authors.last_name"],
+        "prefix_search_path": "authors.first_name",
+        "type": "nested-prefix",
+    }
+    record = {"first_name": "J", "last_name": "Maldacena"}
+    return lambda: _compile_nested_prefix(query, record)
+
+
+@benchmark("compile.author-names", number=2000)
+def bench_compile_authors_query(app):
+    query = {"type": "author-names", "inner_hits": {"_source": ["authors"]}}
+    record = {"full_name": "Maldacena, Juan Martin"}
+    return lambda: _compile_authors_query(query, record)
+
+
+@benchmark("compile.author-names.cold", number=2000)
+def bench_compile_authors_query_cold(app):
+    query = {"type": "author-names", "inner_hits": {"_source": ["authors"]}}
+    record = {"full_name": "Maldacena, Juan Martin"}
+
+    def compile_without_cache():
+        _authors_query_cache.clear()
+        return _compile_authors_query(query, record)
+
+    return compile_without_cache
+
+
+@benchmark("compile.filters", number=10000)
+def bench_compile_with_filters(app):
+    query = {
+        "path": "dois.value",
+        "search_path": "dois.value.raw",
+        "type": "exact",
+    }
+    record = {"dois": [{"value": "10.1103/PhysRevD.93.063518"}]}
+    return lambda: compile(query, record, collections=["Literature", "HAL Hidden"])
+
+
+@benchmark("compile.template.filters", number=10000)
+def bench_fill_template_with_filters(app):
+    query = {
+        "path": "dois.value",
+        "search_path": "dois.value.raw",
+        "type": "exact",
+    }
+    record = {"dois": [{"value": "10.1103/PhysRevD.93.063518"}]}
+    template = QueryTemplate(query, collections=["Literature", "HAL Hidden"])
+    return lambda: template.fill(record)
+
+
+@benchmark("compile.template.fuzzy", number=10000)
+def bench_fill_template_fuzzy(app):
+    query = {
+        "clauses": [
+            {"boost": 20, "path": "abstracts"},
+            {"boost": 20, "path": "titles"},
+            {"boost": 10, "path": "authors[:3]"},
+        ],
+        "type": "fuzzy",
+    }
+    record = load_fixture("harvest_record_1712.05946.json")
+    template = QueryTemplate(query)
+    return lambda: template.fill(record)
+
+
+def _bench_authors_titles_validator(count):
+    record = {
+        "authors": generate_authors(count, seed=1),
+        "titles": [{"title": "Search for new phenomena in dijet events"}],
+    }
+    result = {
+        "_source": {
+            "authors": generate_authors(count, seed=2),
+            "titles": [{"title": "Search for new phenomena in dijet events at 13 TeV"}],
+        },
+    }
+    return lambda: authors_titles_validator(record, result)
+
+
+@benchmark("validators.authors_titles.10", number=100)
+def bench_authors_titles_validator_10(app):
+    return _bench_authors_titles_validator(10)
+
+
+@benchmark("validators.authors_titles.100", number=5)
+def bench_authors_titles_validator_100(app):
+    return _bench_authors_titles_validator(100)
+
+
+@benchmark("validators.authors_titles.300", number=1)
+def bench_authors_titles_validator_300(app):
+    return _bench_authors_titles_validator(300)
+
+
+@benchmark("validators.authors_titles.3000", number=5)
+def bench_authors_titles_validator_3000(app):
+    return _bench_authors_titles_validator(3000)
+
+
+def _bench_match(app, config, records, responses, batch=False):
+    client = FakeSearchClient(responses)
+
+    def run():
+        with app.app_context(), mock.patch("inspire_matcher.api.es", client):
+            if batch:
+                for _ in match_batch(records, config):
+                    pass
+            else:
+                for record in records:
+                    for _ in match(record, config):
+                        pass
+
+    return run
+
+
+def _get_hits():
+    return {
+        "took": 1,
+        "hits": {
+            "hits": [
+                load_fixture("matching_result_1601.02340.json"),
+                load_fixture("matching_result_2654944.json"),
+            ],
+        },
+    }
+
+
+def _get_records():
+    return [
+        load_fixture("harvest_record_1601.02340.json"),
+        load_fixture("harvest_record_1712.05946.json"),
+        load_fixture("harvest_record_1804.09082.json"),
+        load_fixture("harvest_record_2654944.json"),
+    ]
+
+
+@benchmark("match.default", number=200)
+def bench_match_default(app):
+    config = app.config["MATCHER_DEFAULT_CONFIGURATION"]
+    return _bench_match(app, config, _get_records(), [_get_hits()])
+
+
+@benchmark("match.fuzzy", number=200)
+def bench_match_fuzzy(app):
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "clauses": [
+                            {"boost": 20, "path": "abstracts"},
+                            {"boost": 20, "path": "titles"},
+                            {"boost": 10, "path": "authors[:3]"},
+                        ],
+                        "type": "fuzzy",
+                    },
+                ],
+                "validator": "inspire_matcher.validators:authors_titles_validator",
+            },
+        ],
+        "index": "records-hep",
+        "source": ["control_number", "titles", "authors"],
+    }
+    return _bench_match(app, config, _get_records(), [_get_hits()])
+
+
+@benchmark("match_batch.default", number=200)
+def bench_match_batch_default(app):
+    config = app.config["MATCHER_DEFAULT_CONFIGURATION"]
+    return _bench_match(app, config, _get_records(), [_get_hits()], batch=True)
+
+
+def create_app():
+    app = Flask(__name__)
+    InvenioSearch(app)
+    InspireMatcher(app)
+    return app
+
+
+def get_commit():
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__)
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode("ascii").strip()
+
+
+def run_benchmarks(app, repeat, pattern=None):
+    results = {}
+    for name, number, func in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+
+        stmt = func(app)
+        timings = sorted(
+            timing / number
+            for timing in timeit.Timer(stmt).repeat(repeat=repeat, number=number)
+        )
+        results[name] = {
+            "number": number,
+            "repeat": repeat,
+            "min": timings[0],
+            "median": timings[len(timings) // 2],
+            "mean": sum(timings) / len(timings),
+        }
+        print("%-40s %12.3f us" % (name, timings[0] * 1e6))
+
+    return results
+
+
+def compare(previous, current):
+    print()
+    print("%-40s %12s %12s %8s" % ("benchmark", "previous", "current", "ratio"))
+    for name in sorted(current):
+        if name not in previous:
+            continue
+        before, after = previous[name]["min"], current[name]["min"]
+        print(
+            "%-40s %9.3f us %9.3f us %7.2fx"
+            % (name, before * 1e6, after * 1e6, after / before)
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="compare with the results in this file")
+    parser.add_argument("--filter", help="only run the benchmarks containing this")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(create_app(), args.repeat, args.filter)
+    report = {
+        "metadata": {
+            "version": inspire_matcher.__version__,
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], results)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
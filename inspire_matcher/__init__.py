@@ -22,7 +22,12 @@
 
 from __future__ import absolute_import, division, print_function
 
-from inspire_matcher.api import match  # noqa: F401
+from inspire_matcher.api import (  # noqa: F401
+    match,
+    match_authors,
+    match_batch,
+    match_references,
+)
 from inspire_matcher.ext import InspireMatcher  # noqa: F401
 
 __version__ = "9.0.47"
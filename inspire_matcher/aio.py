@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Asynchronous matcher API.
+
+The functions in this module are the ``asyncio`` counterparts of
+:func:`inspire_matcher.api.match`, :func:`inspire_matcher.api.match_batch` and
+:func:`inspire_matcher.api.match_authors`.
+They share the compilation and validation logic with them, and only differ
+in sending the queries through an asynchronous search client.
+
+The default client is built by the extension for each event loop, and needs
+the optional dependencies of the asynchronous client of the search engine,
+installed with the ``opensearch2-async``, ``opensearch3-async`` or
+``elasticsearch7-async`` extra. The functions never close the client: the
+caller closes the default one, ``current_async_search_client``, before
+closing its event loop.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+from collections import deque
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from inspire_matcher.api import (
+    _ChunkMatch,
+    _get_plan,
+    _get_stored_result,
+    _HitFilter,
+    _iter_chunks,
+    _iter_searches,
+    _Recorder,
+    _store_result,
+    _timer,
+)
+from inspire_matcher.config import (
+    MATCHER_AUTHORS_CHUNK_SIZE,
+)
+
+
+def _get_current_async_search_client():
+    return current_app.extensions["inspire-matcher"].async_search_client
+
+
+current_async_search_client = LocalProxy(_get_current_async_search_client)
+
+
+async def _search(client, search):
+    start = _timer()
+    result = _get_stored_result(search, start)
+    if result is None:
+        result = await client.search(**search.query_config)
+        _store_result(search, result, start)
+    return result
+
+
+async def _iter_results(client, searches):
+    for search in searches:
+        yield search, await _search(client, search)
+
+
+async def _iter_parallel_results(client, searches):
+    window = current_app.config["MATCHER_PARALLEL_WORKERS"]
+
+    pending = deque()
+    try:
+        for search in searches:
+            task = asyncio.ensure_future(_search(client, search))
+            pending.append((search, task))
+            if len(pending) >= window:
+                search, task = pending.popleft()
+                yield search, await task
+
+        while pending:
+            search, task = pending.popleft()
+            yield search, await task
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+async def amatch(record, config=None, client=None):
+    """Asynchronous version of :func:`inspire_matcher.api.match`.
+
+    Args:
+        record (dict): the record to match.
+        config (dict): the matcher configuration, as in
+            :func:`inspire_matcher.api.match`.
+        client: an asynchronous search client. Defaults to the one built
+            from the ``SEARCH_HOSTS`` and ``SEARCH_CLIENT_CONFIG`` of the app.
+
+    Yields:
+        dict: the valid hits, in the same order as
+            :func:`inspire_matcher.api.match`. With a ``parallel``
+            configuration, the queries are sent concurrently as tasks of the
+            running event loop instead of on a thread pool.
+    """
+    plan = _get_plan(config)
+    if client is None:
+        client = current_async_search_client
+
+    hit_filter = _HitFilter(record, plan)
+    recorder = _Recorder(plan)
+    searches = _iter_searches(record, plan)
+    if plan.parallel:
+        results = _iter_parallel_results(client, searches)
+    else:
+        results = _iter_results(client, searches)
+
+    try:
+        async for search, result in results:
+            valid_hits = hit_filter.get_valid_hits(result, search)
+            recorder.record(search)
+            for hit in valid_hits:
+                yield hit
+            if hit_filter.done:
+                return
+    finally:
+        await results.aclose()
+        recorder.flush()
+        recorder.record_match(hit_filter.count)
+
+
+async def amatch_batch(records, config=None, chunk_size=None, client=None):
+    """Asynchronous version of :func:`inspire_matcher.api.match_batch`.
+
+    Args:
+        records (iterable(dict)): the records to match.
+        config (dict): the matcher configuration, as in
+            :func:`inspire_matcher.api.match`.
+        chunk_size (int): how many records to match per ``_msearch``
+            request. Defaults to ``MATCHER_BATCH_CHUNK_SIZE``.
+        client: an asynchronous search client. Defaults to the one built
+            from the ``SEARCH_HOSTS`` and ``SEARCH_CLIENT_CONFIG`` of the app.
+
+    Yields:
+        tuple(dict, list): each record together with its valid hits, as in
+            :func:`inspire_matcher.api.match_batch`.
+    """
+    plan = _get_plan(config)
+    if client is None:
+        client = current_async_search_client
+
+    for chunk in _iter_chunks(records, chunk_size):
+        chunk_match = _ChunkMatch(chunk, plan)
+        request = chunk_match.next_request()
+        while request is not None:
+            chunk_match.add_responses(await client.msearch(body=request))
+            request = chunk_match.next_request()
+
+        for result in chunk_match.results():
+            yield result
+
+
+async def amatch_authors(authors, config, chunk_size=None, client=None):
+    """Asynchronous version of :func:`inspire_matcher.api.match_authors`.
+
+    Args:
+        authors (iterable(dict)): the authors of the paper.
+        config (dict): the matcher configuration, as in
+            :func:`inspire_matcher.api.match`.
+        chunk_size (int): how many authors to match per ``_msearch``
+            request. Defaults to ``MATCHER_AUTHORS_CHUNK_SIZE``.
+        client: an asynchronous search client. Defaults to the one built
+            from the ``SEARCH_HOSTS`` and ``SEARCH_CLIENT_CONFIG`` of the app.
+
+    Returns:
+        list(list(dict)): the valid hits of each author, at the index of the
+            author in ``authors``.
+    """
+    if chunk_size is None:
+        chunk_size = current_app.config.get(
+            "MATCHER_AUTHORS_CHUNK_SIZE", MATCHER_AUTHORS_CHUNK_SIZE
+        )
+
+    return [
+        hits
+        async for _, hits in amatch_batch(authors, config, chunk_size, client=client)
+    ]
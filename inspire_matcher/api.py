@@ -24,100 +24,857 @@
 
 from __future__ import absolute_import, division, print_function
 
+import time
+from collections import deque
+from itertools import islice
+
 from flask import current_app
+from inspire_utils.helpers import force_list
+from inspire_utils.record import get_value
 from invenio_search import current_search_client as es
 from invenio_search.utils import prefix_index
-from six import string_types
-from werkzeug.utils import import_string
 
-from inspire_matcher.core import compile
+from inspire_matcher.cache import make_cache_key
+from inspire_matcher.config import (
+    MATCHER_AUTHORS_CHUNK_SIZE,
+    MATCHER_BATCH_CHUNK_SIZE,
+    MATCHER_NEGATIVE_FILTER_MAX_AGE,
+    MATCHER_OPTIMIZE_QUERIES,
+    MATCHER_SNAPSHOT_MAX_AGE,
+)
+from inspire_matcher.context import RecordContext, call_validator
+from inspire_matcher.core import combine
+from inspire_matcher.optimizer import optimize
+from inspire_matcher.plan import get_match_plan
+from inspire_matcher.signals import (
+    match_executed,
+    query_executed,
+    references_matched,
+    request_executed,
+    step_executed,
+)
 
+_timer = getattr(time, "perf_counter", time.time)
 
-def _get_validator(validator_param):
-    if callable(validator_param):
-        return validator_param
 
-    try:
-        validator = import_string(validator_param)
-    except (KeyError, ImportError, AttributeError):
+def _get_plan(config):
+    if config is None:
         current_app.logger.debug(
-            "No validator provided. Falling back to the default validator."
+            "No configuration provided. Falling back to the default configuration."
         )
-        validator = import_string("inspire_matcher.validators:default_validator")
+        config = current_app.config["MATCHER_DEFAULT_CONFIGURATION"]
 
-    return validator
+    return get_match_plan(config)
 
 
-def match(record, config=None):
-    """Given a record, yield the records in INSPIRE most similar to it.
+def _get_validator_name(validator):
+    return getattr(validator, "__name__", repr(validator))
 
-    This method can be used to detect if a record that we are ingesting as a
-    submission or as an harvest is already present in the system, or to find
-    out which record a reference should be pointing to.
+
+class _Search(object):
+    """A query sent while matching a record, and its measurements.
+
+    The ``query_index`` is ``None`` when all the queries of the step are
+    combined in a single query. The ``request`` identifies the ``_msearch``
+    request the query was sent in, whose round trip is the ``search_time``
+    of all its queries. All times are in seconds.
     """
-    if config is None:
-        current_app.logger.debug(
-            "No configuration provided. Falling back to the default configuration."
+
+    def __init__(self, plan, step, query_index, body, compile_time):
+        self.plan = plan
+        self.step = step
+        self.query_index = query_index
+        self.query_config = dict(step.query_config, body=body)
+        self.compile_time = compile_time
+        self.lookup = None
+        self.cache_key = None
+        self.request = None
+        self.search_time = 0.0
+        self.took = None
+        self.cached = False
+        self.hits = 0
+        self.valid_hits = 0
+        self.accepted = {}
+        self.rejected = {}
+        self.validation_time = 0.0
+
+    def set_result(self, result, search_time, cached=False, request=None):
+        self.search_time = search_time
+        self.request = request
+        self.took = result.get("took")
+        self.cached = cached
+
+    def get_measurements(self):
+        return {
+            "config": self.plan.name,
+            "step": self.step.index,
+            "query": self.query_index,
+            "body": self.query_config["body"],
+            "compile_time": self.compile_time,
+            "search_time": self.search_time,
+            "took": self.took,
+            "cached": self.cached,
+            "batched": self.request is not None,
+            "hits": self.hits,
+            "valid_hits": self.valid_hits,
+            "accepted": dict(self.accepted),
+            "rejected": dict(self.rejected),
+            "validation_time": self.validation_time,
+        }
+
+
+class _Recorder(object):
+    """Send the ``query_executed`` and ``step_executed`` signals of a match."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self._app = current_app._get_current_object()
+        self._step = None
+        self._totals = None
+        self._request = None
+
+    def record(self, search):
+        if query_executed.receivers:
+            query_executed.send(self._app, **search.get_measurements())
+
+        if self._step is not search.step:
+            self.flush()
+            self._step = search.step
+            self._totals = {
+                "queries": 0,
+                "compile_time": 0.0,
+                "search_time": 0.0,
+                "took": 0,
+                "cached": 0,
+                "hits": 0,
+                "valid_hits": 0,
+                "accepted": {},
+                "rejected": {},
+                "validation_time": 0.0,
+            }
+
+        totals = self._totals
+        totals["queries"] += 1
+        totals["compile_time"] += search.compile_time
+        if search.request is None:
+            totals["search_time"] += search.search_time
+        elif search.request != self._request:
+            totals["search_time"] += search.search_time
+            self._request = search.request
+        totals["took"] += search.took or 0
+        totals["cached"] += 1 if search.cached else 0
+        totals["hits"] += search.hits
+        totals["valid_hits"] += search.valid_hits
+        totals["validation_time"] += search.validation_time
+        for key in ("accepted", "rejected"):
+            for name, count in getattr(search, key).items():
+                totals[key][name] = totals[key].get(name, 0) + count
+
+    def flush(self):
+        if self._step is None:
+            return
+
+        step_executed.send(
+            self._app, config=self.plan.name, step=self._step.index, **self._totals
+        )
+        self._step = None
+
+    def record_request(self, searches, search_time):
+        tooks = [search.took for search in searches if search.took is not None]
+        request_executed.send(
+            self._app,
+            config=self.plan.name,
+            step=searches[0].step.index,
+            queries=len(searches),
+            bodies=[search.query_config["body"] for search in searches],
+            search_time=search_time,
+            took=max(tooks) if tooks else None,
         )
-        config = current_app.config["MATCHER_DEFAULT_CONFIGURATION"]
 
+    def record_match(self, hits):
+        match_executed.send(self._app, config=self.plan.name, hits=hits)
+
+
+def _compile_query(step, record, j):
     try:
-        index = prefix_index(config["index"])
-        size = config.get("size", 10)
-        algorithm = config["algorithm"]
-        query_config = {"index": index, "size": size}
-    except KeyError as e:
-        raise KeyError("Malformed configuration: %s." % repr(e))
-
-    source = config.get("source", [])
-    if source:
-        query_config["_source"] = source
-    match_deleted = config.get("match_deleted", False)
-    collections = config.get("collections")
-    if not (
-        collections is None
-        or (
-            isinstance(collections, (list, tuple))
-            and all(isinstance(collection, string_types) for collection in collections)
+        return step.templates[j].fill(record)
+    except Exception as e:
+        raise ValueError(
+            "Malformed query. Query %d of step %d does not compile: %s."
+            % (j, step.index, repr(e))
+        )
+
+
+def _uses_snapshot(plan, step, query):
+    return (
+        step.snapshot
+        and query["type"] == "exact"
+        and not plan.collections
+        and not plan.match_deleted
+    )
+
+
+def _get_negative_filter(plan):
+    matcher = current_app.extensions.get("inspire-matcher")
+    negative_filter = getattr(matcher, "negative_filter", None)
+    if negative_filter is None or negative_filter.is_stale(
+        current_app.config.get(
+            "MATCHER_NEGATIVE_FILTER_MAX_AGE", MATCHER_NEGATIVE_FILTER_MAX_AGE
         )
     ):
-        raise ValueError(
-            "Malformed collections. Expected a list of strings bug got: %s"
-            % repr(collections)
+        return None
+    if prefix_index(negative_filter.index) != plan.query_config["index"]:
+        return None
+    return negative_filter
+
+
+def _is_absent(negative_filter, query, record):
+    if negative_filter is None or query["type"] != "exact":
+        return False
+
+    search_path = query["search_path"]
+    if not negative_filter.covers(search_path):
+        return False
+
+    values = force_list(get_value(record, query["path"]))
+    return not any(negative_filter.might_contain(search_path, v) for v in values)
+
+
+def _compile_step(plan, step, record):
+    negative_filter = _get_negative_filter(plan)
+    optimizes = current_app.config.get(
+        "MATCHER_OPTIMIZE_QUERIES", MATCHER_OPTIMIZE_QUERIES
+    )
+    if not step.combine_queries:
+        for j, query in enumerate(step.queries):
+            if _is_absent(negative_filter, query, record):
+                continue
+            start = _timer()
+            body = _compile_query(step, record, j)
+            if body and optimizes:
+                body = optimize(body)
+            if body:
+                search = _Search(plan, step, j, body, _timer() - start)
+                if _uses_snapshot(plan, step, query):
+                    search.lookup = (
+                        query["search_path"],
+                        force_list(get_value(record, query["path"])),
+                    )
+                yield search
+        return
+
+    start = _timer()
+    named_queries = []
+    for j, query in enumerate(step.queries):
+        if _is_absent(negative_filter, query, record):
+            continue
+        body = _compile_query(step, record, j)
+        if body:
+            named_queries.append((step.query_names[j], body))
+
+    body = combine(
+        named_queries, collections=plan.collections, match_deleted=plan.match_deleted
+    )
+    if body and optimizes:
+        body = optimize(body)
+    if body:
+        yield _Search(plan, step, None, body, _timer() - start)
+
+
+def _sort_by_matched_query(hits, step):
+    ranks = {name: j for j, name in enumerate(step.query_names)}
+
+    def _get_rank(hit):
+        return min(
+            [ranks.get(name, len(ranks)) for name in hit.get("matched_queries", [])]
+            or [len(ranks)]
+        )
+
+    return sorted(hits, key=_get_rank)
+
+
+def _get_hit_key(hit):
+    if "_id" in hit:
+        return hit["_id"]
+    return get_value(hit, "_source.control_number")
+
+
+class _HitFilter(object):
+    """Validate the hits returned while matching one record.
+
+    When the plan deduplicates hits, a hit that was already returned is
+    skipped before validation, and the verdict of each validator on each
+    hit is remembered for the rest of the match.
+
+    Once a ``stop_on_first_match`` or ``max_results`` limit is satisfied,
+    ``done`` is set and no further hits are returned.
+    """
+
+    def __init__(self, record, plan):
+        self.record = record
+        self.context = RecordContext(record)
+        self.deduplicate = plan.deduplicate
+        self.max_results = plan.max_results
+        self.done = False
+        self._returned = set()
+        self._verdicts = {}
+        self.count = 0
+        self._step_counts = {}
+
+    def get_valid_hits(self, result, search):
+        if self.done:
+            return []
+
+        step = search.step
+        hits = result["hits"]["hits"]
+        if step.combine_queries:
+            hits = _sort_by_matched_query(hits, step)
+
+        start = _timer()
+        valid_hits = []
+        for hit in hits:
+            search.hits += 1
+            if self._is_valid(hit, step.validators, search):
+                valid_hits.append(hit)
+                self.count += 1
+                self._step_counts[step.index] = self._step_counts.get(step.index, 0) + 1
+                if self._is_limit_reached(step):
+                    self.done = True
+                    break
+
+        if valid_hits and step.stop_on_first_match:
+            self.done = True
+
+        search.valid_hits += len(valid_hits)
+        search.validation_time += _timer() - start
+        return valid_hits
+
+    def _is_limit_reached(self, step):
+        if self.max_results is not None and self.count >= self.max_results:
+            return True
+        return (
+            step.max_results is not None
+            and self._step_counts[step.index] >= step.max_results
         )
 
-    for i, step in enumerate(algorithm):
+    def _is_valid(self, hit, validators, search):
+        key = _get_hit_key(hit) if self.deduplicate else None
+        if key is None:
+            verdicts = [
+                call_validator(validator, self.record, hit, self.context)
+                for validator in validators
+            ]
+        elif key in self._returned:
+            return False
+        else:
+            verdicts = [self._validate(key, hit, validator) for validator in validators]
+
+        for validator, verdict in zip(validators, verdicts):
+            name = _get_validator_name(validator)
+            verdicts_by_name = search.accepted if verdict else search.rejected
+            verdicts_by_name[name] = verdicts_by_name.get(name, 0) + 1
+
+        if not all(verdicts):
+            return False
+        if key is not None:
+            self._returned.add(key)
+        return True
+
+    def _validate(self, key, hit, validator):
         try:
-            queries = step["queries"]
+            return self._verdicts[key, validator]
         except KeyError:
-            raise KeyError("Malformed algorithm: step %d has no queries." % i)
+            verdict = call_validator(validator, self.record, hit, self.context)
+            self._verdicts[key, validator] = verdict
+            return verdict
 
-        if not isinstance(step.get("validator"), list):
-            validator_params = [step.get("validator")]
-        else:
-            validator_params = step.get("validator")
 
-        validators = []
-        for validator_param in validator_params:
-            validators.append(_get_validator(validator_param))
+def _iter_searches(record, plan):
+    for step in plan.steps:
+        for search in _compile_step(plan, step, record):
+            current_app.logger.debug(
+                "Sending ES query: %s" % repr(search.query_config["body"])
+            )
+            yield search
+
+
+def _get_result_cache(step):
+    if not step.cache:
+        return None
+
+    matcher = current_app.extensions.get("inspire-matcher")
+    return getattr(matcher, "result_cache", None)
+
+
+def _get_search_client():
+    client = current_app.config.get("MATCHER_SEARCH_CLIENT")
+    return es if client is None else client
+
+
+def _get_snapshot_result(search):
+    if search.lookup is None:
+        return None
+
+    matcher = current_app.extensions.get("inspire-matcher")
+    snapshot = getattr(matcher, "snapshot", None)
+    if snapshot is None or snapshot.is_stale(
+        current_app.config.get("MATCHER_SNAPSHOT_MAX_AGE", MATCHER_SNAPSHOT_MAX_AGE)
+    ):
+        return None
+
+    search_path, values = search.lookup
+    index = search.query_config["index"]
+    if (
+        search_path not in snapshot.search_paths
+        or prefix_index(snapshot.index) != index
+    ):
+        return None
+
+    # A value missing from the snapshot might belong to a record indexed
+    # after it was built, so only ES can tell whether it matches.
+    control_numbers = []
+    for value in values:
+        found = snapshot.lookup(search_path, value)
+        if not found:
+            return None
+        for control_number in found:
+            if control_number not in control_numbers:
+                control_numbers.append(control_number)
+    if not control_numbers:
+        return None
+
+    return {
+        "took": 0,
+        "hits": {
+            "total": {"value": len(control_numbers), "relation": "eq"},
+            "hits": [
+                {"_index": index, "_source": {"control_number": control_number}}
+                for control_number in control_numbers[: search.query_config["size"]]
+            ],
+        },
+    }
+
+
+def _get_stored_result(search, start):
+    """Return the result of a search from the snapshot or the result cache.
+
+    The searches that are not found have to be sent to ES, and their result
+    stored with :func:`_store_result`. These helpers are shared by the
+    synchronous and the asynchronous API, which only differ in the client
+    call between them.
+    """
+    result = _get_snapshot_result(search)
+    if result is None:
+        cache = _get_result_cache(search.step)
+        if cache is not None:
+            search.cache_key = make_cache_key(search.query_config)
+            result = cache.get(search.cache_key)
+
+    if result is not None:
+        search.set_result(result, _timer() - start, cached=True)
+    return result
 
-        for j, query in enumerate(queries):
-            try:
-                body = compile(
-                    query, record, collections=collections, match_deleted=match_deleted
+
+def _store_result(search, result, start):
+    search.set_result(result, _timer() - start)
+    if search.cache_key is not None:
+        _get_result_cache(search.step).set(search.cache_key, result)
+
+
+def _search(search):
+    start = _timer()
+    result = _get_stored_result(search, start)
+    if result is None:
+        result = _get_search_client().search(**search.query_config)
+        _store_result(search, result, start)
+    return result
+
+
+def _search_in_app_context(app, search):
+    with app.app_context():
+        return _search(search)
+
+
+def _iter_results(searches):
+    for search in searches:
+        yield search, _search(search)
+
+
+def _iter_parallel_results(searches):
+    app = current_app._get_current_object()
+    executor = app.extensions["inspire-matcher"].executor
+    window = app.config["MATCHER_PARALLEL_WORKERS"]
+
+    pending = deque()
+    try:
+        for search in searches:
+            future = executor.submit(_search_in_app_context, app, search)
+            pending.append((search, future))
+            if len(pending) >= window:
+                search, future = pending.popleft()
+                yield search, future.result()
+
+        while pending:
+            search, future = pending.popleft()
+            yield search, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+class _ChunkMatch(object):
+    """Match a chunk of records with one ``_msearch`` request per step.
+
+    This class does no I/O: the caller sends the requests returned by
+    :meth:`next_request` and feeds the responses back to
+    :meth:`add_responses`, so that it can be driven by both a synchronous
+    and an asynchronous search client.
+
+    When a ``responses`` dictionary is given, identical searches are only
+    sent once: the response of each search is stored in it under the
+    :func:`~inspire_matcher.cache.make_cache_key` of the search, and shared
+    with all the records of the chunk, or of the following chunks given the
+    same dictionary, that compile the same search. The number of searches
+    that were not sent is counted in ``saved``.
+    """
+
+    def __init__(self, records, plan, responses=None):
+        self.records = records
+        self.hits = [[] for _ in records]
+        self.saved = 0
+        self._hit_filters = [_HitFilter(record, plan) for record in records]
+
+        self._plan = plan
+        self._recorder = _Recorder(plan)
+        self._steps = iter(plan.steps)
+        self._unresolved = list(range(len(records)))
+        self._responses = responses
+        self._pending = None
+        self._sent_at = None
+        self._requests = 0
+        self._finished = False
+
+    def next_request(self):
+        """Return the body of the next ``_msearch`` request, if any."""
+        for step in self._steps:
+            if not self._unresolved:
+                break
+
+            cache = _get_result_cache(step)
+            requests, sent = [], {}
+            for position in self._unresolved:
+                for search in _compile_step(self._plan, step, self.records[position]):
+                    start = _timer()
+                    result = _get_snapshot_result(search)
+                    if result is not None:
+                        search.set_result(result, _timer() - start, cached=True)
+                        self._add_hits(position, result, search)
+                        continue
+
+                    key = None
+                    if cache is not None or self._responses is not None:
+                        start = _timer()
+                        key = make_cache_key(search.query_config)
+
+                    if self._responses is not None:
+                        if key in sent:
+                            requests[sent[key]][1].append((position, search))
+                            self.saved += 1
+                            continue
+                        result = self._responses.get(key)
+                        if result is not None:
+                            search.set_result(result, _timer() - start, cached=True)
+                            self._add_hits(position, result, search)
+                            self.saved += 1
+                            continue
+
+                    if cache is not None:
+                        result = cache.get(key)
+                        if result is not None:
+                            search.set_result(result, _timer() - start, cached=True)
+                            self._add_hits(position, result, search)
+                            continue
+
+                    sent[key] = len(requests)
+                    requests.append((key, [(position, search)]))
+
+            if not requests:
+                self._update_unresolved()
+                continue
+
+            current_app.logger.debug(
+                "Sending %d ES queries in one request for step %d."
+                % (len(requests), step.index)
+            )
+            self._pending = cache, requests
+            self._sent_at = _timer()
+            return _get_msearch_body([searches[0][1] for _, searches in requests])
+
+        self._finish()
+        return None
+
+    def add_responses(self, result):
+        """Validate the hits of the response to the last request."""
+        search_time = _timer() - self._sent_at
+        self._requests += 1
+        cache, requests = self._pending
+        for (key, searches), response in zip(requests, result["responses"]):
+            if "error" in response:
+                raise RuntimeError(
+                    "Search failed in step %d: %s."
+                    % (searches[0][1].step.index, repr(response["error"]))
                 )
-            except Exception as e:
-                raise ValueError(
-                    "Malformed query. Query %d of step %d does not compile: %s."
-                    % (j, i, repr(e))
+            if cache is not None:
+                cache.set(key, response)
+            if self._responses is not None:
+                self._responses[key] = response
+            for j, (position, search) in enumerate(searches):
+                search.set_result(
+                    response, search_time, cached=j > 0, request=self._requests
                 )
+                self._add_hits(position, response, search)
 
-            if not body:
-                continue
-            query_config["body"] = body
-            current_app.logger.debug("Sending ES query: %s" % repr(body))
-            result = es.search(**query_config)
-            for hit in result["hits"]["hits"]:
-                is_hit_valid = all([validator(record, hit) for validator in validators])
-                if is_hit_valid:
-                    yield hit
+        self._recorder.record_request(
+            [searches[0][1] for _, searches in requests], search_time
+        )
+        self._update_unresolved()
+        self._pending = None
+
+    def results(self):
+        """Return each record of the chunk together with its valid hits."""
+        return list(zip(self.records, self.hits))
+
+    def _add_hits(self, position, result, search):
+        if not self._hit_filters[position].done:
+            self.hits[position].extend(
+                self._hit_filters[position].get_valid_hits(result, search)
+            )
+        self._recorder.record(search)
+
+    def _finish(self):
+        if self._finished:
+            return
+
+        self._finished = True
+        self._recorder.flush()
+        for hit_filter in self._hit_filters:
+            self._recorder.record_match(hit_filter.count)
+
+    def _update_unresolved(self):
+        self._unresolved = [
+            position
+            for position in self._unresolved
+            if not (self.hits[position] or self._hit_filters[position].done)
+        ]
+
+
+def _get_msearch_body(searches):
+    msearch_body = []
+    for search in searches:
+        query_config = search.query_config
+        request = dict(query_config["body"], size=query_config["size"])
+        if "_source" in query_config:
+            request["_source"] = query_config["_source"]
+        msearch_body.extend([{"index": query_config["index"]}, request])
+
+    return msearch_body
+
+
+def _iter_chunks(records, chunk_size):
+    if chunk_size is None:
+        chunk_size = current_app.config.get(
+            "MATCHER_BATCH_CHUNK_SIZE", MATCHER_BATCH_CHUNK_SIZE
+        )
+
+    records = iter(records)
+    chunk = list(islice(records, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(records, chunk_size))
+
+
+def match(record, config=None):
+    """Given a record, yield the records in INSPIRE most similar to it.
+
+    This method can be used to detect if a record that we are ingesting as a
+    submission or as an harvest is already present in the system, or to find
+    out which record a reference should be pointing to.
+
+    If the configuration sets ``deduplicate`` to ``True``, each record in
+    INSPIRE is yielded at most once, identified by its ``_id`` or its
+    ``control_number``.
+
+    If a step sets ``combine_queries`` to ``True``, its queries are sent in a
+    single request as named clauses of a ``bool`` query, and the hits are
+    yielded in the order of the first query they match. As only ``size``
+    hits are returned for the whole step, the hits of the last queries can
+    be fewer than when sending one request per query. The ``inner_hits`` of
+    the combined queries must have different names.
+
+    A step or the whole configuration can set ``stop_on_first_match`` to
+    ``True`` to stop sending queries after the first one that returns a valid
+    hit, and ``max_results`` to stop after that many valid hits, counted in
+    the step or in the whole match respectively.
+
+    If the configuration sets ``parallel`` to ``True``, up to
+    ``MATCHER_PARALLEL_WORKERS`` queries, possibly of different steps, are
+    sent at once on a shared thread pool. The hits are still yielded in the
+    order of the steps and queries, and the queries that were not sent yet
+    are cancelled when the iteration stops. This is only correct for
+    configurations whose steps do not depend on each other, and it might
+    send queries that a sequential match would have skipped.
+
+    If the configuration or a step sets ``snapshot`` to ``True``, its
+    ``exact`` queries first look up their values in the identifier snapshot
+    at ``MATCHER_SNAPSHOT_PATH``, and are only sent to ES when one of their
+    values is not found or the snapshot is stale. The hits found in the
+    snapshot only have the ``control_number`` in their ``_source``, so steps
+    with a ``validator`` do not use the snapshot unless they set
+    ``snapshot`` themselves. Configurations with ``collections`` or
+    ``match_deleted`` never use it.
+
+    If a negative filter is configured at ``MATCHER_NEGATIVE_FILTER_PATH``,
+    the ``exact`` queries whose values are all certainly absent from the
+    index according to it are not sent, unless the filter was built more
+    than ``MATCHER_NEGATIVE_FILTER_MAX_AGE`` seconds ago.
+    """
+    plan = _get_plan(config)
+
+    hit_filter = _HitFilter(record, plan)
+    recorder = _Recorder(plan)
+    searches = _iter_searches(record, plan)
+    if plan.parallel:
+        results = _iter_parallel_results(searches)
+    else:
+        results = _iter_results(searches)
+
+    try:
+        for search, result in results:
+            valid_hits = hit_filter.get_valid_hits(result, search)
+            recorder.record(search)
+            for hit in valid_hits:
+                yield hit
+            if hit_filter.done:
+                return
+    finally:
+        results.close()
+        recorder.flush()
+        recorder.record_match(hit_filter.count)
+
+
+def match_batch(records, config=None, chunk_size=None):
+    """Given some records, yield the records in INSPIRE most similar to each.
+
+    The records are matched in chunks of ``chunk_size``: all the queries of a
+    step for all the records of a chunk are sent to ES in a single
+    ``_msearch`` request. A record is resolved as soon as one step returns
+    at least one valid hit, and only the unresolved records of a chunk are
+    sent to the following steps.
+
+    Args:
+        records (iterable(dict)): the records to match.
+        config (dict): the matcher configuration, as in :func:`match`, or
+            the :class:`~inspire_matcher.plan.MatchPlan` built from it.
+        chunk_size (int): how many records to match per ``_msearch``
+            request. Defaults to ``MATCHER_BATCH_CHUNK_SIZE``.
+
+    Yields:
+        tuple(dict, list): each record together with the valid hits of the
+            first step that returned any, in the order the records were given.
+    """
+    plan = _get_plan(config)
+
+    for chunk in _iter_chunks(records, chunk_size):
+        chunk_match = _ChunkMatch(chunk, plan)
+        request = chunk_match.next_request()
+        while request is not None:
+            chunk_match.add_responses(_get_search_client().msearch(body=request))
+            request = chunk_match.next_request()
+
+        for result in chunk_match.results():
+            yield result
+
+
+def match_authors(authors, config, chunk_size=None):
+    """Given the authors of a paper, return the records in INSPIRE similar to each.
+
+    This is the paper-level counterpart of calling :func:`match` once per
+    author with a configuration of ``author-names`` queries, possibly
+    together with ``nested`` queries on the affiliations. The queries of a
+    step for all the authors are sent in ``_msearch`` requests of
+    ``chunk_size`` authors, so that a paper costs a few requests per step
+    instead of one request per author and query. As in :func:`match_batch`,
+    an author is resolved by the first step that returns a valid hit.
+
+    Args:
+        authors (iterable(dict)): the authors of the paper, as in its
+            ``authors`` field.
+        config (dict): the matcher configuration, as in :func:`match`, or
+            the :class:`~inspire_matcher.plan.MatchPlan` built from it.
+        chunk_size (int): how many authors to match per ``_msearch``
+            request. Defaults to ``MATCHER_AUTHORS_CHUNK_SIZE``.
+
+    Returns:
+        list(list(dict)): the valid hits of each author, at the index of the
+            author in ``authors``.
+    """
+    if chunk_size is None:
+        chunk_size = current_app.config.get(
+            "MATCHER_AUTHORS_CHUNK_SIZE", MATCHER_AUTHORS_CHUNK_SIZE
+        )
+
+    return [hits for _, hits in match_batch(authors, config, chunk_size)]
+
+
+def match_references(references, config=None, chunk_size=None):
+    """Given the references of a paper, return the records in INSPIRE cited by each.
+
+    The references are matched as in :func:`match_batch`, but each distinct
+    search is only sent once: the compiled searches are compared by their
+    :func:`~inspire_matcher.cache.make_cache_key`, which does not depend on
+    key order, and the response of a search is validated for every
+    reference that compiles the same search, such as an arXiv identifier or
+    a pubnote cited twice. The hits returned for different references can
+    therefore be the same objects.
+
+    The number of searches that were not sent is logged and reported by
+    the :data:`~inspire_matcher.signals.references_matched` signal.
+
+    Args:
+        references (iterable(dict)): the references to match.
+        config (dict): the matcher configuration, as in :func:`match`, or
+            the :class:`~inspire_matcher.plan.MatchPlan` built from it.
+        chunk_size (int): how many references to match per ``_msearch``
+            request. Defaults to ``MATCHER_BATCH_CHUNK_SIZE``.
+
+    Returns:
+        list(list(dict)): the valid hits of each reference, at the index of
+            the reference in ``references``.
+    """
+    plan = _get_plan(config)
+
+    hits, responses = [], {}
+    sent = saved = 0
+    for chunk in _iter_chunks(references, chunk_size):
+        chunk_match = _ChunkMatch(chunk, plan, responses=responses)
+        request = chunk_match.next_request()
+        while request is not None:
+            sent += len(request) // 2
+            chunk_match.add_responses(_get_search_client().msearch(body=request))
+            request = chunk_match.next_request()
+
+        hits.extend(chunk_match.hits)
+        saved += chunk_match.saved
+
+    current_app.logger.debug(
+        "Matched %d references: %d identical ES queries were not sent."
+        % (len(hits), saved)
+    )
+    references_matched.send(
+        current_app._get_current_object(),
+        config=plan.name,
+        references=len(hits),
+        sent=sent,
+        saved=saved,
+    )
+    return hits
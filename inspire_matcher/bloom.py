@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Negative filters for identifiers.
+
+A negative filter tells which identifiers are certainly absent from an
+index, so that the ``exact`` queries looking for them need not be sent. It
+keeps one Bloom filter per search path: a value that was never added is
+reported as absent, except for a configurable rate of false positives, and
+a value that was added is never reported as absent.
+
+Filters are built with :meth:`IdentifierFilter.build` from a scan of the
+index and saved with :meth:`IdentifierFilter.save`. A record indexed after
+the scan would be reported as absent, so its identifiers must be added with
+:meth:`IdentifierFilter.update` before it is indexed. They are appended to a
+journal next to the saved filters, which every process using them replays
+with :meth:`IdentifierFilter.refresh`. The extension does it for the records
+indexed through ``invenio-indexer``, and the matcher does not use the
+filters when it cannot. As records can still be indexed in other ways, the
+matcher also ignores filters built more than
+``MATCHER_NEGATIVE_FILTER_MAX_AGE`` seconds ago: they must be rebuilt at
+least that often. The false positive rate also grows above the
+``error_rate`` once more values than the ``capacity`` of a filter are
+added, so rebuilt filters should have room to grow.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from inspire_utils.helpers import force_list
+from inspire_utils.record import get_value
+from six import text_type
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+MAGIC = b"IMBLOOM1"
+
+DEFAULT_IDENTIFIERS = {
+    "arxiv_eprints.value.raw": "arxiv_eprints.value",
+    "dois.value.raw": "dois.value",
+    "persistent_identifiers.value": "persistent_identifiers.value",
+}
+"""Identifiers of the default configuration."""
+
+_HEADER = struct.Struct("<8sI")
+
+_JOURNAL_OVERLAP = 60
+"""Seconds of journal kept before the scan of rebuilt filters.
+
+The records being indexed when the scan started may be missing from it.
+"""
+
+
+class BloomFilter(object):
+    """A Bloom filter of strings.
+
+    Args:
+        capacity (int): the number of values the filter is sized for.
+        error_rate (float): the rate of false positives at ``capacity``.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError(
+                "Malformed Bloom filter: capacity %d, error rate %r."
+                % (capacity, error_rate)
+            )
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._get_positions(value)
+        )
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        """Add a value to the filter."""
+        positions = self._get_positions(value)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def get_metadata(self):
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "count": self.count,
+        }
+
+    def to_bytes(self):
+        with self._lock:
+            return bytes(self._bits)
+
+    def _get_positions(self, value):
+        digest = hashlib.sha1(text_type(value).encode("utf-8")).digest()
+        first, second = struct.unpack("<QQ", digest[:16])
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+class IdentifierFilter(object):
+    """The negative filters of the identifiers of the records in an index.
+
+    Args:
+        filters (dict): the :class:`BloomFilter` of each search path.
+        identifiers (dict): for each search path, the path of its values in
+            the records.
+        index (string): the unprefixed name of the index of the records.
+        created (float): the timestamp of the scan of the index the filters
+            were built from. Defaults to now.
+    """
+
+    def __init__(self, filters, identifiers, index="records-hep", created=None):
+        self.filters = filters
+        self.identifiers = identifiers
+        self.index = index
+        self.created = time.time() if created is None else created
+        self.path = None
+        self.mtime = None
+        self._journal_offset = 0
+        self._journal_lock = threading.Lock()
+
+    @classmethod
+    def build(
+        cls,
+        records,
+        identifiers=None,
+        index="records-hep",
+        capacity=None,
+        error_rate=0.01,
+        growth=2,
+    ):
+        """Build the negative filters of some records.
+
+        Deleted records are included, so that the filters can also be used
+        by configurations matching deleted records.
+
+        Args:
+            records (iterable(dict)): the records of the index, with at least
+                the fields in ``identifiers``, as yielded by a scan of the
+                index.
+            identifiers (dict): for each search path to filter, the path of
+                its values in the records. Defaults to
+                :data:`DEFAULT_IDENTIFIERS`.
+            index (string): the unprefixed name of the index of the records.
+            capacity (int): the number of values each filter is sized for.
+                Defaults to ``growth`` times the number of values found.
+            error_rate (float): the rate of false positives at ``capacity``.
+            growth (int): how much the filters can grow by incremental
+                insertion when the ``capacity`` is not given.
+
+        Returns:
+            IdentifierFilter: the filters of the records.
+        """
+        if identifiers is None:
+            identifiers = DEFAULT_IDENTIFIERS
+
+        created = time.time()
+        values = dict((search_path, set()) for search_path in identifiers)
+        for record in records:
+            for search_path, record_path in identifiers.items():
+                values[search_path].update(
+                    text_type(value)
+                    for value in force_list(get_value(record, record_path))
+                )
+
+        filters = {}
+        for search_path, search_values in values.items():
+            bloom_filter = BloomFilter(
+                capacity or max(1, growth * len(search_values)), error_rate
+            )
+            for value in search_values:
+                bloom_filter.add(value)
+            filters[search_path] = bloom_filter
+
+        return cls(filters, identifiers, index=index, created=created)
+
+    @classmethod
+    def load(cls, path):
+        """Load the filters saved at ``path``.
+
+        Raises:
+            ValueError: if the file does not contain negative filters.
+        """
+        with open(path, "rb") as f:
+            mtime = os.fstat(f.fileno()).st_mtime
+            metadata = _read_metadata(f, path)
+            data = f.read()
+
+        offset = 0
+
+        filters = {}
+        for search_path in sorted(metadata["filters"]):
+            filter_metadata = metadata["filters"][search_path]
+            bloom_filter = BloomFilter(
+                filter_metadata["capacity"], filter_metadata["error_rate"]
+            )
+            end = offset + len(bloom_filter._bits)
+            bloom_filter._bits[:] = data[offset:end]
+            bloom_filter.count = filter_metadata["count"]
+            filters[search_path] = bloom_filter
+            offset = end
+
+        result = cls(
+            filters,
+            metadata["identifiers"],
+            index=metadata["index"],
+            created=metadata.get("created", 0),
+        )
+        result.path = path
+        result.mtime = mtime
+        result.refresh()
+        return result
+
+    def save(self, path):
+        """Save the filters to ``path``, replacing it atomically.
+
+        The entries of the journal of ``path`` older than the scan of these
+        filters are dropped.
+        """
+        metadata = json.dumps(
+            {
+                "filters": dict(
+                    (search_path, bloom_filter.get_metadata())
+                    for search_path, bloom_filter in self.filters.items()
+                ),
+                "identifiers": self.identifiers,
+                "index": self.index,
+                "created": self.created,
+            }
+        ).encode("utf-8")
+
+        def write(f):
+            f.write(_HEADER.pack(MAGIC, len(metadata)))
+            f.write(metadata)
+            for search_path in sorted(self.filters):
+                f.write(self.filters[search_path].to_bytes())
+
+        with _lock(path):
+            _replace(path, write)
+            _compact_journal(path, self.created - _JOURNAL_OVERLAP)
+
+    @classmethod
+    def update(cls, path, records):
+        """Add the identifiers of records about to be indexed to the saved filters.
+
+        They are appended to the journal of ``path`` while holding a lock,
+        so that concurrent updates are not lost, and the processes using the
+        filters add them on their next :meth:`refresh`.
+
+        Args:
+            path (string): the path of the saved filters.
+            records (iterable(dict)): the records about to be indexed.
+        """
+        with open(path, "rb") as f:
+            identifiers = _read_metadata(f, path)["identifiers"]
+
+        lines = []
+        for record in records:
+            values = {}
+            for search_path, record_path in identifiers.items():
+                record_values = [
+                    text_type(value)
+                    for value in force_list(get_value(record, record_path))
+                ]
+                if record_values:
+                    values[search_path] = record_values
+            if values:
+                lines.append(json.dumps({"time": time.time(), "values": values}))
+        if not lines:
+            return
+
+        with _lock(path), open(_get_journal_path(path), "ab") as f:
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def refresh(self):
+        """Add the identifiers appended to the journal since the last refresh.
+
+        Only filters loaded from a file have a journal.
+        """
+        if self.path is None:
+            return
+
+        journal_path = _get_journal_path(self.path)
+        with self._journal_lock:
+            try:
+                size = os.path.getsize(journal_path)
+            except OSError:
+                return
+            if size == self._journal_offset:
+                return
+            if size < self._journal_offset:
+                # The journal was compacted: adding values again is harmless.
+                self._journal_offset = 0
+
+            with open(journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read(size - self._journal_offset)
+
+            # An update may still be writing its last line.
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                entry = json.loads(line.decode("utf-8"))
+                for search_path, values in entry["values"].items():
+                    bloom_filter = self.filters.get(search_path)
+                    if bloom_filter is None:
+                        continue
+                    for value in values:
+                        bloom_filter.add(value)
+            self._journal_offset += end
+
+    def is_stale(self, max_age):
+        """Return whether the filters were built more than ``max_age`` seconds ago."""
+        return max_age is not None and time.time() - self.created > max_age
+
+    def add_record(self, record):
+        """Add the identifiers of a newly indexed record to the filters.
+
+        Only these filters are updated: use :meth:`update` to add it to the
+        saved filters used by the matcher.
+        """
+        for search_path, record_path in self.identifiers.items():
+            bloom_filter = self.filters.get(search_path)
+            if bloom_filter is None:
+                continue
+            for value in force_list(get_value(record, record_path)):
+                bloom_filter.add(value)
+
+    def covers(self, search_path):
+        """Return whether the values of ``search_path`` are filtered."""
+        return search_path in self.filters
+
+    def might_contain(self, search_path, value):
+        """Return whether a record might have this value in ``search_path``.
+
+        Values of search paths that are not covered might always exist.
+        """
+        bloom_filter = self.filters.get(search_path)
+        return bloom_filter is None or value in bloom_filter
+
+
+@contextmanager
+def _lock(path):
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _get_journal_path(path):
+    return path + ".journal"
+
+
+def _read_metadata(f, path):
+    header = f.read(_HEADER.size)
+    try:
+        magic, length = _HEADER.unpack(header)
+    except struct.error:
+        magic = None
+    if magic != MAGIC:
+        raise ValueError("Malformed negative filter: %s." % path)
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def _replace(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".filter-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _compact_journal(path, since):
+    journal_path = _get_journal_path(path)
+    try:
+        with open(journal_path, "rb") as f:
+            lines = f.read().splitlines(True)
+    except (OSError, IOError):
+        return
+
+    kept = [
+        line
+        for line in lines
+        if line.endswith(b"\n") and json.loads(line.decode("utf-8"))["time"] >= since
+    ]
+    if len(kept) < len(lines):
+        _replace(journal_path, lambda f: f.writelines(kept))
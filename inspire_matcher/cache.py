@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matcher result cache."""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+_now = getattr(time, "monotonic", time.time)
+
+
+def make_cache_key(query_config):
+    """Return a stable key for a search.
+
+    Args:
+        query_config (dict): the keyword arguments of the search, of which
+            only the ``index``, ``body``, ``size`` and ``_source`` are used.
+
+    Returns:
+        string: a hash of the search that does not depend on key order.
+    """
+    key = {
+        "index": query_config.get("index"),
+        "body": query_config.get("body"),
+        "size": query_config.get("size"),
+        "_source": query_config.get("_source"),
+    }
+    serialized = json.dumps(key, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """A bounded, thread-safe cache of search results.
+
+    The least recently used result is evicted when the cache is full, and
+    results older than ``ttl`` seconds are never returned.
+
+    Args:
+        maxsize (int): maximum number of results kept in memory.
+        ttl (float): number of seconds a result stays valid.
+        timer (callable): returns the current time in seconds.
+    """
+
+    def __init__(self, maxsize, ttl, timer=_now):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        """Return a copy of the result cached under ``key``, or ``None``."""
+        with self._lock:
+            entry = self._results.pop(key, None)
+            if entry is None or entry[0] <= self._timer():
+                self.misses += 1
+                return None
+
+            self._results[key] = entry
+            self.hits += 1
+
+        return copy.deepcopy(entry[1])
+
+    def set(self, key, result):
+        """Cache ``result`` under ``key``."""
+        entry = self._timer() + self.ttl, copy.deepcopy(result)
+
+        with self._lock:
+            self._results.pop(key, None)
+            self._results[key] = entry
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        """Remove all results and reset the counters."""
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        """dict: the hit and miss counters and the current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Command line matcher.
+
+The ``inspire-matcher`` command reads records as JSON lines from a file or
+from the standard input, matches them with a bounded number of concurrent
+:func:`~inspire_matcher.api.match` calls, and writes the hits of each
+record as a JSON line to the standard output, in the order of the input::
+
+    inspire-matcher --search-host localhost:9200 records.jsonl > hits.jsonl
+
+At most twice as many records as the ``--concurrency`` are read ahead, so
+the memory used does not depend on the size of the input. The throughput
+and latency of the run are printed to the standard error at the end.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import yaml
+from flask import Flask
+from invenio_search import InvenioSearch
+
+from inspire_matcher.api import match
+from inspire_matcher.ext import InspireMatcher
+from inspire_matcher.memory import InMemorySearchClient
+
+_timer = getattr(time, "perf_counter", time.time)
+
+
+class RunStatistics(object):
+    """Throughput and latency of a run, in constant memory.
+
+    The latency percentiles are computed on a uniform sample of at most
+    ``sample_size`` records.
+    """
+
+    def __init__(self, sample_size=10000, seed=0):
+        self.records = 0
+        self.errors = 0
+        self.matched = 0
+        self.hits = 0
+        self.max_latency = 0.0
+        self._sample_size = sample_size
+        self._sample = []
+        self._random = random.Random(seed)
+        self._start = _timer()
+
+    def add(self, latency, hits=None):
+        """Add a record matched in ``latency`` seconds, or that failed."""
+        self.records += 1
+        if hits is None:
+            self.errors += 1
+        else:
+            self.hits += hits
+            self.matched += 1 if hits else 0
+
+        self.max_latency = max(self.max_latency, latency)
+        if len(self._sample) < self._sample_size:
+            self._sample.append(latency)
+        else:
+            position = self._random.randint(0, self.records - 1)
+            if position < self._sample_size:
+                self._sample[position] = latency
+
+    def get_percentile(self, percentile):
+        if not self._sample:
+            return 0.0
+        sample = sorted(self._sample)
+        position = int(round(percentile / 100.0 * (len(sample) - 1)))
+        return sample[position]
+
+    def format(self):
+        elapsed = _timer() - self._start
+        lines = [
+            "records: %d (%d matched, %d errors)"
+            % (self.records, self.matched, self.errors),
+            "hits: %d" % self.hits,
+            "elapsed: %.3f s" % elapsed,
+            "throughput: %.1f records/s" % (self.records / elapsed if elapsed else 0),
+            "latency: p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, max %.1f ms"
+            % (
+                self.get_percentile(50) * 1000,
+                self.get_percentile(95) * 1000,
+                self.get_percentile(99) * 1000,
+                self.max_latency * 1000,
+            ),
+        ]
+        return "\n".join(lines)
+
+
+def create_app(app_config=None, search_hosts=None, records=None):
+    """Create an application to run the matcher outside of INSPIRE.
+
+    Args:
+        app_config (string): a Python file with the application settings.
+        search_hosts (list(string)): the search hosts to connect to.
+        records (string): a JSON lines dump of the records to match against
+            in memory instead of searching an index.
+    """
+    app = Flask("inspire_matcher")
+    if app_config:
+        app.config.from_pyfile(app_config)
+    if search_hosts:
+        app.config["SEARCH_HOSTS"] = list(search_hosts)
+    if records:
+        app.config["MATCHER_SEARCH_CLIENT"] = InMemorySearchClient.from_jsonl(records)
+
+    InvenioSearch(app)
+    InspireMatcher(app)
+
+    return app
+
+
+def _match_line(app, line, config):
+    start = _timer()
+    try:
+        record = json.loads(line)
+        with app.app_context():
+            hits = list(match(record, config))
+    except Exception as e:
+        return {"error": repr(e)}, _timer() - start
+
+    return {"hits": hits}, _timer() - start
+
+
+def match_lines(app, lines, config=None, concurrency=4):
+    """Match the records in some JSON lines, keeping their order.
+
+    Args:
+        app (Flask): the application to match in.
+        lines (iterable(string)): the records, one JSON document per line.
+            Blank lines are skipped.
+        config (dict): the matcher configuration.
+        concurrency (int): the maximum number of records matched at once.
+
+    Yields:
+        tuple(dict, float): for each record, its line number and either its
+        ``hits`` or the ``error`` that prevented matching it, and the
+        seconds it took.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            pending.append((number, executor.submit(_match_line, app, line, config)))
+            if len(pending) >= 2 * concurrency:
+                number, future = pending.popleft()
+                result, latency = future.result()
+                yield dict(result, line=number), latency
+
+        while pending:
+            number, future = pending.popleft()
+            result, latency = future.result()
+            yield dict(result, line=number), latency
+
+
+@click.command()
+@click.argument("input_file", type=click.File("r"), default="-")
+@click.option(
+    "-c",
+    "--config",
+    type=click.File("r"),
+    help="Matcher configuration, in JSON or YAML. Defaults to "
+    "MATCHER_DEFAULT_CONFIGURATION.",
+)
+@click.option(
+    "--app-config", type=click.Path(exists=True), help="Application settings file."
+)
+@click.option("--search-host", multiple=True, help="Search host, can be repeated.")
+@click.option(
+    "--records",
+    type=click.Path(exists=True),
+    help="JSON lines dump of the records to match against in memory.",
+)
+@click.option(
+    "-j",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Maximum number of records matched at once.",
+)
+@click.option(
+    "--stats/--no-stats", default=True, help="Print the statistics of the run."
+)
+def main(input_file, config, app_config, search_host, records, concurrency, stats):
+    """Match the records in INPUT_FILE, one JSON document per line."""
+    app = create_app(app_config=app_config, search_hosts=search_host, records=records)
+    if config is not None:
+        config = yaml.safe_load(config)
+
+    run_statistics = RunStatistics()
+    for result, latency in match_lines(app, input_file, config, concurrency):
+        if "error" in result:
+            click.echo("Line %d: %s" % (result["line"], result["error"]), err=True)
+            run_statistics.add(latency)
+        else:
+            run_statistics.add(latency, len(result["hits"]))
+        click.echo(json.dumps(result, sort_keys=True))
+
+    if stats:
+        click.echo(run_statistics.format(), err=True)
+    if run_statistics.errors:
+        sys.exit(1)
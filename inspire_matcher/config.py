@@ -69,4 +69,125 @@ MATCHER_DEFAULT_CONFIGURATION = {
     "doc_type": "hep",
     "index": "records-hep",
 }
-"""Default configuration of the matcher."""
+"""Default configuration of the matcher.
+
+The ``source`` lists the fields returned to the caller: the fields read by
+the validators of each step are added to it automatically when it does not
+already include them.
+"""
+
+MATCHER_AUTHOR_BLOCKING_THRESHOLD = 1000
+"""Number of authors above which authors are only compared within blocks.
+
+Meant for the author lists of large collaborations. See
+:func:`inspire_matcher.utils.get_number_of_author_matches`, as blocking can
+find fewer matches. ``None`` always compares all the authors.
+"""
+
+MATCHER_AUTHORS_QUERY_CACHE_SIZE = 10000
+"""Maximum number of author names whose ``author-names`` query is cached."""
+
+MATCHER_AUTHORS_CHUNK_SIZE = 500
+"""Number of authors matched per ``_msearch`` request by ``match_authors``."""
+
+MATCHER_BATCH_CHUNK_SIZE = 100
+"""Number of records matched per ``_msearch`` request by ``match_batch``."""
+
+MATCHER_PLAN_CACHE_SIZE = 128
+"""Maximum number of resolved matcher configurations kept in memory."""
+
+MATCHER_RESULT_CACHE_ENABLED = False
+"""Whether to cache the results of the searches sent by the matcher.
+
+Steps can opt out of the cache by setting their ``cache`` key to ``False``.
+"""
+
+MATCHER_RESULT_CACHE_SIZE = 10000
+"""Maximum number of search results kept in the cache."""
+
+MATCHER_RESULT_CACHE_TTL = 300
+"""Number of seconds a cached search result stays valid."""
+
+MATCHER_SEARCH_CLIENT = None
+"""Search client used to send the queries instead of ``invenio-search``'s.
+
+It needs the ``search`` and ``msearch`` methods of the ES client, as
+:class:`inspire_matcher.memory.InMemorySearchClient` does.
+"""
+
+MATCHER_SNAPSHOT_PATH = None
+"""Path of the identifier snapshot looked up by the ``snapshot`` steps.
+
+See :mod:`inspire_matcher.snapshot`. The snapshot is reopened when the file
+is replaced.
+"""
+
+MATCHER_SNAPSHOT_MAX_AGE = 86400
+"""Number of seconds after which the snapshot is stale and no longer used.
+
+``None`` means the snapshot never becomes stale.
+"""
+
+MATCHER_METRICS_ENABLED = False
+"""Whether to keep metrics of the matcher in memory.
+
+The metrics are available from the ``metrics`` attribute of the extension,
+and can be rendered in the Prometheus text format with
+:func:`inspire_matcher.metrics.render`.
+"""
+
+MATCHER_NEGATIVE_FILTER_PATH = None
+"""Path of the negative filter checked before sending ``exact`` queries.
+
+See :mod:`inspire_matcher.bloom`. The filter is reloaded when the file is
+replaced. It is only used when ``invenio-indexer`` is installed, as the
+identifiers of the records are added to it before they are indexed.
+"""
+
+MATCHER_NEGATIVE_FILTER_MAX_AGE = 3600
+"""Number of seconds after which the negative filter is stale and no longer used.
+
+Records indexed without the ``before_record_index`` signal of
+``invenio-indexer`` after the filter was built are reported as absent, as
+they are not added with :meth:`inspire_matcher.bloom.IdentifierFilter.update`,
+so the filter must be rebuilt at least this often. ``None`` means the filter
+never becomes stale.
+"""
+
+MATCHER_OPTIMIZE_QUERIES = False
+"""Whether to rewrite the compiled queries with :mod:`inspire_matcher.optimizer`.
+
+The rewritten queries return the same hits with ``term`` and ``terms``
+queries on keyword fields, which ES can cache, but score them differently.
+"""
+
+MATCHER_PARALLEL_WORKERS = 4
+"""Maximum number of queries sent at once by a ``parallel`` configuration."""
+
+MATCHER_SLOW_QUERY_LOG_THRESHOLD = None
+"""Number of seconds of round trip to ES from which a query is logged as slow.
+
+See :mod:`inspire_matcher.slowlog`. ``None`` disables the slow-query log.
+"""
+
+MATCHER_SLOW_QUERY_LOG_SAMPLE_RATE = 1.0
+"""Fraction of the slow queries that are logged."""
+
+MATCHER_SLOW_QUERY_LOG_PATH = None
+"""Path of the file the slow queries are logged to.
+
+``None`` logs them with the logger of the app instead.
+"""
+
+MATCHER_SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+"""Size in bytes from which the slow-query log file is rotated."""
+
+MATCHER_SLOW_QUERY_LOG_BACKUP_COUNT = 5
+"""Number of rotated slow-query log files that are kept."""
+
+MATCHER_STATISTICS_ENABLED = False
+"""Whether to aggregate the matcher signals in memory.
+
+The aggregated measurements are available from the ``statistics`` attribute
+of the extension.
+"""
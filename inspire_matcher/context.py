@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Record feature context.
+
+A :class:`RecordContext` holds the features of the record being matched
+that validators compare with each hit: a scorer of its titles, the keys of its
+authors and its identifiers. :func:`~inspire_matcher.api.match` builds one
+per record and passes it to the validators decorated with
+:func:`uses_record_context`, so that they are computed once per record
+instead of once per hit. Each feature is computed the first time it is used.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from inspire_utils.record import get_value
+
+from inspire_matcher.utils import TitleScorer, get_author_keys
+
+_USES_RECORD_CONTEXT = object()
+
+
+def uses_record_context(validator):
+    """Mark a validator as taking the record context as third argument.
+
+    The validator is then called as ``validator(record, result, context)``
+    by the matcher, and should still accept being called without it.
+    """
+    validator.uses_record_context = _USES_RECORD_CONTEXT
+    return validator
+
+
+def call_validator(validator, record, result, context):
+    """Call a validator, with the record context if it is marked as taking it.
+
+    Only the marker set by :func:`uses_record_context` counts, so that other
+    callables are called as before, whatever their attributes.
+    """
+    if getattr(validator, "uses_record_context", None) is _USES_RECORD_CONTEXT:
+        return validator(record, result, context)
+    return validator(record, result)
+
+
+class RecordContext(object):
+    """The features of a record shared by the validation of all its hits.
+
+    Args:
+        record (dict): the record being matched.
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self._features = {}
+
+    def _get(self, name, compute):
+        try:
+            return self._features[name]
+        except KeyError:
+            feature = self._features[name] = compute()
+            return feature
+
+    @property
+    def authors(self):
+        """list(dict): the authors of the record."""
+        return self._get("authors", lambda: get_value(self.record, "authors", []))
+
+    @property
+    def author_keys(self):
+        """list(list(tuple)): the :func:`~inspire_matcher.utils.get_author_keys`
+        of each author."""
+        return self._get(
+            "author_keys", lambda: [get_author_keys(author) for author in self.authors]
+        )
+
+    @property
+    def title_scorer(self):
+        """TitleScorer: the scorer of titles against the record titles."""
+        return self._get(
+            "title_scorer",
+            lambda: TitleScorer(get_value(self.record, "titles.title", [])),
+        )
+
+    @property
+    def arxiv_eprints(self):
+        """set(string): the arXiv eprints of the record."""
+        return self._get(
+            "arxiv_eprints",
+            lambda: set(get_value(self.record, "arxiv_eprints.value", [])),
+        )
+
+    @property
+    def cds_identifiers(self):
+        """set(string): the CDS identifiers of the record."""
+        return self._get(
+            "cds_identifiers",
+            lambda: {
+                external_id["value"]
+                for external_id in get_value(
+                    self.record, "external_system_identifiers", []
+                )
+                if external_id["schema"] == "CDS"
+            },
+        )
+
+    @property
+    def persistent_identifiers(self):
+        """set(frozenset): the values of each persistent identifier."""
+        return self._get(
+            "persistent_identifiers",
+            lambda: {
+                frozenset(pid.values())
+                for pid in get_value(self.record, "persistent_identifiers", [])
+            },
+        )
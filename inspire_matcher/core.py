@@ -22,13 +22,19 @@
 
 from __future__ import absolute_import, division, print_function
 
+import copy
 import os
+import threading
 import warnings
+from collections import OrderedDict
 
+from flask import current_app, has_app_context
 from inspire_utils.helpers import force_list
 from inspire_utils.name import ParsedName
 from inspire_utils.record import get_value
 
+from inspire_matcher.config import MATCHER_AUTHORS_QUERY_CACHE_SIZE
+
 
 def compile(query, record, collections=None, match_deleted=False):
     result = _compile_inner(query, record)
@@ -37,30 +43,70 @@ def compile(query, record, collections=None, match_deleted=False):
     return result
 
 
+def combine(named_queries, collections=None, match_deleted=False):
+    """Combine compiled queries into a single query with named clauses.
+
+    Args:
+        named_queries (list(tuple(string, dict))): the names and the bodies
+            of some queries, compiled without collections and deleted filters.
+        collections (list(string)): the collections to restrict the query to.
+        match_deleted (bool): whether to also match deleted records.
+
+    Returns:
+        dict: a query matching the union of the given queries, whose hits
+            list in ``matched_queries`` the names of the queries they match.
+    """
+    if not named_queries:
+        return None
+
+    result = {
+        "query": {
+            "bool": {
+                "should": [],
+            },
+        },
+    }
+
+    for name, query in named_queries:
+        result["query"]["bool"]["should"].append(
+            {
+                "bool": {
+                    "must": query["query"],
+                    "_name": name,
+                },
+            }
+        )
+
+    return _compile_filters(result, collections, match_deleted)
+
+
 def _compile_filters(query, collections, match_deleted):
     if not query:
         return None
 
-    if match_deleted and not collections:
+    filter_ = _get_filter(collections, match_deleted)
+    if filter_ is None:
         return query
 
-    result = {
+    return {
         "query": {
             "bool": {
                 "must": query["query"],
-                "filter": {
-                    "bool": {},
-                },
+                "filter": filter_,
             },
         },
     }
 
+
+def _get_filter(collections, match_deleted):
+    if match_deleted and not collections:
+        return None
+
+    result = {"bool": {}}
     if collections:
-        result["query"]["bool"]["filter"]["bool"]["should"] = _compile_collections(
-            collections
-        )
+        result["bool"]["should"] = _compile_collections(collections)
     if not match_deleted:
-        result["query"]["bool"]["filter"]["bool"]["must_not"] = {
+        result["bool"]["must_not"] = {
             "match": {
                 "deleted": True,
             },
@@ -116,7 +162,10 @@ def _compile_exact(query, record):
 
     path, search_path = query["path"], query["search_path"]
 
-    values = force_list(get_value(record, path))
+    return _compile_exact_values(search_path, force_list(get_value(record, path)))
+
+
+def _compile_exact_values(search_path, values):
     if not values:
         return
 
@@ -141,8 +190,17 @@ def _compile_exact(query, record):
 
 
 def _compile_fuzzy(query, record):
-    clauses = query["clauses"]
+    return _compile_fuzzy_clauses(_get_fuzzy_clauses(query), record)
+
+
+def _get_fuzzy_clauses(query):
+    return [
+        (clause["path"], clause["path"].split("[")[0], clause.get("boost", 1))
+        for clause in query["clauses"]
+    ]
+
 
+def _compile_fuzzy_clauses(clauses, record):
     result = {
         "min_score": 1,
         "query": {
@@ -153,17 +211,12 @@ def _compile_fuzzy(query, record):
         },
     }
 
-    for clause in clauses:
-        path = clause["path"]
-
-        boost = clause.get("boost", 1)
-
+    for path, field, boost in clauses:
         values = get_value(record, path)
         if not values:
             continue
 
-        path = path.split("[")[0]
-        if "." in path:
+        if "." in field:
             raise ValueError('the "path" key can\'t contain dots')
         # TODO: This query should be refined instead of relying on validation to filter out irrelevant results.
         result["query"]["dis_max"]["queries"].append(
@@ -173,7 +226,7 @@ def _compile_fuzzy(query, record):
                     "like": [
                         {
                             "doc": {
-                                path: values,
+                                field: values,
                             },
                         },
                     ],
@@ -190,7 +243,8 @@ def _compile_fuzzy(query, record):
     return result
 
 
-def _create_nested_query(query):
+def _get_nested_fields(query, prefix=False):
+    """Return the common path of a nested query and the builders of its clauses."""
     paths, search_paths = query["paths"], query["search_paths"]
 
     if len(paths) != len(search_paths):
@@ -200,6 +254,46 @@ def _create_nested_query(query):
     if not common_path:
         raise ValueError("search_paths must share a common path")
 
+    if prefix:
+        prefix_field = query.get("prefix_search_path", [])
+
+        def _make_prefix_clause(search_path, value):
+            return {"match_phrase_prefix": {search_path: value}}
+
+        def _make_match_clause(search_path, value):
+            return {
+                "match": {
+                    search_path: value,
+                },
+            }
+
+        fields = [
+            (
+                path,
+                search_path,
+                _make_prefix_clause
+                if prefix_field and prefix_field in search_path
+                else _make_match_clause,
+            )
+            for path, search_path in zip(paths, search_paths)
+        ]
+    else:
+        query_operator = query.get("operator", "OR")
+
+        def _make_clause(search_path, value):
+            return {
+                "match": {search_path: {"query": value, "operator": query_operator}},
+            }
+
+        fields = [
+            (path, search_path, _make_clause)
+            for path, search_path in zip(paths, search_paths)
+        ]
+
+    return common_path, fields
+
+
+def _compile_nested_fields(query, common_path, fields, record):
     nested_query = {
         "query": {
             "nested": {
@@ -212,52 +306,30 @@ def _create_nested_query(query):
             },
         },
     }
-    return nested_query, paths, search_paths
 
-
-def _compile_nested(query, record):
-    query_operator = query.get("operator", "OR")
-    nested_query, paths, search_paths = _create_nested_query(query)
-    for path, search_path in zip(paths, search_paths):
+    for path, search_path, make_clause in fields:
         value = get_value(record, path)
         if not value:
             return
 
         nested_query["query"]["nested"]["query"]["bool"]["must"].append(
-            {
-                "match": {search_path: {"query": value, "operator": query_operator}},
-            }
+            make_clause(search_path, value)
         )
+
     if "inner_hits" in query:
         nested_query["query"]["nested"]["inner_hits"] = query["inner_hits"]
 
     return nested_query
 
 
-def _compile_nested_prefix(query, record):
-    nested_query, paths, search_paths = _create_nested_query(query)
-    prefix_field = query.get("prefix_search_path", [])
-    for path, search_path in zip(paths, search_paths):
-        value = get_value(record, path)
-        if not value:
-            return
-        if prefix_field and prefix_field in search_path:
-            nested_query["query"]["nested"]["query"]["bool"]["must"].append(
-                {"match_phrase_prefix": {search_path: value}}
-            )
-        else:
-            nested_query["query"]["nested"]["query"]["bool"]["must"].append(
-                {
-                    "match": {
-                        search_path: value,
-                    },
-                }
-            )
+def _compile_nested(query, record):
+    common_path, fields = _get_nested_fields(query)
+    return _compile_nested_fields(query, common_path, fields, record)
 
-    if "inner_hits" in query:
-        nested_query["query"]["nested"]["inner_hits"] = query["inner_hits"]
 
-    return nested_query
+def _compile_nested_prefix(query, record):
+    common_path, fields = _get_nested_fields(query, prefix=True)
+    return _compile_nested_fields(query, common_path, fields, record)
 
 
 def _get_common_path(paths):
@@ -266,10 +338,53 @@ def _get_common_path(paths):
     return ".".join(os.path.commonprefix([path.split(".") for path in paths]))
 
 
+class _AuthorsQueryCache(object):
+    """A bounded cache of the queries generated from author names.
+
+    The cached queries are copied before being returned, as callers may
+    modify the compiled bodies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = OrderedDict()
+
+    def get(self, full_name):
+        key = " ".join(full_name.split())
+        with self._lock:
+            query = self._queries.get(key)
+            if query is not None:
+                self._queries[key] = self._queries.pop(key)
+                return query
+
+        query = ParsedName(key).generate_es_query()
+
+        with self._lock:
+            self._queries[key] = query
+            while len(self._queries) > _get_authors_query_cache_size():
+                self._queries.popitem(last=False)
+
+        return query
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+
+
+def _get_authors_query_cache_size():
+    if has_app_context():
+        return current_app.config.get(
+            "MATCHER_AUTHORS_QUERY_CACHE_SIZE", MATCHER_AUTHORS_QUERY_CACHE_SIZE
+        )
+    return MATCHER_AUTHORS_QUERY_CACHE_SIZE
+
+
+_authors_query_cache = _AuthorsQueryCache()
+
+
 def _compile_authors_query(query, record):
-    parsed_name = ParsedName(record["full_name"])
-    nested_query = {"query": parsed_name.generate_es_query()}
+    nested_query = copy.deepcopy(_authors_query_cache.get(record["full_name"]))
     if "inner_hits" in query:
-        nested_query["query"]["nested"]["inner_hits"] = query["inner_hits"]
+        nested_query["nested"]["inner_hits"] = query["inner_hits"]
 
-    return nested_query
+    return {"query": nested_query}
@@ -24,18 +24,184 @@
 
 from __future__ import absolute_import, division, print_function
 
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 from inspire_matcher import config
+from inspire_matcher.bloom import IdentifierFilter
+from inspire_matcher.cache import ResultCache
+from inspire_matcher.metrics import MatchMetrics
+from inspire_matcher.slowlog import SlowQueryLog
+from inspire_matcher.snapshot import IdentifierSnapshot
+from inspire_matcher.stats import MatchStatistics
 
 
 class InspireMatcher(object):
     def __init__(self, app=None):
+        self.app = None
+        self.metrics = None
+        self.result_cache = None
+        self.slow_query_log = None
+        self.statistics = None
+        self.updates_negative_filter = False
+        self._async_search_clients = weakref.WeakKeyDictionary()
+        self._async_search_clients_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._files = {}
+        self._files_lock = threading.Lock()
         if app:
             self.init_app(app)
 
     def init_app(self, app):
+        self.app = app
         self.init_config(app)
+        if app.config["MATCHER_RESULT_CACHE_ENABLED"]:
+            self.result_cache = ResultCache(
+                maxsize=app.config["MATCHER_RESULT_CACHE_SIZE"],
+                ttl=app.config["MATCHER_RESULT_CACHE_TTL"],
+            )
+        if app.config["MATCHER_STATISTICS_ENABLED"]:
+            self.statistics = MatchStatistics()
+            self.statistics.connect(app)
+        if app.config["MATCHER_METRICS_ENABLED"]:
+            self.metrics = MatchMetrics()
+            self.metrics.connect(app)
+        if app.config["MATCHER_SLOW_QUERY_LOG_THRESHOLD"] is not None:
+            self.slow_query_log = SlowQueryLog.from_app(app)
+            self.slow_query_log.connect(app)
+        self._connect_negative_filter_updates(app)
         app.extensions["inspire-matcher"] = self
 
+    def _connect_negative_filter_updates(self, app):
+        # The negative filter is only trustworthy if the identifiers of the
+        # records are added to it before they are indexed.
+        try:
+            from invenio_indexer.signals import before_record_index
+        except ImportError:
+            return
+        before_record_index.connect(self._on_before_record_index, sender=app)
+        self.updates_negative_filter = True
+
+    def _on_before_record_index(self, sender, json=None, **kwargs):
+        path = self.app.config["MATCHER_NEGATIVE_FILTER_PATH"]
+        if path and json is not None and os.path.exists(path):
+            IdentifierFilter.update(path, [json])
+
+    @property
+    def executor(self):
+        """Return the thread pool used to send queries in parallel.
+
+        It is created lazily with ``MATCHER_PARALLEL_WORKERS`` threads.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config["MATCHER_PARALLEL_WORKERS"]
+                )
+        return self._executor
+
+    @property
+    def snapshot(self):
+        """Return the identifier snapshot at ``MATCHER_SNAPSHOT_PATH``.
+
+        The snapshot is opened lazily, and reopened when the file at that
+        path is replaced. ``None`` is returned if no snapshot is configured
+        or the file cannot be opened.
+        """
+        return self._get_file("snapshot", "MATCHER_SNAPSHOT_PATH", IdentifierSnapshot)
+
+    @property
+    def negative_filter(self):
+        """Return the negative filter at ``MATCHER_NEGATIVE_FILTER_PATH``.
+
+        Like the :attr:`snapshot`, it is loaded lazily and reloaded when the
+        file at that path is replaced, and the identifiers added to it since
+        are refreshed. ``None`` is returned if the records are not added to
+        it as they are indexed, which needs ``invenio-indexer``.
+        """
+        if not self.updates_negative_filter:
+            return None
+
+        negative_filter = self._get_file(
+            "negative filter", "MATCHER_NEGATIVE_FILTER_PATH", IdentifierFilter.load
+        )
+        if negative_filter is not None:
+            negative_filter.refresh()
+        return negative_filter
+
+    def _get_file(self, name, key, loader):
+        path = self.app.config[key]
+        if not path:
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        # Files are replaced atomically, so a new inode means a new file even
+        # when the modification time is too coarse to tell them apart.
+        version = path, stat.st_mtime, stat.st_ino
+        with self._files_lock:
+            loaded, loaded_version = self._files.get(name, (None, None))
+            if loaded is None or loaded_version != version:
+                try:
+                    loaded = loader(path)
+                except (OSError, IOError, ValueError) as e:
+                    self.app.logger.warning("Cannot open the %s: %s" % (name, repr(e)))
+                    return None
+                self._files[name] = loaded, version
+        return loaded
+
+    @property
+    def async_search_client(self):
+        """Return the asynchronous search client of the running event loop.
+
+        It is built lazily with the same ``SEARCH_HOSTS`` and
+        ``SEARCH_CLIENT_CONFIG`` used by ``invenio-search`` for the
+        synchronous client. As its connections are bound to the event loop
+        it was created in, each event loop gets its own client, which is
+        forgotten with the loop. Closing it, with ``await client.close()``
+        before the loop is closed, is up to the caller.
+
+        Raises:
+            RuntimeError: if there is no running event loop.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        with self._async_search_clients_lock:
+            client = self._async_search_clients.get(loop)
+            if client is None:
+                client = self._async_search_clients[loop] = self._async_client_builder()
+        return client
+
+    def _async_client_builder(self):
+        from invenio_search.engine import ES, SEARCH_DISTRIBUTION, search
+
+        client_config = dict(self.app.config.get("SEARCH_CLIENT_CONFIG") or {})
+        client_config.setdefault("hosts", self.app.config.get("SEARCH_HOSTS"))
+
+        if SEARCH_DISTRIBUTION == ES:
+            name, extra = "AsyncElasticsearch", "elasticsearch7-async"
+        else:
+            name, extra = "AsyncOpenSearch", "opensearch2-async"
+
+        # The asynchronous clients are only available when their optional
+        # dependencies, like ``aiohttp``, are installed.
+        try:
+            client_class = getattr(search, name)
+        except (AttributeError, ImportError):
+            raise ImportError(
+                "The asynchronous search client needs %s, which is not "
+                "available: install inspire-matcher with the %s extra (or the "
+                "one of your version of the search engine)." % (name, extra)
+            )
+        return client_class(**client_config)
+
     def init_config(self, app):
         for k in dir(config):
             if k.startswith("MATCHER_"):
@@ -0,0 +1,616 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""In-memory search client.
+
+:class:`InMemorySearchClient` is a stand-in for the Elasticsearch client
+that keeps the records in memory and evaluates the queries produced by
+:func:`inspire_matcher.core.compile`. It can be set as
+``MATCHER_SEARCH_CLIENT`` to match records without a running cluster, for
+example in local benchmarks or offline deduplication jobs.
+
+Only the subset of the query DSL used by the matcher is supported, and some
+of it is approximated:
+
+- ``match`` on keyword fields looks up the exact value, on text fields it
+  looks up the lowercased word tokens, combined with the ``operator``.
+- ``term`` and ``terms`` look up exact values.
+- ``bool`` with ``must``, ``should``, ``filter``, ``must_not`` and
+  ``minimum_should_match``, and ``dis_max``.
+- ``nested`` matches the inner query against each nested object, and
+  returns the matching objects as ``inner_hits`` if requested.
+- ``match_phrase_prefix`` requires all the tokens, the last one as a
+  prefix, without checking their positions.
+- ``more_like_this`` selects the ``max_query_terms`` rarest terms of the
+  ``like`` documents and requires 30% of them to match.
+
+Scores are sums of the inverse document frequencies of the matched terms,
+so they are comparable to each other but not to the scores of ES.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from six import iteritems, string_types
+
+KEYWORD_FIELDS = frozenset(
+    [
+        "_collections",
+        "control_number",
+        "deleted",
+        "external_system_identifiers.value",
+        "persistent_identifiers.value",
+    ]
+)
+"""Fields matched on their exact value, besides the ``.raw`` ones."""
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokenize(value):
+    return _TOKEN_RE.findall(value.lower())
+
+
+def _iter_leaves(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            for leaf in _iter_leaves(item):
+                yield leaf
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            for leaf in _iter_leaves(item):
+                yield leaf
+    elif value is not None:
+        yield value
+
+
+def _get_values(document, path):
+    values = [document]
+    for key in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                value = [item.get(key) for item in value if isinstance(item, dict)]
+                next_values.extend(value)
+            elif isinstance(value, dict) and key in value:
+                next_values.append(value[key])
+        values = next_values
+
+    return list(_iter_leaves(values))
+
+
+def _filter_source(source, includes):
+    if not includes:
+        return source
+    if isinstance(includes, string_types):
+        includes = [includes]
+
+    result = {}
+    for include in includes:
+        _copy_path(source, result, include.split("."))
+
+    return result
+
+
+def _copy_path(source, target, keys):
+    key, rest = keys[0], keys[1:]
+    if not isinstance(source, dict) or key not in source:
+        return
+
+    value = source[key]
+    if not rest:
+        target[key] = value
+    elif isinstance(value, list):
+        items = target.setdefault(key, [{} for _ in value])
+        for item, target_item in zip(value, items):
+            _copy_path(item, target_item, rest)
+    else:
+        _copy_path(value, target.setdefault(key, {}), rest)
+
+
+class _Collection(object):
+    """Documents with lazily built keyword and inverted indexes per field."""
+
+    def __init__(self, documents, keyword_fields, parents=None, path=None):
+        self.documents = documents
+        self.keyword_fields = keyword_fields
+        self.parents = parents
+        self.path = path
+        self._lock = threading.RLock()
+        self._keyword_indexes = {}
+        self._text_indexes = {}
+        self._sorted_tokens = {}
+        self._nested = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def is_keyword_field(self, field):
+        return field.endswith(".raw") or field in self.keyword_fields
+
+    def get_keyword_index(self, field):
+        index = self._keyword_indexes.get(field)
+        if index is None:
+            with self._lock:
+                index = self._keyword_indexes.get(field)
+                if index is None:
+                    index = self._keyword_indexes[field] = self._build_keyword_index(
+                        field
+                    )
+        return index
+
+    def get_text_index(self, field):
+        index = self._text_indexes.get(field)
+        if index is None:
+            with self._lock:
+                index = self._text_indexes.get(field)
+                if index is None:
+                    index = self._text_indexes[field] = self._build_text_index(field)
+        return index
+
+    def get_sorted_tokens(self, field):
+        tokens = self._sorted_tokens.get(field)
+        if tokens is None:
+            index = self.get_text_index(field)
+            with self._lock:
+                tokens = self._sorted_tokens[field] = sorted(index)
+        return tokens
+
+    def get_nested(self, path):
+        nested = self._nested.get(path)
+        if nested is None:
+            with self._lock:
+                nested = self._nested.get(path)
+                if nested is None:
+                    nested = self._nested[path] = self._build_nested(path)
+        return nested
+
+    def get_idf(self, postings):
+        return math.log(1 + len(self) / float(len(postings) or 1))
+
+    def _build_keyword_index(self, field):
+        path = field[: -len(".raw")] if field.endswith(".raw") else field
+        index = defaultdict(set)
+        for i, document in enumerate(self.documents):
+            for value in _get_values(document, path):
+                index[value].add(i)
+        return dict(index)
+
+    def _build_text_index(self, field):
+        initials = field.endswith(".initials")
+        path = field[: -len(".initials")] if initials else field
+        index = defaultdict(set)
+        for i, document in enumerate(self.documents):
+            for value in _get_values(document, path):
+                if not isinstance(value, string_types):
+                    continue
+                for token in _tokenize(value):
+                    index[token[0] if initials else token].add(i)
+        return dict(index)
+
+    def _build_nested(self, path):
+        objects, parents = [], []
+        keys = path.split(".")
+        for i, document in enumerate(self.documents):
+            values = [document]
+            for key in keys:
+                values = [
+                    item
+                    for value in values
+                    if isinstance(value, dict)
+                    for item in (
+                        value.get(key)
+                        if isinstance(value.get(key), list)
+                        else [value.get(key)]
+                    )
+                    if item is not None
+                ]
+            for value in values:
+                nested_document = {}
+                _set_path(nested_document, keys, value)
+                objects.append(nested_document)
+                parents.append(i)
+
+        return _Collection(objects, self.keyword_fields, parents=parents, path=path)
+
+
+def _as_list(value):
+    return [value] if isinstance(value, dict) else value
+
+
+def _is_negative_bool(params):
+    return "must_not" in params and not (set(params) - {"must_not", "should"})
+
+
+def _set_path(document, keys, value):
+    for key in keys[:-1]:
+        document = document.setdefault(key, {})
+    document[keys[-1]] = value
+
+
+class _Union(object):
+    """The union of some sets of documents, without copying them."""
+
+    def __init__(self, sets):
+        self.sets = sets
+
+    def __contains__(self, i):
+        return any(i in documents for documents in self.sets)
+
+    def __iter__(self):
+        if len(self.sets) == 1:
+            return iter(self.sets[0])
+        return iter(set().union(*self.sets))
+
+    def __len__(self):
+        return sum(len(documents) for documents in self.sets)
+
+
+class _Evaluator(object):
+    """Evaluate a query on a collection into a dict from document to score."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.matched_queries = defaultdict(set)
+        self.inner_hits = defaultdict(dict)
+
+    def evaluate(self, query):
+        ((type_, params),) = query.items()
+        try:
+            method = getattr(self, "_evaluate_" + type_)
+        except AttributeError:
+            raise NotImplementedError(type_)
+
+        scores = method(params)
+        if isinstance(params, dict) and "_name" in params:
+            for i in scores:
+                self.matched_queries[i].add(params["_name"])
+
+        return scores
+
+    def _evaluate_clauses(self, clauses):
+        return [self.evaluate(clause) for clause in _as_list(clauses)]
+
+    def _evaluate_bool(self, params):
+        filter_clauses = _as_list(params.get("filter", []))
+        must_not_clauses = _as_list(params.get("must_not", []))
+
+        # A filter excluding documents, like the one on ``deleted``, is
+        # applied as extra ``must_not`` clauses so that it does not have to
+        # enumerate all the documents.
+        positive_filters = []
+        for clause in filter_clauses:
+            inner = clause.get("bool", {})
+            if _is_negative_bool(inner):
+                must_not_clauses = must_not_clauses + _as_list(inner["must_not"])
+                if inner.get("should"):
+                    positive_filters.append({"bool": {"should": inner["should"]}})
+            else:
+                positive_filters.append(clause)
+
+        must = self._evaluate_clauses(params.get("must", []))
+        should = self._evaluate_clauses(params.get("should", []))
+        filters = [self._get_filter(clause) for clause in positive_filters]
+        must_not = [self._get_filter(clause) for clause in must_not_clauses]
+
+        # The candidates are taken from the most selective required clause,
+        # and checked for membership in the others, so that filters matching
+        # most of the documents, like the one on ``_collections``, are never
+        # enumerated.
+        required = must + filters
+        minimum_should_match = params.get("minimum_should_match", 0 if required else 1)
+        if must:
+            candidates = min(must, key=len)
+        elif filters:
+            candidates = min(filters, key=len)
+        elif should:
+            candidates = set().union(*should)
+        else:
+            candidates = range(len(self.collection))
+
+        result = {}
+        for i in candidates:
+            if not all(i in clause for clause in required) or any(
+                i in clause for clause in must_not
+            ):
+                continue
+            matched_should = [scores[i] for scores in should if i in scores]
+            if len(matched_should) < minimum_should_match:
+                continue
+            result[i] = sum(scores[i] for scores in must) + sum(matched_should)
+
+        return result
+
+    def _get_filter(self, clause):
+        """Return the documents matching a clause whose score is not used.
+
+        Clauses on keyword fields return their postings without copying
+        them. Other clauses are evaluated.
+        """
+        ((type_, params),) = clause.items()
+        if not isinstance(params, dict) or "_name" in params:
+            return self.evaluate(clause)
+
+        if type_ in ("term", "terms", "match"):
+            ((field, value),) = params.items()
+            if isinstance(value, dict):
+                value = value.get("value", value.get("query"))
+            if type_ == "term" or self.collection.is_keyword_field(field):
+                index = self.collection.get_keyword_index(field)
+                return _Union([index.get(value, ()) for value in _iter_leaves(value)])
+        elif type_ == "bool" and set(params) == {"should"}:
+            return _Union(
+                [self._get_filter(inner) for inner in _as_list(params["should"])]
+            )
+
+        return self.evaluate(clause)
+
+    def _evaluate_dis_max(self, params):
+        scores = self._evaluate_clauses(params["queries"])
+        tie_breaker = params.get("tie_breaker", 0.0)
+
+        result = {}
+        for i in set().union(*scores) if scores else []:
+            matched = [clause[i] for clause in scores if i in clause]
+            best = max(matched)
+            result[i] = best + tie_breaker * (sum(matched) - best)
+
+        return result
+
+    def _evaluate_term(self, params):
+        ((field, value),) = [item for item in params.items() if item[0] != "_name"]
+        if isinstance(value, dict):
+            value = value["value"]
+        postings = self.collection.get_keyword_index(field).get(value, set())
+        return dict.fromkeys(postings, self.collection.get_idf(postings))
+
+    def _evaluate_terms(self, params):
+        ((field, values),) = [item for item in params.items() if item[0] != "_name"]
+        index = self.collection.get_keyword_index(field)
+        result = {}
+        for value in values:
+            postings = index.get(value, set())
+            for i in postings:
+                result[i] = max(result.get(i, 0), self.collection.get_idf(postings))
+        return result
+
+    def _evaluate_match(self, params):
+        ((field, value),) = [item for item in params.items() if item[0] != "_name"]
+        operator = "OR"
+        if isinstance(value, dict):
+            operator = value.get("operator", "OR").upper()
+            value = value["query"]
+
+        values = list(_iter_leaves(value))
+        if self.collection.is_keyword_field(field):
+            return self._evaluate_terms({field: values})
+
+        tokens = [
+            token
+            for value in values
+            if isinstance(value, string_types)
+            for token in _tokenize(value)
+        ]
+        if field.endswith(".initials"):
+            tokens = [token[0] for token in tokens]
+        return self._score_tokens(field, tokens, required=operator == "AND")
+
+    def _evaluate_match_phrase_prefix(self, params):
+        ((field, value),) = [item for item in params.items() if item[0] != "_name"]
+        if isinstance(value, dict):
+            value = value["query"]
+
+        tokens = _tokenize(value)
+        if not tokens:
+            return {}
+
+        result = self._score_tokens(field, tokens[:-1], required=True)
+        prefix = tokens[-1]
+        sorted_tokens = self.collection.get_sorted_tokens(field)
+        index = self.collection.get_text_index(field)
+
+        prefixed = {}
+        position = bisect_left(sorted_tokens, prefix)
+        while position < len(sorted_tokens) and sorted_tokens[position].startswith(
+            prefix
+        ):
+            postings = index[sorted_tokens[position]]
+            idf = self.collection.get_idf(postings)
+            for i in postings:
+                prefixed[i] = max(prefixed.get(i, 0), idf)
+            position += 1
+
+        if len(tokens) == 1:
+            return prefixed
+        return {
+            i: score + prefixed[i] for i, score in iteritems(result) if i in prefixed
+        }
+
+    def _evaluate_more_like_this(self, params):
+        boost = params.get("boost", 1)
+        max_query_terms = params.get("max_query_terms", 25)
+
+        field_tokens = defaultdict(set)
+        for like in params["like"]:
+            for field, value in iteritems(like["doc"]):
+                for leaf in _iter_leaves(value):
+                    if isinstance(leaf, string_types):
+                        field_tokens[field].update(_tokenize(leaf))
+
+        terms = []
+        for field, tokens in iteritems(field_tokens):
+            index = self.collection.get_text_index(field)
+            for token in tokens:
+                postings = index.get(token)
+                if postings:
+                    terms.append((self.collection.get_idf(postings), field, token))
+        terms = sorted(terms, reverse=True)[:max_query_terms]
+        if not terms:
+            return {}
+
+        matches = defaultdict(list)
+        for idf, field, token in terms:
+            for i in self.collection.get_text_index(field)[token]:
+                matches[i].append(idf)
+
+        minimum = int(math.floor(len(terms) * 0.3)) or 1
+        return {
+            i: boost * sum(idfs)
+            for i, idfs in iteritems(matches)
+            if len(idfs) >= minimum
+        }
+
+    def _evaluate_nested(self, params):
+        nested = self.collection.get_nested(params["path"])
+        evaluator = _Evaluator(nested)
+        scores = evaluator.evaluate(params["query"])
+
+        result = {}
+        inner_hits = defaultdict(list)
+        for j, score in iteritems(scores):
+            i = nested.parents[j]
+            result[i] = max(result.get(i, 0), score)
+            inner_hits[i].append((score, j))
+
+        if "inner_hits" in params:
+            name = params["inner_hits"].get("name", params["path"])
+            includes = params["inner_hits"].get("_source")
+            for i, hits in iteritems(inner_hits):
+                self.inner_hits[i][name] = {
+                    "hits": {
+                        "hits": [
+                            {
+                                "_score": score,
+                                "_source": _filter_source(
+                                    nested.documents[j], includes
+                                ),
+                            }
+                            for score, j in sorted(hits, reverse=True)
+                        ],
+                    },
+                }
+
+        return result
+
+    def _score_tokens(self, field, tokens, required):
+        index = self.collection.get_text_index(field)
+        postings = [index.get(token, set()) for token in tokens]
+        if not postings:
+            return {}
+
+        if required:
+            candidates = set.intersection(*[set(p) for p in postings])
+        else:
+            candidates = set().union(*postings)
+
+        return {
+            i: sum(self.collection.get_idf(p) for p in postings if i in p)
+            for i in candidates
+        }
+
+
+class InMemorySearchClient(object):
+    """A search client evaluating the matcher queries on in-memory records.
+
+    Args:
+        records (iterable(dict)): the records to search. Each one is either a
+            document with ``_id`` and ``_source``, or a record whose
+            ``control_number`` is used as its ``_id``.
+        index (string): the name of the index reported in the hits.
+        keyword_fields (iterable(string)): the fields matched on their exact
+            value, besides the ``.raw`` ones.
+    """
+
+    def __init__(self, records, index="records-hep", keyword_fields=KEYWORD_FIELDS):
+        self.index = index
+        self._ids = []
+        documents = []
+        for record in records:
+            if "_source" in record:
+                self._ids.append(record.get("_id"))
+                documents.append(record["_source"])
+            else:
+                self._ids.append(record.get("control_number"))
+                documents.append(record)
+
+        self._collection = _Collection(documents, frozenset(keyword_fields))
+
+    @classmethod
+    def from_jsonl(cls, path, **kwargs):
+        """Build a client from a file with one JSON record per line."""
+        with open(path) as f:
+            return cls((json.loads(line) for line in f if line.strip()), **kwargs)
+
+    def search(self, body=None, index=None, size=10, _source=None, **kwargs):
+        """Search the records, with the same arguments as the ES client."""
+        start = time.time()
+        body = dict(body or {})
+        size = body.pop("size", size)
+        _source = body.pop("_source", _source)
+
+        evaluator = _Evaluator(self._collection)
+        if "query" in body:
+            scores = evaluator.evaluate(body["query"])
+        else:
+            scores = dict.fromkeys(range(len(self._collection)), 1.0)
+
+        min_score = body.get("min_score")
+        if min_score is not None:
+            scores = {i: score for i, score in iteritems(scores) if score >= min_score}
+
+        ranked = sorted(iteritems(scores), key=lambda item: (-item[1], item[0]))
+        hits = []
+        for i, score in ranked[:size]:
+            hit = {
+                "_index": self.index,
+                "_id": self._ids[i],
+                "_score": score,
+                "_source": _filter_source(self._collection.documents[i], _source),
+            }
+            if i in evaluator.matched_queries:
+                hit["matched_queries"] = sorted(evaluator.matched_queries[i])
+            if i in evaluator.inner_hits:
+                hit["inner_hits"] = evaluator.inner_hits[i]
+            hits.append(hit)
+
+        return {
+            "took": int((time.time() - start) * 1000),
+            "hits": {
+                "total": {"value": len(scores), "relation": "eq"},
+                "max_score": ranked[0][1] if ranked else None,
+                "hits": hits,
+            },
+        }
+
+    def msearch(self, body, index=None, **kwargs):
+        """Run the searches of an ``_msearch`` body, one after the other."""
+        responses = []
+        for header, search in zip(body[::2], body[1::2]):
+            responses.append(self.search(body=search, index=header.get("index")))
+        return {"responses": responses}
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matcher metrics.
+
+The :class:`MatchMetrics` listen to the matcher signals and keep counters
+and latency histograms in memory, which :func:`render` formats in the
+Prometheus text exposition format. The host application can serve them on
+its own endpoint::
+
+    from inspire_matcher.metrics import CONTENT_TYPE, render
+
+    @app.route("/metrics")
+    def metrics():
+        registry = app.extensions["inspire-matcher"].metrics.registry
+        return render(registry), 200, {"Content-Type": CONTENT_TYPE}
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+from bisect import bisect_left
+
+from inspire_matcher.signals import (
+    match_executed,
+    query_executed,
+    request_executed,
+    step_executed,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the Prometheus text exposition format."""
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Upper bounds in seconds of the buckets of the latency histograms."""
+
+
+def _escape(value, quote=True):
+    value = ("%s" % (value,)).replace("\\", "\\\\").replace("\n", "\\n")
+    if quote:
+        value = value.replace('"', '\\"')
+    return value
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    labels = list(zip(labelnames, labelvalues)) + list(extra)
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, _escape(value)) for name, value in labels
+    )
+
+
+class Counter(object):
+    """A set of counters, one for each combination of label values.
+
+    Args:
+        name (string): the name of the metric.
+        documentation (string): the help text of the metric.
+        labelnames (tuple(string)): the names of the labels of the metric.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        """Increment the counter with the given label values by ``amount``."""
+        key = self._get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Return the value of the counter with the given label values."""
+        with self._lock:
+            return self._values.get(self._get_key(labels), 0)
+
+    def collect(self):
+        """Return the lines of the samples of the metric."""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            "%s%s %s"
+            % (self.name, _format_labels(self.labelnames, key), _format_value(value))
+            for key, value in values
+        ]
+
+    def _get_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                "Malformed labels. Metric %s has labels %s, not %s."
+                % (self.name, sorted(self.labelnames), sorted(labels))
+            )
+        return tuple("%s" % (labels[name],) for name in self.labelnames)
+
+
+class Histogram(Counter):
+    """A set of histograms, one for each combination of label values.
+
+    Args:
+        name (string): the name of the metric.
+        documentation (string): the help text of the metric.
+        labelnames (tuple(string)): the names of the labels of the metric.
+        buckets (tuple(float)): the upper bounds of the buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Add ``value`` to the histogram with the given label values."""
+        key = self._get_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = counts, total + value
+
+    def get(self, **labels):
+        """Return the number of observations and their sum."""
+        key = self._get_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([], 0)
+            return sum(counts), total
+
+    def collect(self):
+        with self._lock:
+            values = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self._values.items()
+            )
+
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            bounds = [_format_value(float(bound)) for bound in self.buckets]
+            for bound, count in zip(bounds + ["+Inf"], counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", bound)])
+                lines.append("%s_bucket%s %d" % (self.name, labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            lines.append("%s_sum%s %s" % (self.name, labels, _format_value(total)))
+            lines.append("%s_count%s %d" % (self.name, labels, cumulative))
+        return lines
+
+
+class MetricsRegistry(object):
+    """A collection of metrics, rendered together by :func:`render`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def register(self, metric):
+        """Add ``metric`` to the registry and return it."""
+        with self._lock:
+            if any(other.name == metric.name for other in self._metrics):
+                raise ValueError(
+                    "Malformed registry. Metric %s is already registered." % metric.name
+                )
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Create and register a :class:`Counter`."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create and register a :class:`Histogram`."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get_metrics(self):
+        """Return the registered metrics, in the order they were registered."""
+        with self._lock:
+            return list(self._metrics)
+
+
+def render(registry):
+    """Render the metrics of a registry in the Prometheus text format.
+
+    Args:
+        registry (MetricsRegistry): the metrics to render.
+
+    Returns:
+        string: the metrics in the text exposition format, version 0.0.4,
+            to be served with the :data:`CONTENT_TYPE` content type.
+    """
+    lines = []
+    for metric in registry.get_metrics():
+        lines.append(
+            "# HELP %s %s" % (metric.name, _escape(metric.documentation, quote=False))
+        )
+        lines.append("# TYPE %s %s" % (metric.name, metric.type))
+        lines.extend(metric.collect())
+    return "".join(line + "\n" for line in lines)
+
+
+class MatchMetrics(object):
+    """Count and time in a :class:`MetricsRegistry` what the matcher does.
+
+    The metrics, labelled by the ``config`` and, where it applies, the
+    ``step`` of the configuration, are:
+
+    - ``inspire_matcher_matches_total``: the records matched, and
+      ``inspire_matcher_matched_records_total`` those with valid hits.
+    - ``inspire_matcher_search_requests_total``: the requests sent to ES,
+      counting an ``_msearch`` request once.
+    - ``inspire_matcher_search_queries_total``: the queries sent to ES, and
+      ``inspire_matcher_cache_hits_total`` those answered by the result
+      cache, the identifier snapshot or an identical query instead.
+    - ``inspire_matcher_step_duration_seconds``: a histogram of the seconds
+      spent compiling, sending and validating the queries of each step.
+    - ``inspire_matcher_validator_verdicts_total``: the hits accepted and
+      rejected by each ``validator``, by ``verdict``.
+
+    Args:
+        registry (MetricsRegistry): where to register the metrics. Defaults
+            to a new registry.
+        buckets (tuple(float)): the upper bounds of the buckets of the
+            latency histograms.
+    """
+
+    def __init__(self, registry=None, buckets=DEFAULT_BUCKETS):
+        self.registry = MetricsRegistry() if registry is None else registry
+        self.matches = self.registry.counter(
+            "inspire_matcher_matches_total",
+            "Number of records matched.",
+            ("config",),
+        )
+        self.matched_records = self.registry.counter(
+            "inspire_matcher_matched_records_total",
+            "Number of records matched with at least one valid hit.",
+            ("config",),
+        )
+        self.search_requests = self.registry.counter(
+            "inspire_matcher_search_requests_total",
+            "Number of requests sent to ES.",
+            ("config", "step"),
+        )
+        self.search_queries = self.registry.counter(
+            "inspire_matcher_search_queries_total",
+            "Number of queries sent to ES.",
+            ("config", "step"),
+        )
+        self.cache_hits = self.registry.counter(
+            "inspire_matcher_cache_hits_total",
+            "Number of queries answered without sending them to ES.",
+            ("config", "step"),
+        )
+        self.step_duration = self.registry.histogram(
+            "inspire_matcher_step_duration_seconds",
+            "Seconds spent compiling, sending and validating the queries of a step.",
+            ("config", "step"),
+            buckets,
+        )
+        self.validator_verdicts = self.registry.counter(
+            "inspire_matcher_validator_verdicts_total",
+            "Number of hits accepted or rejected by each validator.",
+            ("config", "step", "validator", "verdict"),
+        )
+
+    def connect(self, app):
+        """Start updating the metrics with the signals sent by ``app``."""
+        match_executed.connect(self._on_match_executed, sender=app)
+        query_executed.connect(self._on_query_executed, sender=app)
+        request_executed.connect(self._on_request_executed, sender=app)
+        step_executed.connect(self._on_step_executed, sender=app)
+
+    def disconnect(self, app):
+        """Stop updating the metrics with the signals sent by ``app``."""
+        match_executed.disconnect(self._on_match_executed, sender=app)
+        query_executed.disconnect(self._on_query_executed, sender=app)
+        request_executed.disconnect(self._on_request_executed, sender=app)
+        step_executed.disconnect(self._on_step_executed, sender=app)
+
+    def render(self):
+        """Render the metrics in the Prometheus text format."""
+        return render(self.registry)
+
+    def _on_match_executed(self, sender, config, hits):
+        self.matches.inc(config=config)
+        if hits:
+            self.matched_records.inc(config=config)
+
+    def _on_query_executed(self, sender, **measurements):
+        config, step = measurements["config"], measurements["step"]
+        if measurements["cached"]:
+            self.cache_hits.inc(config=config, step=step)
+        else:
+            self.search_queries.inc(config=config, step=step)
+            # The ``_msearch`` requests are counted by ``request_executed``.
+            if not measurements.get("batched"):
+                self.search_requests.inc(config=config, step=step)
+
+        for verdict in ("accepted", "rejected"):
+            for validator, count in measurements.get(verdict, {}).items():
+                self.validator_verdicts.inc(
+                    count,
+                    config=config,
+                    step=step,
+                    validator=validator,
+                    verdict=verdict,
+                )
+
+    def _on_request_executed(self, sender, config, step, **measurements):
+        self.search_requests.inc(config=config, step=step)
+
+    def _on_step_executed(self, sender, **measurements):
+        self.step_duration.observe(
+            measurements["compile_time"]
+            + measurements["search_time"]
+            + measurements["validation_time"],
+            config=measurements["config"],
+            step=measurements["step"],
+        )
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Query optimizer.
+
+:func:`optimize` rewrites a compiled query body into an equivalent one that
+is cheaper for ES to run:
+
+- ``match`` queries of a single value on keyword fields become ``term``
+  queries, which skip the analysis and can be cached in filter context, as
+  the ones on ``_collections`` and ``deleted``.
+- ``term`` queries on the same field among the ``should`` clauses of a
+  ``bool`` query become a single ``terms`` query, as the ones built by
+  ``exact`` queries for records with several values.
+- Duplicate clauses of a ``bool`` query are dropped.
+
+The hits are the same, but their scores can differ, as a ``terms`` query
+scores all its values the same. The given body is not modified.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+from six import string_types
+
+KEYWORD_FIELDS = frozenset(["_collections", "control_number", "deleted"])
+"""Fields matched on their exact value, besides the ``.raw`` ones."""
+
+_CLAUSES = ("must", "filter", "should", "must_not")
+
+
+def optimize(body, keyword_fields=KEYWORD_FIELDS):
+    """Return an optimized copy of a query body.
+
+    Args:
+        body (dict): a query body, as returned by
+            :func:`~inspire_matcher.core.compile`.
+        keyword_fields (iterable(string)): the fields that are not analyzed,
+            besides the ones ending in ``.raw``.
+
+    Returns:
+        dict: the optimized body, or ``None`` if ``body`` is ``None``.
+    """
+    if not body or "query" not in body:
+        return body
+
+    return dict(body, query=_Optimizer(keyword_fields).optimize(body["query"]))
+
+
+def _is_scalar(value):
+    return isinstance(value, (string_types, bool, int, float))
+
+
+def _get_term(clause):
+    if list(clause) != ["term"] or len(clause["term"]) != 1:
+        return None
+
+    ((field, value),) = clause["term"].items()
+    return (field, value) if _is_scalar(value) else None
+
+
+def _get_key(clause):
+    return json.dumps(clause, sort_keys=True)
+
+
+class _Optimizer(object):
+    def __init__(self, keyword_fields):
+        self.keyword_fields = frozenset(keyword_fields)
+
+    def is_keyword_field(self, field):
+        return field.endswith(".raw") or field in self.keyword_fields
+
+    def optimize(self, query):
+        if not isinstance(query, dict) or len(query) != 1:
+            return query
+
+        ((type_, params),) = query.items()
+        if type_ == "bool":
+            return {"bool": self._optimize_bool(params)}
+        elif type_ == "match":
+            return self._optimize_match(query, params)
+        elif type_ == "nested":
+            return {"nested": dict(params, query=self.optimize(params["query"]))}
+        elif type_ == "dis_max":
+            queries = [self.optimize(clause) for clause in params["queries"]]
+            return {"dis_max": dict(params, queries=queries)}
+
+        return query
+
+    def _optimize_match(self, query, params):
+        if len(params) != 1:
+            return query
+
+        ((field, value),) = params.items()
+        if isinstance(value, dict) and list(value) == ["query"]:
+            value = value["query"]
+        if not self.is_keyword_field(field) or not _is_scalar(value):
+            return query
+
+        return {"term": {field: value}}
+
+    def _optimize_bool(self, params):
+        result = dict(params)
+        for name in _CLAUSES:
+            if name not in params:
+                continue
+
+            clauses = params[name]
+            single = isinstance(clauses, dict)
+            clauses = self._dedup(
+                [self.optimize(clause) for clause in ([clauses] if single else clauses)]
+            )
+            if name == "should" and "minimum_should_match" not in params:
+                clauses = self._merge_terms(clauses)
+
+            result[name] = clauses[0] if single and len(clauses) == 1 else clauses
+
+        return result
+
+    def _dedup(self, clauses):
+        result, keys = [], set()
+        for clause in clauses:
+            key = _get_key(clause)
+            if key not in keys:
+                keys.add(key)
+                result.append(clause)
+        return result
+
+    def _merge_terms(self, clauses):
+        values = {}
+        for clause in clauses:
+            term = _get_term(clause)
+            if term is not None:
+                values.setdefault(term[0], []).append(term[1])
+
+        result, merged = [], set()
+        for clause in clauses:
+            term = _get_term(clause)
+            if term is None or len(values[term[0]]) == 1:
+                result.append(clause)
+            elif term[0] not in merged:
+                merged.add(term[0])
+                result.append({"terms": {term[0]: values[term[0]]}})
+        return result
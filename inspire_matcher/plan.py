@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matcher plans.
+
+A plan is the result of resolving a matcher configuration once: the index
+is prefixed, the collections are checked, the query specifications are
+normalized and the validators are imported. Plans are cached by the content
+of their configuration, so that matching a record only needs to fill in the
+values of the record in the queries.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+import warnings
+from collections import OrderedDict
+
+from flask import current_app
+from invenio_search.utils import prefix_index
+from six import string_types
+from werkzeug.utils import import_string
+
+from inspire_matcher.config import MATCHER_PLAN_CACHE_SIZE
+from inspire_matcher.core import _get_common_path
+from inspire_matcher.templates import QueryTemplate
+
+
+def _get_validator(validator_param):
+    if callable(validator_param):
+        return validator_param
+
+    try:
+        validator = import_string(validator_param)
+    except (KeyError, ImportError, AttributeError):
+        current_app.logger.debug(
+            "No validator provided. Falling back to the default validator."
+        )
+        validator = import_string("inspire_matcher.validators:default_validator")
+
+    return validator
+
+
+def _get_validators(step):
+    if not isinstance(step.get("validator"), list):
+        validator_params = [step.get("validator")]
+    else:
+        validator_params = step.get("validator")
+
+    return [_get_validator(validator_param) for validator_param in validator_params]
+
+
+def _normalize_query(query):
+    query = dict(query)
+
+    if "match" in query:
+        query["path"] = query.get("path", query["match"])
+        warnings.warn(
+            'The "match" key is deprecated. Use "path" instead.',
+            DeprecationWarning,
+            stacklevel=1,
+        )
+        del query["match"]
+
+    if "search" in query:
+        query["search_path"] = query.get("search_path", query["search"])
+        warnings.warn(
+            'The "search" key is deprecated. Use "search_path" instead.',
+            DeprecationWarning,
+            stacklevel=1,
+        )
+        del query["search"]
+
+    return query
+
+
+def _get_inner_hits_name(query):
+    inner_hits = query.get("inner_hits")
+    if inner_hits is None:
+        return None
+    if "name" in inner_hits:
+        return inner_hits["name"]
+    if query["type"] == "author-names":
+        return "authors"
+    return _get_common_path(query["search_paths"])
+
+
+def _check_inner_hits_names(i, queries):
+    # ES rejects a request with two ``inner_hits`` of the same name, which
+    # defaults to the path of the nested query.
+    names = set()
+    for query in queries:
+        name = _get_inner_hits_name(query)
+        if name is None:
+            continue
+        if name in names:
+            raise ValueError(
+                "Malformed algorithm: step %d cannot combine queries with inner "
+                "hits of the same name %r. Set a different inner_hits.name for "
+                "each of them." % (i, name)
+            )
+        names.add(name)
+
+
+def _check_collections(collections):
+    if not (
+        collections is None
+        or (
+            isinstance(collections, (list, tuple))
+            and all(isinstance(collection, string_types) for collection in collections)
+        )
+    ):
+        raise ValueError(
+            "Malformed collections. Expected a list of strings bug got: %s"
+            % repr(collections)
+        )
+
+
+class MatchStep(object):
+    """A step of a :class:`MatchPlan`.
+
+    Its ``query_config`` is the one of the plan, with the ``_source`` fields
+    declared by its validators added to the ``source`` of the configuration.
+    Its ``templates`` are the :class:`~inspire_matcher.templates.QueryTemplate`
+    of its queries, without the filters if the queries are combined.
+    """
+
+    def __init__(self, i, step, config):
+        try:
+            queries = step["queries"]
+        except KeyError:
+            raise KeyError("Malformed algorithm: step %d has no queries." % i)
+
+        self.index = i
+        self.queries = [_normalize_query(query) for query in queries]
+        self.validators = _get_validators(step)
+        self.cache = step.get("cache", True)
+        self.snapshot = step.get(
+            "snapshot", config.get("snapshot", False) and "validator" not in step
+        )
+        self.stop_on_first_match = step.get(
+            "stop_on_first_match", config.get("stop_on_first_match", False)
+        )
+        self.max_results = step.get("max_results")
+
+        self.combine_queries = step.get("combine_queries", False)
+        if self.combine_queries and any(
+            query.get("type") == "fuzzy" for query in self.queries
+        ):
+            raise ValueError(
+                "Malformed algorithm: step %d cannot combine fuzzy queries." % i
+            )
+        if self.combine_queries:
+            _check_inner_hits_names(i, self.queries)
+        self.query_names = ["query-%d" % j for j in range(len(self.queries))]
+
+        if self.combine_queries:
+            collections, match_deleted = None, True
+        else:
+            collections = config.get("collections")
+            match_deleted = config.get("match_deleted", False)
+        self.templates = []
+        for j, query in enumerate(self.queries):
+            try:
+                template = QueryTemplate(query, collections, match_deleted)
+            except Exception as e:
+                raise ValueError(
+                    "Malformed query. Query %d of step %d does not compile: %s."
+                    % (j, i, repr(e))
+                )
+            self.templates.append(template)
+
+
+class MatchPlan(object):
+    """A matcher configuration resolved once for all the records it matches.
+
+    Args:
+        config (dict): the matcher configuration.
+
+    Raises:
+        KeyError: if the configuration or one of its steps is malformed.
+        ValueError: if the collections are malformed.
+    """
+
+    def __init__(self, config):
+        try:
+            index = prefix_index(config["index"])
+            size = config.get("size", 10)
+            algorithm = config["algorithm"]
+            self.name = config.get("name", config["index"])
+            self.query_config = {"index": index, "size": size}
+        except KeyError as e:
+            raise KeyError("Malformed configuration: %s." % repr(e))
+
+        source = config.get("source", [])
+        if source:
+            self.query_config["_source"] = source
+
+        self.match_deleted = config.get("match_deleted", False)
+        self.deduplicate = config.get("deduplicate", False)
+        self.max_results = config.get("max_results")
+        self.parallel = config.get("parallel", False)
+        self.collections = config.get("collections")
+        _check_collections(self.collections)
+
+        self.steps = [MatchStep(i, step, config) for i, step in enumerate(algorithm)]
+        for step in self.steps:
+            step.query_config = _get_step_query_config(self.query_config, step)
+
+
+def _get_step_query_config(query_config, step):
+    """Add to the ``_source`` the fields read by the validators of a step.
+
+    Nothing is added if some validator does not declare its fields, or if
+    the configuration has no ``source`` and the whole ``_source`` is
+    returned.
+    """
+    source = query_config.get("_source")
+    fields = [
+        getattr(validator, "source_fields", None) for validator in step.validators
+    ]
+    if not source or not all(isinstance(field, tuple) for field in fields):
+        return query_config
+
+    source = list(source)
+    for field in sorted(set().union(*fields)):
+        if not any(field == path or field.startswith(path + ".") for path in source):
+            source.append(field)
+
+    return dict(query_config, _source=source)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class _PlanCache(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()
+
+    def get(self, config):
+        try:
+            key = (
+                _freeze(config),
+                current_app.config.get("SEARCH_INDEX_PREFIX"),
+            )
+            hash(key)
+        except TypeError:
+            return MatchPlan(config)
+
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans[key] = self._plans.pop(key)
+                return plan
+
+        plan = MatchPlan(config)
+
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > current_app.config.get(
+                "MATCHER_PLAN_CACHE_SIZE", MATCHER_PLAN_CACHE_SIZE
+            ):
+                self._plans.popitem(last=False)
+
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+_plan_cache = _PlanCache()
+
+
+def get_match_plan(config):
+    """Return the cached plan of a matcher configuration.
+
+    Args:
+        config (dict): the matcher configuration.
+
+    Returns:
+        MatchPlan: the plan, which is only built the first time a
+            configuration with the same content is seen.
+    """
+    if isinstance(config, MatchPlan):
+        return config
+    return _plan_cache.get(config)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matcher signals."""
+
+from __future__ import absolute_import, division, print_function
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+query_executed = _signals.signal("query-executed")
+"""Signal sent after the hits of a query have been validated.
+
+The sender is the current application, and the keyword arguments are:
+
+- ``config``: the ``name`` of the configuration, which defaults to its
+  ``index``.
+- ``step``: the index of the step in the algorithm.
+- ``query``: the index of the query in the step, or ``None`` when the
+  queries of the step are combined.
+- ``body``: the compiled body of the query.
+- ``compile_time``: the seconds spent compiling the query.
+- ``search_time``: the seconds of the round trip to ES. In ``match_batch``
+  this is the round trip of the whole ``_msearch`` request.
+- ``took``: the milliseconds reported by ES, or ``None`` if not available.
+- ``cached``: whether the result came from the result cache, from the
+  identifier snapshot, or from an identical search sent by
+  ``match_references`` for another reference.
+- ``batched``: whether the query was sent in an ``_msearch`` request, which
+  is also reported by :data:`request_executed`.
+- ``hits``: the number of hits that were validated.
+- ``valid_hits``: the number of hits accepted by all validators.
+- ``accepted``: the number of hits accepted by each validator, by name.
+- ``rejected``: the number of hits rejected by each validator, by name.
+- ``validation_time``: the seconds spent validating the hits.
+"""
+
+step_executed = _signals.signal("step-executed")
+"""Signal sent after the last query of a step that was executed.
+
+The sender is the current application, and the keyword arguments are the
+``config`` and the ``step``, the number of ``queries`` executed, and the sums
+over those queries of the other measurements of :data:`query_executed`, with
+``cached`` being the number of queries answered from a cache. The round trip
+of an ``_msearch`` request is only added once to the ``search_time``,
+although it is the ``search_time`` of each of its queries.
+"""
+
+request_executed = _signals.signal("request-executed")
+"""Signal sent after the responses to an ``_msearch`` request were validated.
+
+The sender is the current application, and the keyword arguments are:
+
+- ``config``: the ``name`` of the configuration.
+- ``step``: the index of the step in the algorithm.
+- ``queries``: the number of queries in the request.
+- ``bodies``: the compiled bodies of these queries.
+- ``search_time``: the seconds of the round trip to ES.
+- ``took``: the highest milliseconds reported by ES for a query, or
+  ``None`` if not available.
+"""
+
+match_executed = _signals.signal("match-executed")
+"""Signal sent after a record was matched.
+
+The sender is the current application, and the keyword arguments are the
+``config`` and the number of valid ``hits`` found for the record. It is sent
+once per record by ``match_batch``, and when the iteration of ``match``
+stops.
+"""
+
+references_matched = _signals.signal("references-matched")
+"""Signal sent after ``match_references`` matched all the references.
+
+The sender is the current application, and the keyword arguments are:
+
+- ``config``: the ``name`` of the configuration.
+- ``references``: the number of references matched.
+- ``sent``: the number of searches sent to ES.
+- ``saved``: the number of searches that were not sent to ES because an
+  identical search was sent for another reference.
+"""
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matcher slow-query log.
+
+The :class:`SlowQueryLog` listens to the :data:`~inspire_matcher.signals.query_executed`
+signal and logs the queries whose round trip to ES exceeds a threshold.
+The values of the logged queries are redacted, so that the entries can be
+grouped by the shape of the query and do not contain the matched records.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import logging
+import random
+from logging.handlers import RotatingFileHandler
+
+from inspire_matcher.signals import query_executed, request_executed
+
+REDACTED = "?"
+
+
+def get_query_shape(body):
+    """Return the shape of a query, with all its values redacted.
+
+    Args:
+        body (dict): the body of a query.
+
+    Returns:
+        dict: a copy of ``body`` in which every string, number and boolean is
+            replaced by ``"?"``, and the elements of a list with the same
+            shape are only kept once.
+    """
+    if isinstance(body, dict):
+        return {key: get_query_shape(value) for key, value in body.items()}
+    if isinstance(body, (list, tuple)):
+        shapes = []
+        for element in body:
+            shape = get_query_shape(element)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    if body is None:
+        return None
+    return REDACTED
+
+
+def get_query_fingerprint(shape):
+    """Return a stable fingerprint of the shape of a query.
+
+    Args:
+        shape (dict): the shape of a query, as returned by
+            :func:`get_query_shape`.
+
+    Returns:
+        string: a hash of the shape that does not depend on key order.
+    """
+    serialized = json.dumps(shape, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+class SlowQueryLog(object):
+    """Log the queries sent by the matcher that are slower than a threshold.
+
+    Each entry is a JSON object with the ``config``, ``step`` and ``query``
+    of the query, its redacted ``shape`` and ``fingerprint``, the number of
+    ``hits`` and ``valid_hits``, the ``took`` reported by ES, and the
+    ``compile_time``, ``search_time`` and ``validation_time`` in seconds.
+    Cached queries are never logged.
+
+    The queries sent together in an ``_msearch`` request share the round
+    trip of the request, so they are not logged one by one: a slow request
+    is logged once, with its ``config`` and ``step``, the number of
+    ``queries``, the ``took`` of its slowest query and its ``search_time``,
+    and the distinct ``shapes`` of its queries, each with its
+    ``fingerprint`` and the ``count`` of queries having it.
+
+    Args:
+        threshold (float): the seconds of ``search_time`` from which a query
+            is slow.
+        sample_rate (float): the fraction of the slow queries that are
+            logged, between 0 and 1.
+        logger (logging.Logger): where to log the entries. Ignored when
+            ``path`` is given.
+        path (string): the path of a file to log the entries to, which is
+            rotated when it grows larger than ``max_bytes``, keeping
+            ``backup_count`` old files.
+    """
+
+    def __init__(
+        self,
+        threshold,
+        sample_rate=1.0,
+        logger=None,
+        path=None,
+        max_bytes=0,
+        backup_count=0,
+    ):
+        if threshold is None or threshold < 0:
+            raise ValueError(
+                "Malformed slow-query log. The threshold must be non-negative."
+            )
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(
+                "Malformed slow-query log. The sample rate must be between 0 and 1."
+            )
+
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self._handler = None
+        if path:
+            self._handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count
+            )
+            self._handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger = logging.Logger("inspire_matcher.slow_queries")
+            logger.addHandler(self._handler)
+        elif logger is None:
+            logger = logging.getLogger("inspire_matcher.slow_queries")
+        self.logger = logger
+
+    @classmethod
+    def from_app(cls, app):
+        """Build the slow-query log configured in ``app``.
+
+        The entries are written to ``MATCHER_SLOW_QUERY_LOG_PATH`` if it is
+        set, and to the logger of the app otherwise.
+        """
+        return cls(
+            threshold=app.config["MATCHER_SLOW_QUERY_LOG_THRESHOLD"],
+            sample_rate=app.config["MATCHER_SLOW_QUERY_LOG_SAMPLE_RATE"],
+            logger=app.logger,
+            path=app.config["MATCHER_SLOW_QUERY_LOG_PATH"],
+            max_bytes=app.config["MATCHER_SLOW_QUERY_LOG_MAX_BYTES"],
+            backup_count=app.config["MATCHER_SLOW_QUERY_LOG_BACKUP_COUNT"],
+        )
+
+    def connect(self, app):
+        """Start logging the slow queries sent by ``app``."""
+        query_executed.connect(self._on_query_executed, sender=app)
+        request_executed.connect(self._on_request_executed, sender=app)
+
+    def disconnect(self, app):
+        """Stop logging the slow queries sent by ``app``."""
+        query_executed.disconnect(self._on_query_executed, sender=app)
+        request_executed.disconnect(self._on_request_executed, sender=app)
+
+    def close(self):
+        """Close the log file, if any."""
+        if self._handler is not None:
+            self.logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+
+    def _on_query_executed(self, sender, **measurements):
+        if measurements["cached"] or measurements.get("batched"):
+            return
+        if self._is_logged(measurements["search_time"]):
+            self.logger.warning("Slow matcher query: %s", self._get_entry(measurements))
+
+    def _on_request_executed(self, sender, **measurements):
+        if self._is_logged(measurements["search_time"]):
+            self.logger.warning(
+                "Slow matcher request: %s", self._get_request_entry(measurements)
+            )
+
+    def _is_logged(self, search_time):
+        if search_time < self.threshold:
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @staticmethod
+    def _get_request_entry(measurements):
+        shapes = []
+        for body in measurements["bodies"]:
+            shape = get_query_shape(body)
+            for entry in shapes:
+                if entry["shape"] == shape:
+                    entry["count"] += 1
+                    break
+            else:
+                shapes.append(
+                    {
+                        "shape": shape,
+                        "fingerprint": get_query_fingerprint(shape),
+                        "count": 1,
+                    }
+                )
+
+        entry = {
+            "config": measurements["config"],
+            "step": measurements["step"],
+            "queries": measurements["queries"],
+            "shapes": shapes,
+            "took": measurements["took"],
+            "search_time": measurements["search_time"],
+        }
+        return json.dumps(entry, sort_keys=True)
+
+    @staticmethod
+    def _get_entry(measurements):
+        shape = get_query_shape(measurements.get("body"))
+        entry = {
+            "config": measurements["config"],
+            "step": measurements["step"],
+            "query": measurements["query"],
+            "shape": shape,
+            "fingerprint": get_query_fingerprint(shape),
+            "hits": measurements["hits"],
+            "valid_hits": measurements["valid_hits"],
+            "took": measurements["took"],
+            "compile_time": measurements["compile_time"],
+            "search_time": measurements["search_time"],
+            "validation_time": measurements["validation_time"],
+        }
+        return json.dumps(entry, sort_keys=True)
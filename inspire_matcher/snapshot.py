@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Identifier snapshots.
+
+An identifier snapshot is a file mapping the identifiers of the records in
+an index, like their arXiv eprints and DOIs, to their control numbers. It
+is built with :func:`build_snapshot` and opened with
+:class:`IdentifierSnapshot`, which memory-maps it read-only, so that all the
+worker processes of a host share the same pages.
+
+The file starts with a header, followed by a JSON object with the metadata
+of the snapshot, and by the entries sorted by key. Each entry is the 64-bit
+hash of a search path and a value, followed by a control number, so that a
+lookup is a binary search on the mapped file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from inspire_utils.helpers import force_list
+from inspire_utils.record import get_value
+from six import text_type
+
+MAGIC = b"IMSNAP01"
+
+DEFAULT_IDENTIFIERS = {
+    "arxiv_eprints.value.raw": "arxiv_eprints.value",
+    "dois.value.raw": "dois.value",
+}
+"""Identifiers of the first step of the default configuration."""
+
+_HEADER = struct.Struct("<8sQdI")
+_ENTRY = struct.Struct("<QQ")
+
+
+def _hash(search_path, value):
+    key = "%s\x00%s" % (search_path, text_type(value))
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return struct.unpack("<Q", digest[:8])[0]
+
+
+def build_snapshot(path, records, identifiers=None, index="records-hep"):
+    """Write the identifier snapshot of some records to a file.
+
+    The file is written next to ``path`` and then renamed, so that the
+    processes opening ``path`` never see a partial snapshot. Deleted records
+    are left out.
+
+    Args:
+        path (string): the path of the snapshot file.
+        records (iterable(dict)): the records of the index, with at least
+            their ``control_number``, their ``deleted`` flag and the fields
+            in ``identifiers``, as yielded by a scan of the index.
+        identifiers (dict): for each search path that the snapshot answers,
+            the path of its values in the records. Defaults to
+            :data:`DEFAULT_IDENTIFIERS`.
+        index (string): the unprefixed name of the index of the records.
+
+    Returns:
+        int: the number of entries in the snapshot.
+    """
+    if identifiers is None:
+        identifiers = DEFAULT_IDENTIFIERS
+
+    entries = []
+    for record in records:
+        if record.get("deleted"):
+            continue
+        control_number = int(record["control_number"])
+        for search_path, record_path in identifiers.items():
+            for value in force_list(get_value(record, record_path)):
+                entries.append((_hash(search_path, value), control_number))
+    entries = sorted(set(entries))
+
+    metadata = json.dumps({"index": index, "search_paths": sorted(identifiers)}).encode(
+        "utf-8"
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(entries), time.time(), len(metadata)))
+            f.write(metadata)
+            for entry in entries:
+                f.write(_ENTRY.pack(*entry))
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    return len(entries)
+
+
+class IdentifierSnapshot(object):
+    """A read-only, memory-mapped identifier snapshot.
+
+    Args:
+        path (string): the path of a file written by :func:`build_snapshot`.
+
+    Raises:
+        ValueError: if the file is not an identifier snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, self._size, self.created, length = _HEADER.unpack_from(self._mmap)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError("Malformed snapshot: %s." % path)
+
+        start = _HEADER.size
+        metadata = json.loads(self._mmap[start : start + length].decode("utf-8"))
+        self.index = metadata["index"]
+        self.search_paths = frozenset(metadata["search_paths"])
+        self._offset = start + length
+
+    def __len__(self):
+        return self._size
+
+    def close(self):
+        self._mmap.close()
+
+    def is_stale(self, max_age):
+        """Return whether the snapshot is older than ``max_age`` seconds."""
+        return max_age is not None and time.time() - self.created > max_age
+
+    def lookup(self, search_path, value):
+        """Return the control numbers of the records with an identifier.
+
+        Args:
+            search_path (string): the search path of the identifier, which
+                must be one of the ``search_paths`` of the snapshot.
+            value: the value of the identifier.
+
+        Returns:
+            list(int): the control numbers of the records whose
+            ``search_path`` has this value.
+        """
+        key = _hash(search_path, value)
+
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        result = []
+        while low < self._size:
+            entry_key, control_number = self._get_entry(low)
+            if entry_key != key:
+                break
+            result.append(control_number)
+            low += 1
+
+        return result
+
+    def _get_entry(self, position):
+        return _ENTRY.unpack_from(self._mmap, self._offset + position * _ENTRY.size)
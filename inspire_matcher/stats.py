@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Matcher statistics."""
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+
+from inspire_matcher.signals import query_executed, step_executed
+
+_SUMMED_MEASUREMENTS = (
+    "compile_time",
+    "search_time",
+    "hits",
+    "valid_hits",
+    "validation_time",
+)
+
+
+def _new_entry(**key):
+    entry = dict(key, count=0, cached=0, took=0, max_search_time=0.0, rejected={})
+    for name in _SUMMED_MEASUREMENTS:
+        entry[name] = 0
+    return entry
+
+
+def _aggregate(entry, measurements, count):
+    entry["count"] += count
+    entry["cached"] += measurements["cached"]
+    entry["took"] += measurements["took"] or 0
+    entry["max_search_time"] = max(
+        entry["max_search_time"], measurements["search_time"]
+    )
+    for name in _SUMMED_MEASUREMENTS:
+        entry[name] += measurements[name]
+    for name, rejected in measurements["rejected"].items():
+        entry["rejected"][name] = entry["rejected"].get(name, 0) + rejected
+
+
+def _get_sort_key(key):
+    # The query of a combined step is ``None``, which sorts first.
+    return tuple(-1 if part is None else part for part in key)
+
+
+class MatchStatistics(object):
+    """Aggregate in memory what the matcher signals report.
+
+    The measurements are summed per query and per step of each
+    configuration, and can be read at any time with :meth:`get_queries`
+    and :meth:`get_steps`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._steps = {}
+
+    def connect(self, app):
+        """Start aggregating the signals sent by ``app``."""
+        query_executed.connect(self._on_query_executed, sender=app)
+        step_executed.connect(self._on_step_executed, sender=app)
+
+    def disconnect(self, app):
+        """Stop aggregating the signals sent by ``app``."""
+        query_executed.disconnect(self._on_query_executed, sender=app)
+        step_executed.disconnect(self._on_step_executed, sender=app)
+
+    def get_queries(self):
+        """Return the totals of each query, sorted by configuration, step and query.
+
+        Returns:
+            list(dict): for each query, its ``config``, ``step`` and
+                ``query``, the number of times it was executed in ``count``,
+                how many of them were ``cached``, the ``max_search_time``
+                and the sums of the measurements of :data:`query_executed`.
+        """
+        with self._lock:
+            return self._get_sorted_copies(self._queries)
+
+    def get_steps(self):
+        """Return the totals of each step, sorted by configuration and step.
+
+        Returns:
+            list(dict): as :meth:`get_queries`, with ``count`` being the
+                number of queries executed by the step.
+        """
+        with self._lock:
+            return self._get_sorted_copies(self._steps)
+
+    def reset(self):
+        """Forget all the aggregated measurements."""
+        with self._lock:
+            self._queries.clear()
+            self._steps.clear()
+
+    def _on_query_executed(self, sender, **measurements):
+        key = measurements["config"], measurements["step"], measurements["query"]
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = _new_entry(
+                    config=key[0], step=key[1], query=key[2]
+                )
+            _aggregate(entry, measurements, 1)
+
+    def _on_step_executed(self, sender, **measurements):
+        key = measurements["config"], measurements["step"]
+        with self._lock:
+            entry = self._steps.get(key)
+            if entry is None:
+                entry = self._steps[key] = _new_entry(config=key[0], step=key[1])
+            _aggregate(entry, measurements, measurements["queries"])
+
+    @staticmethod
+    def _get_sorted_copies(entries):
+        return [
+            dict(entries[key], rejected=dict(entries[key]["rejected"]))
+            for key in sorted(entries, key=_get_sort_key)
+        ]
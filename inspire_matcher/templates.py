@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Query templates.
+
+:func:`~inspire_matcher.core.compile` builds the whole body of a query for
+every record. A :class:`QueryTemplate` resolves once what only depends on
+the query specification: the paths, the nested path, the clause options and
+the filters on the collections and on deleted records. Filling it with a
+record then only builds the clauses holding the values of the record.
+
+The parts of the body that do not depend on the record, like the filters,
+are shared by all the bodies filled from a template, so the bodies must not
+be modified in place.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from inspire_utils.helpers import force_list
+from inspire_utils.record import get_value
+
+from inspire_matcher.core import (
+    _compile_exact_values,
+    _compile_fuzzy_clauses,
+    _compile_inner,
+    _compile_nested_fields,
+    _get_filter,
+    _get_fuzzy_clauses,
+    _get_nested_fields,
+)
+
+
+class QueryTemplate(object):
+    """A query specification resolved once for all the records it compiles.
+
+    Filling the template with a record gives the same body as
+    :func:`~inspire_matcher.core.compile` with the same arguments, built by
+    the same functions.
+
+    Args:
+        query (dict): a normalized query specification.
+        collections (list(string)): the collections to restrict the query to.
+        match_deleted (bool): whether to also match deleted records.
+
+    Raises:
+        ValueError: if the ``paths`` and ``search_paths`` of a nested query
+            are malformed.
+    """
+
+    def __init__(self, query, collections=None, match_deleted=False):
+        self.query = query
+        self._filter = _get_filter(collections, match_deleted)
+
+        type_ = query.get("type")
+        if type_ == "exact":
+            self._path = query["path"]
+            self._search_path = query["search_path"]
+            self._fill = self._fill_exact
+        elif type_ == "fuzzy":
+            self._clauses = _get_fuzzy_clauses(query)
+            self._fill = self._fill_fuzzy
+        elif type_ in ("nested", "nested-prefix"):
+            self._nested_path, self._fields = _get_nested_fields(
+                query, prefix=type_ == "nested-prefix"
+            )
+            self._fill = self._fill_nested
+        else:
+            self._fill = self._fill_inner
+
+    def fill(self, record):
+        """Return the body of the query for a record, or ``None``."""
+        result = self._fill(record)
+        if not result or self._filter is None:
+            return result
+
+        return {
+            "query": {
+                "bool": {
+                    "must": result["query"],
+                    "filter": self._filter,
+                },
+            },
+        }
+
+    def _fill_exact(self, record):
+        return _compile_exact_values(
+            self._search_path, force_list(get_value(record, self._path))
+        )
+
+    def _fill_fuzzy(self, record):
+        return _compile_fuzzy_clauses(self._clauses, record)
+
+    def _fill_nested(self, record):
+        return _compile_nested_fields(
+            self.query, self._nested_path, self._fields, record
+        )
+
+    def _fill_inner(self, record):
+        return _compile_inner(self.query, record)
@@ -22,29 +22,129 @@
 
 from __future__ import absolute_import, division, print_function
 
-from inspire_json_merger.comparators import AuthorComparator
+from flask import current_app, has_app_context
+from inspire_json_merger.comparators import (
+    AuthorComparator,
+    AuthorNameNormalizer,
+    IDNormalizer,
+    author_tokenize,
+)
 
+from inspire_matcher.config import MATCHER_AUTHOR_BLOCKING_THRESHOLD
 
-def get_number_of_author_matches(x_authors, y_authors):
+_ID_NORMALIZERS = [
+    IDNormalizer("ORCID"),
+    IDNormalizer("INSPIRE ID"),
+    IDNormalizer("INSPIRE BAI"),
+]
+_NAME_NORMALIZER = AuthorNameNormalizer(
+    author_tokenize, first_names_number=1, first_name_to_initial=True, asciify=True
+)
+
+
+def _get_blocking_threshold():
+    if has_app_context():
+        return current_app.config.get(
+            "MATCHER_AUTHOR_BLOCKING_THRESHOLD", MATCHER_AUTHOR_BLOCKING_THRESHOLD
+        )
+    return MATCHER_AUTHOR_BLOCKING_THRESHOLD
+
+
+def get_author_keys(author):
+    """Return the keys grouping an author with the ones it can match.
+
+    Args:
+        author (dict): a schema-compliant author.
+
+    Returns:
+        list(tuple): the normalized last names and first initial of the
+        author, and its ORCID, INSPIRE ID and BAI.
+    """
+    keys = [("name",) + _NAME_NORMALIZER(author)]
+    for i, normalizer in enumerate(_ID_NORMALIZERS):
+        value = normalizer(author)
+        if value:
+            keys.append((i, value))
+    return keys
+
+
+def _iter_blocks(x_authors, y_authors, x_keys=None):
+    """Yield the groups of authors that can match each other.
+
+    Two authors are in the same group if they share their normalized last
+    names and first initial, or one of their identifiers, directly or
+    through other authors of the group.
+    """
+    if x_keys is None:
+        x_keys = [get_author_keys(author) for author in x_authors]
+    y_keys = [get_author_keys(author) for author in y_authors]
+
+    authors = [(0, author) for author in x_authors] + [
+        (1, author) for author in y_authors
+    ]
+    parents = list(range(len(authors)))
+
+    def _find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    owners = {}
+    for i, keys in enumerate(x_keys + y_keys):
+        for key in keys:
+            owner = owners.setdefault(key, i)
+            parents[_find(i)] = _find(owner)
+
+    blocks = {}
+    for i, (side, author) in enumerate(authors):
+        blocks.setdefault(_find(i), ([], []))[side].append(author)
+
+    for x_block, y_block in blocks.values():
+        if x_block and y_block:
+            yield x_block, y_block
+
+
+def get_number_of_author_matches(x_authors, y_authors, x_keys=None):
     """Return the number of matches between two lists of authors.
 
+    When one of the lists has more than ``MATCHER_AUTHOR_BLOCKING_THRESHOLD``
+    authors, they are first grouped by their normalized last names and first
+    initial, and by their identifiers, and only the authors of the same group
+    are compared. This takes a time roughly linear in the number of authors
+    instead of quadratic, but is not equivalent to comparing all the authors:
+    it misses the matches between authors whose names differ beyond the order
+    of their names, their accents and their first initial, like typos in the
+    last name or a missing first name, so it can return fewer matches.
+
     Args:
         x_authors (list(dict)): a schema-compliant list of authors.
         y_authors (list(dict)): another schema-compliant list of authors.
+        x_keys (list(list(tuple))): the :func:`get_author_keys` of each
+            author in ``x_authors``, if already computed.
 
     Returns:
         int: the number of matching authors between the two lists.
 
     """
-    return len(AuthorComparator(x_authors, y_authors).matches)
+    threshold = _get_blocking_threshold()
+    if threshold is None or max(len(x_authors), len(y_authors)) <= threshold:
+        return len(AuthorComparator(x_authors, y_authors).matches)
+
+    return sum(
+        len(AuthorComparator(x_block, y_block).matches)
+        for x_block, y_block in _iter_blocks(x_authors, y_authors, x_keys)
+    )
 
 
-def compute_author_match_score(x_authors, y_authors):
+def compute_author_match_score(x_authors, y_authors, x_keys=None):
     """Return the matching score of 2 given lists of authors.
 
     Args:
         x_authors (list(dict)): first schema-compliant list of authors.
         y_authors (list(dict)): second schema-compliant list of authors.
+        x_keys (list(list(tuple))): the :func:`get_author_keys` of each
+            author in ``x_authors``, if already computed.
 
     Returns:
         float: matching score of authors.
@@ -56,7 +156,7 @@ def compute_author_match_score(x_authors, y_authors):
     if not x_authors or not y_authors:
         return 1.0
 
-    matches = get_number_of_author_matches(x_authors, y_authors)
+    matches = get_number_of_author_matches(x_authors, y_authors, x_keys)
     max_length = max(len(x_authors), len(y_authors))
 
     return matches / float(max_length)
@@ -98,6 +198,11 @@ def get_tokenized_title(title):
     return set(title.lower().split())
 
 
+def title_has_math(title):
+    """Return whether a title contains math."""
+    return "<math>" in title or "$" in title
+
+
 def compute_title_score(x_title, y_title, threshold, math_threshold):
     """Compute a score for a pair of titles.
 
@@ -112,13 +217,121 @@ def compute_title_score(x_title, y_title, threshold, math_threshold):
         float: a score indicating the overlap of both titles, which is ``0`` if
             below the threshold
     """
-    x_title_tokens = get_tokenized_title(x_title)
-    y_title_tokens = get_tokenized_title(y_title)
-    current_title_jaccard = compute_jaccard_index(x_title_tokens, y_title_tokens)
+    return compute_tokenized_title_score(
+        get_tokenized_title(x_title),
+        get_tokenized_title(y_title),
+        title_has_math(x_title) or title_has_math(y_title),
+        threshold,
+        math_threshold,
+    )
+
+
+def compute_tokenized_title_score(
+    x_tokens, y_tokens, some_title_has_math, threshold, math_threshold
+):
+    """Compute a score for a pair of titles already tokenized.
+
+    Args:
+        x_tokens (set): the :func:`get_tokenized_title` of one title.
+        y_tokens (set): the :func:`get_tokenized_title` of the other title.
+        some_title_has_math (bool): whether any of the titles has math.
+        threshold (float): minimum overlap for the score to be non-zero in general.
+        math_threshold (float): minimum overlap for the score to be
+            non-zero in the presence of math in any of the titles.
 
-    some_title_has_math = (
-        "<math>" in x_title or "$" in x_title or "<math>" in y_title or "$" in y_title
+    Returns:
+        float: the score of :func:`compute_title_score`.
+    """
+    return _apply_title_threshold(
+        compute_jaccard_index(x_tokens, y_tokens),
+        some_title_has_math,
+        threshold,
+        math_threshold,
     )
+
+
+def _apply_title_threshold(jaccard, some_title_has_math, threshold, math_threshold):
     current_threshold = math_threshold if some_title_has_math else threshold
 
-    return current_title_jaccard if current_title_jaccard >= current_threshold else 0.0
+    return jaccard if jaccard >= current_threshold else 0.0
+
+
+def _count_bits(number):
+    return bin(number).count("1")
+
+
+_count_bits = getattr(int, "bit_count", _count_bits)
+
+
+class TitleScorer(object):
+    """Score many titles against the titles of a record at once.
+
+    The tokens of the record titles are numbered, and each title is encoded
+    as an integer with one bit set per token, so that the size of the
+    intersection of two titles is the number of bits set in the ``and`` of
+    their encodings. The scores are the same as the ones of
+    :func:`compute_title_score`.
+
+    Args:
+        titles (list(string)): the titles of the record.
+    """
+
+    def __init__(self, titles):
+        self._bits = {}
+        self._titles = []
+        for title in titles:
+            tokens = get_tokenized_title(title)
+            self._titles.append(
+                (self._encode(tokens, add=True), len(tokens), title_has_math(title))
+            )
+
+    def _encode(self, tokens, add=False):
+        encoding = 0
+        for token in tokens:
+            bit = self._bits.get(token)
+            if bit is None:
+                if not add:
+                    continue
+                bit = self._bits[token] = len(self._bits)
+            encoding |= 1 << bit
+        return encoding
+
+    def score(self, titles, threshold, math_threshold):
+        """Return the best score of some titles against the record titles.
+
+        Args:
+            titles (list(string)): the titles to score.
+            threshold (float): minimum overlap for the score to be non-zero
+                in general.
+            math_threshold (float): minimum overlap for the score to be
+                non-zero in the presence of math in any of the titles.
+
+        Returns:
+            float: the maximum of :func:`compute_title_score` over the pairs
+            of a record title and one of ``titles``.
+
+        Raises:
+            ValueError: if there are no pairs of titles.
+        """
+        scores = []
+        for title in titles:
+            tokens = get_tokenized_title(title)
+            encoding, length = self._encode(tokens), len(tokens)
+            has_math = title_has_math(title)
+            for x_encoding, x_length, x_has_math in self._titles:
+                if not x_length or not length:
+                    scores.append(0.0)
+                    continue
+
+                # As in :func:`compute_jaccard_index`, on the encodings.
+                intersection_cardinal = _count_bits(x_encoding & encoding)
+                union_cardinal = x_length + length - intersection_cardinal
+                scores.append(
+                    _apply_title_threshold(
+                        intersection_cardinal / float(union_cardinal),
+                        x_has_math or has_math,
+                        threshold,
+                        math_threshold,
+                    )
+                )
+        return max(scores)
@@ -24,18 +24,34 @@
 
 from __future__ import absolute_import, division, print_function
 
-from itertools import product
-
 from inspire_utils.record import get_value
 
-from inspire_matcher.utils import compute_author_match_score, compute_title_score
+from inspire_matcher.context import RecordContext, uses_record_context
+from inspire_matcher.utils import compute_author_match_score
+
+
+def source_fields(*fields):
+    """Declare the ``_source`` fields of the hits that a validator reads.
+
+    The matcher then adds them to the ``source`` of the configuration in the
+    steps using the validator, so that they need not be listed by hand.
+    """
 
+    def _decorator(validator):
+        validator.source_fields = fields
+        return validator
 
+    return _decorator
+
+
+@source_fields()
 def default_validator(record, result):
     return True
 
 
-def authors_titles_validator(record, result):
+@source_fields("authors.full_name", "authors.ids", "titles.title")
+@uses_record_context
+def authors_titles_validator(record, result, context=None):
     """Compute a validation score for the possible match.
 
     The score is based on a similarity score of the authors sets and
@@ -50,30 +66,33 @@ def authors_titles_validator(record, result):
             with similar ones in INSPIRE.
         result (dict): possible match returned by the ES query
             that needs to be validated.
+        context (RecordContext): the features of ``record``, if already
+            computed.
 
     Returns:
         bool: validation decision.
 
     """
-    record_authors = get_value(record, "authors", [])
+    if context is None:
+        context = RecordContext(record)
+
     result_authors = get_value(result, "_source.authors", [])
 
-    author_score = compute_author_match_score(record_authors, result_authors)
+    author_score = compute_author_match_score(
+        context.authors, result_authors, context.author_keys
+    )
 
-    record_titles = get_value(record, "titles.title", [])
     result_titles = get_value(result, "_source.titles.title", [])
-
-    title_score = max(
-        compute_title_score(
-            record_title, result_title, threshold=0.5, math_threshold=0.3
-        )
-        for (record_title, result_title) in product(record_titles, result_titles)
+    title_score = context.title_scorer.score(
+        result_titles, threshold=0.5, math_threshold=0.3
     )
 
     return (author_score + title_score) / 2 > 0.5
 
 
-def cds_identifier_validator(record, result):
+@source_fields("external_system_identifiers")
+@uses_record_context
+def cds_identifier_validator(record, result, context=None):
     """Ensure that the two records have the same CDS identifier.
 
     This is needed because the search is done only for
@@ -92,37 +111,41 @@ def cds_identifier_validator(record, result):
 
     """
 
-    record_external_identifiers = get_value(record, "external_system_identifiers", [])
+    if context is None:
+        context = RecordContext(record)
+
     result_external_identifiers = get_value(
         result, "_source.external_system_identifiers", []
     )
 
-    record_external_identifiers = {
-        external_id["value"]
-        for external_id in record_external_identifiers
-        if external_id["schema"] == "CDS"
-    }
     result_external_identifiers = {
         external_id["value"]
         for external_id in result_external_identifiers
         if external_id["schema"] == "CDS"
     }
 
-    return bool(record_external_identifiers & result_external_identifiers)
+    return bool(context.cds_identifiers & result_external_identifiers)
 
 
-def persistent_identifier_validator(record, result):
-    record_pids = get_value(record, "persistent_identifiers", [])
-    result_pids = get_value(result, "_source.persistent_identifiers", [])
+@source_fields("persistent_identifiers")
+@uses_record_context
+def persistent_identifier_validator(record, result, context=None):
+    if context is None:
+        context = RecordContext(record)
 
-    record_pid_values = {frozenset(pid.values()) for pid in record_pids}
+    result_pids = get_value(result, "_source.persistent_identifiers", [])
     result_pid_values = {frozenset(pid.values()) for pid in result_pids}
 
-    return bool(record_pid_values & result_pid_values)
+    return bool(context.persistent_identifiers & result_pid_values)
+
 
+@source_fields("arxiv_eprints.value")
+@uses_record_context
+def arxiv_eprints_validator(record, result, context=None):
+    if context is None:
+        context = RecordContext(record)
 
-def arxiv_eprints_validator(record, result):
-    record_eprints = set(get_value(record, "arxiv_eprints.value", []))
+    record_eprints = context.arxiv_eprints
     result_eprints = set(get_value(result, "_source.arxiv_eprints.value", []))
     if not record_eprints or not result_eprints:
         return True
@@ -32,6 +32,8 @@ with open("README.rst") as f:
     readme = f.read()
 
 install_requires = [
+    "blinker>=1.4",
+    'futures>=3.0.0; python_version <= "2.7"',
     "inspire-json-merger>=11.0.0",
     "inspire-utils>=3.0.0",
     "invenio-search>=1.2.3",
@@ -71,11 +73,29 @@ extras_require = {
         "opensearch-py>=3.0.0,<4.0.0",
         "opensearch-dsl>=2.0.0,<3.0.0",
     ],
+    "elasticsearch7-async": [
+        "elasticsearch[async]~=7.0",
+    ],
+    "opensearch2-async": [
+        "opensearch-py[async]>=2.0.0,<3.0.0",
+    ],
+    "opensearch3-async": [
+        "opensearch-py[async]>=3.0.0,<4.0.0",
+    ],
 }
 
+search_extras = (
+    "opensearch2",
+    "opensearch3",
+    "elasticsearch7",
+    "elasticsearch7-async",
+    "opensearch2-async",
+    "opensearch3-async",
+)
+
 extras_require["all"] = []
 for name, reqs in extras_require.items():
-    if name not in ("opensearch2", "opensearch3", "elasticsearch7"):
+    if name not in search_extras:
         extras_require["all"].extend(reqs)
 
 packages = find_packages(exclude=["docs"])
@@ -96,6 +116,9 @@ setup(
     tests_require=tests_require,
     extras_require=extras_require,
     entry_points={
+        "console_scripts": [
+            "inspire-matcher = inspire_matcher.cli:main",
+        ],
         "invenio_base.apps": [
             "inspire_matcher = inspire_matcher:InspireMatcher",
         ],
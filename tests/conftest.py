@@ -22,6 +22,8 @@
 
 from __future__ import absolute_import, division, print_function
 
+import sys
+
 import pytest
 from flask import Flask
 from invenio_search import InvenioSearch
@@ -42,3 +44,7 @@ def app():
 def app_context(app):
     with app.app_context():
         yield app
+
+
+if sys.version_info[0] < 3:
+    collect_ignore = ["test_aio.py"]
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+import asyncio
+
+import mock
+import pytest
+from flask import Flask
+
+from inspire_matcher import InspireMatcher
+from inspire_matcher.aio import amatch, amatch_authors, amatch_batch
+
+
+class AsyncClient(object):
+    def __init__(self, search=None, msearch=None):
+        self.search_mock = mock.Mock(side_effect=search)
+        self.msearch_mock = mock.Mock(side_effect=msearch)
+
+    async def search(self, **kwargs):
+        return self.search_mock(**kwargs)
+
+    async def msearch(self, **kwargs):
+        return self.msearch_mock(**kwargs)
+
+
+async def _collect(async_iterable):
+    return [item async for item in async_iterable]
+
+
+CONFIG = {
+    "algorithm": [
+        {
+            "queries": [
+                {
+                    "type": "exact",
+                    "path": "arxiv_eprints.value",
+                    "search_path": "arxiv_eprints.value.raw",
+                },
+                {
+                    "type": "exact",
+                    "path": "dois.value",
+                    "search_path": "dois.value.raw",
+                },
+            ],
+        },
+    ],
+    "index": "records-hep",
+}
+
+
+def test_amatch_yields_the_valid_hits_in_order():
+    client = AsyncClient(
+        search=[
+            {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}},
+            {"hits": {"hits": [{"_id": "3"}]}},
+        ]
+    )
+    dummy_validator = mock.Mock(side_effect=lambda record, hit: hit["_id"] != "2")
+    config = dict(CONFIG, algorithm=[dict(CONFIG["algorithm"][0])])
+    config["algorithm"][0]["validator"] = dummy_validator
+    record = {
+        "arxiv_eprints": [{"value": "1601.02340"}],
+        "dois": [{"value": "10.1103/PhysRevD.93.063518"}],
+    }
+
+    result = asyncio.run(_collect(amatch(record, config, client=client)))
+
+    assert result == [{"_id": "1"}, {"_id": "3"}]
+    assert client.search_mock.call_count == 2
+    assert client.search_mock.call_args_list[0][1]["index"] == "records-hep"
+    assert client.search_mock.call_args_list[0][1]["size"] == 10
+
+
+def test_amatch_skips_queries_without_values():
+    client = AsyncClient(search=[{"hits": {"hits": [{"_id": "1"}]}}])
+    record = {"dois": [{"value": "10.1103/PhysRevD.93.063518"}]}
+
+    result = asyncio.run(_collect(amatch(record, CONFIG, client=client)))
+
+    assert result == [{"_id": "1"}]
+    assert client.search_mock.call_count == 1
+
+
+def test_amatch_batch_sends_one_msearch_per_chunk_and_step():
+    client = AsyncClient(
+        msearch=[
+            {"responses": [{"hits": {"hits": [{"_id": "1"}]}}]},
+            {"responses": [{"hits": {"hits": []}}]},
+        ]
+    )
+    records = [
+        {"arxiv_eprints": [{"value": "1601.02340"}]},
+        {"dois": [{"value": "10.1103/PhysRevD.93.063518"}]},
+    ]
+
+    result = asyncio.run(
+        _collect(amatch_batch(records, CONFIG, chunk_size=1, client=client))
+    )
+
+    assert result == [(records[0], [{"_id": "1"}]), (records[1], [])]
+    assert client.msearch_mock.call_count == 2
+
+
+def test_amatch_authors_returns_the_hits_of_each_author():
+    client = AsyncClient(
+        msearch=[
+            {
+                "responses": [
+                    {"hits": {"hits": []}},
+                    {"hits": {"hits": [{"_id": "1"}]}},
+                ]
+            },
+        ]
+    )
+    config = {
+        "algorithm": [{"queries": [{"type": "author-names"}]}],
+        "index": "records-hep",
+    }
+    authors = [{"full_name": "Smith, John"}, {"full_name": "Doe, Jane"}]
+
+    result = asyncio.run(amatch_authors(authors, config, client=client))
+
+    assert result == [[], [{"_id": "1"}]]
+    assert client.msearch_mock.call_count == 1
+
+
+def test_amatch_sends_the_queries_of_parallel_configurations_at_once():
+    client = AsyncClient()
+    started = []
+
+    async def search(**kwargs):
+        started.append(kwargs["body"])
+        await asyncio.sleep(0)
+        assert len(started) == 2
+        return {"hits": {"hits": [{"_id": str(len(started))}]}}
+
+    client.search = search
+    config = dict(CONFIG, parallel=True)
+    record = {
+        "arxiv_eprints": [{"value": "1601.02340"}],
+        "dois": [{"value": "10.1103/PhysRevD.93.063518"}],
+    }
+
+    result = asyncio.run(_collect(amatch(record, config, client=client)))
+
+    assert result == [{"_id": "2"}, {"_id": "2"}]
+
+
+def test_default_client_is_built_from_the_search_configuration():
+    app = Flask(__name__)
+    app.config["SEARCH_HOSTS"] = [{"host": "search", "port": 9200}]
+    app.config["SEARCH_CLIENT_CONFIG"] = {"timeout": 30}
+    matcher = InspireMatcher(app)
+    search_mock = mock.Mock(spec=["AsyncOpenSearch", "AsyncElasticsearch"])
+
+    search_mock.AsyncOpenSearch.side_effect = lambda **kwargs: mock.Mock()
+
+    async def get_clients():
+        return matcher.async_search_client, matcher.async_search_client
+
+    with (
+        mock.patch("invenio_search.engine.search", search_mock),
+        mock.patch("invenio_search.engine.SEARCH_DISTRIBUTION", "OpenSearch"),
+    ):
+        first_client, same_client = asyncio.run(get_clients())
+        other_client, _ = asyncio.run(get_clients())
+
+    search_mock.AsyncOpenSearch.assert_called_with(
+        hosts=[{"host": "search", "port": 9200}], timeout=30
+    )
+    assert same_client is first_client
+    assert other_client is not first_client
+
+
+def test_default_client_needs_a_running_event_loop():
+    matcher = InspireMatcher(Flask(__name__))
+
+    with pytest.raises(RuntimeError):
+        matcher.async_search_client  # noqa: B018
+
+
+def test_default_client_raises_without_the_async_dependencies():
+    matcher = InspireMatcher(Flask(__name__))
+
+    async def get_client():
+        return matcher.async_search_client
+
+    with (
+        mock.patch("invenio_search.engine.search", mock.Mock(spec=[])),
+        mock.patch("invenio_search.engine.SEARCH_DISTRIBUTION", "OpenSearch"),
+        pytest.raises(ImportError, match="opensearch2-async"),
+    ):
+        asyncio.run(get_client())
@@ -22,10 +22,23 @@
 
 from __future__ import absolute_import, division, print_function
 
+import threading
+import time
+
 import mock
 import pytest
+from flask import Flask
 
-from inspire_matcher.api import match
+from inspire_matcher.api import match, match_authors, match_batch, match_references
+from inspire_matcher.bloom import IdentifierFilter
+from inspire_matcher.cache import ResultCache
+from inspire_matcher.signals import (
+    match_executed,
+    query_executed,
+    references_matched,
+    step_executed,
+)
+from inspire_matcher.snapshot import build_snapshot
 
 
 def test_match_raises_if_the_configuration_does_not_have_all_the_keys():
@@ -39,6 +52,34 @@ def test_match_raises_if_the_configuration_does_not_have_all_the_keys():
     assert "Malformed configuration" in str(excinfo.value)
 
 
+@mock.patch("inspire_matcher.api.es")
+def test_match_works_without_the_extension_given_a_configuration(es_mock):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+    es_mock.msearch.return_value = {"responses": [{"hits": {"hits": []}}]}
+    app = Flask(__name__)
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+        "name": "without-extension",
+    }
+    record = {"arxiv_eprints": [{"value": "1601.02340"}]}
+
+    with app.app_context():
+        assert list(match(record, config)) == [{"_id": "1"}]
+        assert list(match_batch([record], config)) == [(record, [])]
+        assert match_authors([{"full_name": "Smith, John"}], AUTHORS_CONFIG) == [[]]
+
+
 def test_match_raises_if_one_step_of_the_algorithm_has_no_queries():
     config = {
         "algorithm": [
@@ -247,3 +288,1047 @@ def test_match_raises_if_inner_hits_param_has_wrong_config():
     ) as excinfo:
         list(match(None, config))
     assert "Malformed query" in str(excinfo.value)
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_sends_one_msearch_per_step(es_mock):
+    es_mock.msearch.side_effect = [
+        {
+            "responses": [
+                {"hits": {"hits": []}},
+                {"hits": {"hits": [{"_id": "1"}]}},
+            ],
+        },
+        {
+            "responses": [
+                {"hits": {"hits": [{"_id": "2"}]}},
+            ],
+        },
+    ]
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dois.value",
+                        "search_path": "dois.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+        "source": ["control_number"],
+    }
+    records = [
+        {
+            "arxiv_eprints": [{"value": "1601.02340"}],
+            "dois": [{"value": "10.1103/PhysRevD.93.063518"}],
+        },
+        {
+            "arxiv_eprints": [{"value": "1712.05946"}],
+        },
+    ]
+
+    result = list(match_batch(records, config))
+
+    assert result == [(records[0], [{"_id": "2"}]), (records[1], [{"_id": "1"}])]
+    assert es_mock.msearch.call_count == 2
+    first_body = es_mock.msearch.call_args_list[0][1]["body"]
+    assert len(first_body) == 4
+    assert first_body[0] == {"index": "records-hep"}
+    assert first_body[1]["size"] == 10
+    assert first_body[1]["_source"] == ["control_number"]
+    second_body = es_mock.msearch.call_args_list[1][1]["body"]
+    assert second_body[1]["query"]["bool"]["must"]["bool"]["should"] == [
+        {"match": {"dois.value.raw": "10.1103/PhysRevD.93.063518"}},
+    ]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_uses_the_given_validator(es_mock):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}},
+        ],
+    }
+    dummy_validator = mock.Mock(side_effect=lambda record, hit: hit["_id"] == "2")
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dummy.path",
+                        "search_path": "dummy.search.path",
+                    },
+                ],
+                "validator": dummy_validator,
+            },
+        ],
+        "index": "records-hep",
+    }
+    record = {"dummy": {"path": "Non empty value"}}
+
+    result = list(match_batch([record], config))
+
+    assert result == [(record, [{"_id": "2"}])]
+    dummy_validator.assert_called_with(record, {"_id": "2"})
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_splits_records_in_chunks(es_mock):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": []}},
+            {"hits": {"hits": []}},
+        ],
+    }
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dummy.path",
+                        "search_path": "dummy.search.path",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+    records = [{"dummy": {"path": str(i)}} for i in range(4)]
+
+    result = list(match_batch(iter(records), config, chunk_size=2))
+
+    assert [record for record, _ in result] == records
+    assert es_mock.msearch.call_count == 2
+
+
+AUTHORS_CONFIG = {
+    "algorithm": [
+        {
+            "queries": [
+                {"type": "author-names"},
+                {
+                    "type": "nested",
+                    "paths": ["full_name", "affiliations.value"],
+                    "search_paths": [
+                        "authors.full_name",
+                        "authors.affiliations.value",
+                    ],
+                },
+            ],
+        },
+    ],
+    "index": "records-hep",
+}
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_authors_sends_the_queries_of_all_authors_at_once(es_mock):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": [{"_id": "1"}]}},
+            {"hits": {"hits": []}},
+            {"hits": {"hits": []}},
+            {"hits": {"hits": [{"_id": "2"}]}},
+            {"hits": {"hits": []}},
+        ],
+    }
+    authors = [
+        {"full_name": "Smith, John", "affiliations": [{"value": "CERN"}]},
+        {"full_name": "Doe, Jane"},
+        {"full_name": "Roe, Richard", "affiliations": [{"value": "DESY"}]},
+    ]
+
+    result = match_authors(authors, AUTHORS_CONFIG)
+
+    assert result == [[{"_id": "1"}], [], [{"_id": "2"}]]
+    es_mock.search.assert_not_called()
+    es_mock.msearch.assert_called_once()
+    body = es_mock.msearch.call_args[1]["body"]
+    assert len(body) == 10
+    assert [
+        request["query"]["bool"]["must"]["nested"]["path"] for request in body[1::2]
+    ] == ["authors"] * 5
+    assert body[3]["query"]["bool"]["must"]["nested"]["query"]["bool"]["must"] == [
+        {"match": {"authors.full_name": {"query": "Smith, John", "operator": "OR"}}},
+        {
+            "match": {
+                "authors.affiliations.value": {"query": ["CERN"], "operator": "OR"}
+            }
+        },
+    ]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_authors_splits_authors_in_chunks(es_mock, app):
+    es_mock.msearch.return_value = {"responses": [{"hits": {"hits": []}}] * 4}
+    authors = [{"full_name": "Smith, John %d" % i} for i in range(4)]
+
+    app.config["MATCHER_AUTHORS_CHUNK_SIZE"] = 2
+    try:
+        result = match_authors(authors, AUTHORS_CONFIG)
+    finally:
+        app.config["MATCHER_AUTHORS_CHUNK_SIZE"] = 500
+
+    assert result == [[], [], [], []]
+    assert es_mock.msearch.call_count == 2
+
+
+REFERENCES_CONFIG = {
+    "algorithm": [
+        {
+            "queries": [
+                {
+                    "type": "exact",
+                    "path": "reference.arxiv_eprint",
+                    "search_path": "arxiv_eprints.value.raw",
+                },
+            ],
+        },
+    ],
+    "index": "records-hep",
+    "name": "references",
+}
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_references_sends_identical_queries_once(es_mock):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": [{"_id": "1"}]}},
+            {"hits": {"hits": []}},
+        ],
+    }
+    references = [
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+        {"reference": {"arxiv_eprint": "1703.04525"}},
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+    ]
+
+    result = match_references(references, REFERENCES_CONFIG)
+
+    assert result == [[{"_id": "1"}], [], [{"_id": "1"}]]
+    es_mock.msearch.assert_called_once()
+    assert len(es_mock.msearch.call_args[1]["body"]) == 4
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_references_reuses_responses_across_chunks(es_mock, app):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": [{"_id": "1"}]}},
+            {"hits": {"hits": []}},
+        ],
+    }
+    dummy_validator = mock.Mock(return_value=True)
+    config = dict(REFERENCES_CONFIG)
+    config["algorithm"] = [dict(config["algorithm"][0], validator=dummy_validator)]
+    references = [
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+        {"reference": {"arxiv_eprint": "1703.04525"}},
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+    ]
+    reports = []
+
+    def on_references_matched(sender, **report):
+        reports.append(report)
+
+    with references_matched.connected_to(on_references_matched, sender=app):
+        result = match_references(references, config, chunk_size=2)
+
+    assert result == [[{"_id": "1"}], [], [{"_id": "1"}], [{"_id": "1"}]]
+    assert es_mock.msearch.call_count == 1
+    assert dummy_validator.call_count == 3
+    assert reports == [
+        {"config": "references", "references": 4, "sent": 2, "saved": 2},
+    ]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_raises_on_failed_search(es_mock):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"error": {"type": "search_phase_execution_exception"}},
+        ],
+    }
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dummy.path",
+                        "search_path": "dummy.search.path",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+
+    with pytest.raises(RuntimeError, match="Search failed in step 0"):
+        list(match_batch([{"dummy": {"path": "value"}}], config))
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_caches_results_unless_the_step_opts_out(es_mock, app):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dummy.path",
+                        "search_path": "dummy.search.path",
+                    },
+                ],
+            },
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dummy.path",
+                        "search_path": "dummy.other.search.path",
+                    },
+                ],
+                "cache": False,
+            },
+        ],
+        "index": "records-hep",
+    }
+    record = {"dummy": {"path": "Non empty value"}}
+    cache = ResultCache(maxsize=10, ttl=10)
+
+    with mock.patch.object(app.extensions["inspire-matcher"], "result_cache", cache):
+        assert list(match(record, config)) == [{"_id": "1"}, {"_id": "1"}]
+        assert list(match(record, config)) == [{"_id": "1"}, {"_id": "1"}]
+
+    assert es_mock.search.call_count == 3
+    assert cache.stats == {"hits": 1, "misses": 1, "size": 1}
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_only_sends_uncached_queries(es_mock, app):
+    es_mock.msearch.side_effect = [
+        {"responses": [{"hits": {"hits": [{"_id": "1"}]}}]},
+        {"responses": [{"hits": {"hits": []}}]},
+    ]
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dummy.path",
+                        "search_path": "dummy.search.path",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+    records = [
+        {"dummy": {"path": "first"}},
+        {"dummy": {"path": "second"}},
+    ]
+    cache = ResultCache(maxsize=10, ttl=10)
+
+    with mock.patch.object(app.extensions["inspire-matcher"], "result_cache", cache):
+        list(match_batch(records[:1], config))
+        result = list(match_batch(records, config))
+
+    assert result == [(records[0], [{"_id": "1"}]), (records[1], [])]
+    assert len(es_mock.msearch.call_args_list[1][1]["body"]) == 2
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_deduplicates_hits_across_queries_and_steps(es_mock):
+    es_mock.search.side_effect = [
+        {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}},
+        {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}, {"_id": "3"}]}},
+        {"hits": {"hits": [{"_id": "3"}, {"_source": {"control_number": 4}}]}},
+    ]
+    first_validator = mock.Mock(side_effect=lambda record, hit: hit["_id"] != "2")
+    second_validator = mock.Mock(return_value=True)
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                    {
+                        "type": "exact",
+                        "path": "dois.value",
+                        "search_path": "dois.value.raw",
+                    },
+                ],
+                "validator": first_validator,
+            },
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dois.value",
+                        "search_path": "dois.value",
+                    },
+                ],
+                "validator": second_validator,
+            },
+        ],
+        "deduplicate": True,
+        "index": "records-hep",
+    }
+    record = {
+        "arxiv_eprints": [{"value": "1601.02340"}],
+        "dois": [{"value": "10.1103/PhysRevD.93.063518"}],
+    }
+
+    result = list(match(record, config))
+
+    assert result == [
+        {"_id": "1"},
+        {"_id": "3"},
+        {"_source": {"control_number": 4}},
+    ]
+    assert first_validator.call_count == 3
+    assert second_validator.call_count == 1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_combines_the_queries_of_a_step(es_mock):
+    es_mock.search.return_value = {
+        "hits": {
+            "hits": [
+                {"_id": "1", "matched_queries": ["query-1"]},
+                {"_id": "2", "matched_queries": ["query-1", "query-0"]},
+                {"_id": "3", "matched_queries": ["query-0"]},
+            ],
+        },
+    }
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                    {
+                        "type": "exact",
+                        "path": "dois.value",
+                        "search_path": "dois.value.raw",
+                    },
+                ],
+                "combine_queries": True,
+            },
+        ],
+        "index": "records-hep",
+    }
+    record = {
+        "arxiv_eprints": [{"value": "1601.02340"}],
+        "dois": [{"value": "10.1103/PhysRevD.93.063518"}],
+    }
+
+    result = list(match(record, config))
+
+    assert [hit["_id"] for hit in result] == ["2", "3", "1"]
+    assert es_mock.search.call_count == 1
+    body = es_mock.search.call_args[1]["body"]
+    clauses = body["query"]["bool"]["must"]["bool"]["should"]
+    assert [clause["bool"]["_name"] for clause in clauses] == ["query-0", "query-1"]
+
+
+EARLY_TERMINATION_CONFIG = {
+    "algorithm": [
+        {
+            "queries": [
+                {
+                    "type": "exact",
+                    "path": "arxiv_eprints.value",
+                    "search_path": "arxiv_eprints.value.raw",
+                },
+                {
+                    "type": "exact",
+                    "path": "dois.value",
+                    "search_path": "dois.value.raw",
+                },
+            ],
+        },
+        {
+            "queries": [
+                {
+                    "type": "fuzzy",
+                    "clauses": [{"path": "titles"}],
+                },
+            ],
+        },
+    ],
+    "index": "records-hep",
+}
+
+EARLY_TERMINATION_RECORD = {
+    "arxiv_eprints": [{"value": "1601.02340"}],
+    "dois": [{"value": "10.1103/PhysRevD.93.063518"}],
+    "titles": [{"title": "Probably not."}],
+}
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_stops_on_first_match_of_a_step(es_mock):
+    es_mock.search.side_effect = [
+        {"hits": {"hits": []}},
+        {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}},
+        {"hits": {"hits": [{"_id": "3"}]}},
+    ]
+    config = dict(EARLY_TERMINATION_CONFIG)
+    config["algorithm"] = [
+        dict(config["algorithm"][0], stop_on_first_match=True),
+        config["algorithm"][1],
+    ]
+
+    result = list(match(EARLY_TERMINATION_RECORD, config))
+
+    assert result == [{"_id": "1"}, {"_id": "2"}]
+    assert es_mock.search.call_count == 2
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_stops_on_first_match_of_the_configuration(es_mock):
+    es_mock.search.side_effect = [
+        {"hits": {"hits": [{"_id": "1"}]}},
+        {"hits": {"hits": [{"_id": "2"}]}},
+    ]
+    config = dict(EARLY_TERMINATION_CONFIG, stop_on_first_match=True)
+
+    result = list(match(EARLY_TERMINATION_RECORD, config))
+
+    assert result == [{"_id": "1"}]
+    assert es_mock.search.call_count == 1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_stops_after_max_results(es_mock):
+    es_mock.search.side_effect = [
+        {"hits": {"hits": [{"_id": "1"}]}},
+        {"hits": {"hits": [{"_id": "2"}, {"_id": "3"}]}},
+        {"hits": {"hits": [{"_id": "4"}]}},
+    ]
+    dummy_validator = mock.Mock(return_value=True)
+    config = dict(EARLY_TERMINATION_CONFIG, max_results=2)
+    config["algorithm"] = [
+        dict(config["algorithm"][0], validator=dummy_validator),
+        config["algorithm"][1],
+    ]
+
+    result = list(match(EARLY_TERMINATION_RECORD, config))
+
+    assert result == [{"_id": "1"}, {"_id": "2"}]
+    assert es_mock.search.call_count == 2
+    assert dummy_validator.call_count == 2
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_stops_after_max_results_of_a_step(es_mock):
+    es_mock.search.side_effect = [
+        {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}},
+        {"hits": {"hits": [{"_id": "3"}]}},
+    ]
+    config = dict(EARLY_TERMINATION_CONFIG)
+    config["algorithm"] = [
+        dict(config["algorithm"][0], max_results=1),
+        config["algorithm"][1],
+    ]
+
+    result = list(match(EARLY_TERMINATION_RECORD, config))
+
+    assert result == [{"_id": "1"}]
+    assert es_mock.search.call_count == 1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_applies_stop_on_first_match(es_mock):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": [{"_id": "1"}]}},
+            {"hits": {"hits": [{"_id": "2"}]}},
+        ],
+    }
+    config = dict(EARLY_TERMINATION_CONFIG, stop_on_first_match=True)
+
+    result = list(match_batch([EARLY_TERMINATION_RECORD], config))
+
+    assert result == [(EARLY_TERMINATION_RECORD, [{"_id": "1"}])]
+    assert es_mock.msearch.call_count == 1
+
+
+PARALLEL_CONFIG = {
+    "algorithm": [
+        {
+            "queries": [
+                {
+                    "type": "exact",
+                    "path": "arxiv_eprints.value",
+                    "search_path": "arxiv_eprints.value.raw",
+                },
+            ],
+        },
+        {
+            "queries": [
+                {
+                    "type": "exact",
+                    "path": "dois.value",
+                    "search_path": "dois.value.raw",
+                },
+            ],
+        },
+    ],
+    "index": "records-hep",
+    "parallel": True,
+}
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_sends_the_queries_of_parallel_steps_at_once(es_mock):
+    doi_search_started = threading.Event()
+
+    def search(**kwargs):
+        clause = kwargs["body"]["query"]["bool"]["must"]["bool"]["should"][0]
+        if "dois.value.raw" in clause["match"]:
+            doi_search_started.set()
+            return {"hits": {"hits": [{"_id": "2"}]}}
+        assert doi_search_started.wait(5)
+        return {"hits": {"hits": [{"_id": "1"}]}}
+
+    es_mock.search.side_effect = search
+
+    result = list(match(EARLY_TERMINATION_RECORD, PARALLEL_CONFIG))
+
+    assert result == [{"_id": "1"}, {"_id": "2"}]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_cancels_parallel_queries_when_done(es_mock, app):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+    config = dict(PARALLEL_CONFIG, max_results=1)
+    config["algorithm"] = config["algorithm"] * 5
+
+    app.config["MATCHER_PARALLEL_WORKERS"] = 2
+    try:
+        result = list(match(EARLY_TERMINATION_RECORD, config))
+    finally:
+        app.config["MATCHER_PARALLEL_WORKERS"] = 4
+
+    assert result == [{"_id": "1"}]
+    assert es_mock.search.call_count <= 2
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_sends_query_and_step_signals(es_mock, app):
+    es_mock.search.side_effect = [
+        {"took": 3, "hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}},
+        {"took": 5, "hits": {"hits": [{"_id": "3"}]}},
+    ]
+
+    def dummy_validator(record, hit):
+        return hit["_id"] != "2"
+
+    config = dict(EARLY_TERMINATION_CONFIG, name="test")
+    config["algorithm"] = [
+        dict(config["algorithm"][0], validator=dummy_validator),
+    ]
+    queries, steps = [], []
+
+    def on_query_executed(sender, **measurements):
+        queries.append(measurements)
+
+    def on_step_executed(sender, **measurements):
+        steps.append(measurements)
+
+    with (
+        query_executed.connected_to(on_query_executed, sender=app),
+        step_executed.connected_to(on_step_executed, sender=app),
+    ):
+        list(match(EARLY_TERMINATION_RECORD, config))
+
+    assert [
+        (query["config"], query["step"], query["query"], query["took"])
+        for query in queries
+    ] == [("test", 0, 0, 3), ("test", 0, 1, 5)]
+    assert queries[0]["hits"] == 2
+    assert queries[0]["valid_hits"] == 1
+    assert queries[0]["accepted"] == {"dummy_validator": 1}
+    assert queries[0]["rejected"] == {"dummy_validator": 1}
+    assert queries[0]["cached"] is False
+    assert queries[0]["search_time"] >= 0
+    assert len(steps) == 1
+    assert steps[0]["queries"] == 2
+    assert steps[0]["took"] == 8
+    assert steps[0]["hits"] == 3
+    assert steps[0]["valid_hits"] == 2
+    assert steps[0]["rejected"] == {"dummy_validator": 1}
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_sends_query_and_step_signals(es_mock, app):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"took": 3, "hits": {"hits": [{"_id": "1"}]}},
+            {"took": 5, "hits": {"hits": []}},
+        ],
+    }
+    config = dict(EARLY_TERMINATION_CONFIG)
+    config["algorithm"] = config["algorithm"][:1]
+    steps = []
+
+    def on_step_executed(sender, **measurements):
+        steps.append(measurements)
+
+    with step_executed.connected_to(on_step_executed, sender=app):
+        list(match_batch([EARLY_TERMINATION_RECORD], config))
+
+    assert len(steps) == 1
+    assert steps[0]["config"] == "records-hep"
+    assert steps[0]["queries"] == 2
+    assert steps[0]["took"] == 8
+    assert steps[0]["valid_hits"] == 1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_references_counts_the_cached_queries_of_a_step(es_mock, app):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"hits": {"hits": [{"_id": "1"}]}},
+            {"hits": {"hits": []}},
+        ],
+    }
+    references = [
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+        {"reference": {"arxiv_eprint": "1703.04525"}},
+        {"reference": {"arxiv_eprint": "1601.02340"}},
+    ]
+    steps = []
+
+    def on_step_executed(sender, **measurements):
+        steps.append(measurements)
+
+    with step_executed.connected_to(on_step_executed, sender=app):
+        match_references(references, REFERENCES_CONFIG)
+
+    assert len(steps) == 1
+    assert steps[0]["queries"] == 3
+    assert steps[0]["cached"] == 1
+
+
+@mock.patch("inspire_matcher.api._Search.get_measurements")
+@mock.patch("inspire_matcher.api.es")
+def test_match_skips_the_query_measurements_without_receivers(
+    es_mock, get_measurements_mock, app
+):
+    es_mock.search.return_value = {"took": 3, "hits": {"hits": []}}
+
+    list(match(EARLY_TERMINATION_RECORD, EARLY_TERMINATION_CONFIG))
+
+    assert es_mock.search.called
+    get_measurements_mock.assert_not_called()
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_counts_the_round_trip_of_a_request_once_per_step(es_mock, app):
+    def msearch(body):
+        time.sleep(0.05)
+        return {"responses": [{"hits": {"hits": []}}] * (len(body) // 2)}
+
+    es_mock.msearch.side_effect = msearch
+    config = dict(EARLY_TERMINATION_CONFIG)
+    config["algorithm"] = config["algorithm"][:1]
+    records = [{"dois": [{"value": "10.1000/%d" % i}]} for i in range(4)]
+    queries, steps = [], []
+
+    def on_query_executed(sender, **measurements):
+        queries.append(measurements)
+
+    def on_step_executed(sender, **measurements):
+        steps.append(measurements)
+
+    with (
+        query_executed.connected_to(on_query_executed, sender=app),
+        step_executed.connected_to(on_step_executed, sender=app),
+    ):
+        list(match_batch(records, config))
+
+    assert len(queries) == 4
+    assert all(query["search_time"] >= 0.05 for query in queries)
+    assert len(steps) == 1
+    assert steps[0]["queries"] == 4
+    assert 0.05 <= steps[0]["search_time"] < 0.1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_sends_the_signals_of_records_resolved_early(es_mock, app):
+    es_mock.msearch.return_value = {
+        "responses": [
+            {"took": 3, "hits": {"hits": [{"_id": "1"}]}},
+            {"took": 5, "hits": {"hits": []}},
+        ],
+    }
+    steps, matches = [], []
+
+    def on_step_executed(sender, **measurements):
+        steps.append(measurements)
+
+    def on_match_executed(sender, **measurements):
+        matches.append(measurements)
+
+    with (
+        step_executed.connected_to(on_step_executed, sender=app),
+        match_executed.connected_to(on_match_executed, sender=app),
+    ):
+        list(match_batch([EARLY_TERMINATION_RECORD], EARLY_TERMINATION_CONFIG))
+
+    assert [step["step"] for step in steps] == [0]
+    assert matches == [{"config": "records-hep", "hits": 1}]
+
+
+SNAPSHOT_CONFIG = {
+    "algorithm": [
+        {
+            "queries": [
+                {
+                    "path": "arxiv_eprints.value",
+                    "search_path": "arxiv_eprints.value.raw",
+                    "type": "exact",
+                },
+                {
+                    "path": "dois.value",
+                    "search_path": "dois.value.raw",
+                    "type": "exact",
+                },
+            ],
+        },
+    ],
+    "index": "records-hep",
+    "snapshot": True,
+}
+
+
+@pytest.fixture
+def snapshot_path(app, tmpdir):
+    path = str(tmpdir.join("identifiers.snapshot"))
+    build_snapshot(
+        path,
+        [{"control_number": 1, "arxiv_eprints": [{"value": "1703.00001"}]}],
+    )
+
+    app.config["MATCHER_SNAPSHOT_PATH"] = path
+    yield path
+    app.config["MATCHER_SNAPSHOT_PATH"] = None
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_looks_up_exact_queries_in_the_snapshot(es_mock, snapshot_path):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "2"}]}}
+    record = {
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "dois": [{"value": "10.1000/missing"}],
+    }
+
+    result = list(match(record, SNAPSHOT_CONFIG))
+
+    assert result == [
+        {"_index": "records-hep", "_source": {"control_number": 1}},
+        {"_id": "2"},
+    ]
+    assert es_mock.search.call_count == 1
+    query = es_mock.search.call_args[1]["body"]["query"]
+    assert query["bool"]["must"]["bool"]["should"] == [
+        {"match": {"dois.value.raw": "10.1000/missing"}},
+    ]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_sends_to_es_the_queries_with_values_missing_from_the_snapshot(
+    es_mock, snapshot_path
+):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "2"}]}}
+    record = {
+        "arxiv_eprints": [{"value": "1703.00001"}, {"value": "1703.99999"}],
+    }
+
+    result = list(match(record, SNAPSHOT_CONFIG))
+
+    assert result == [{"_id": "2"}]
+    query = es_mock.search.call_args[1]["body"]["query"]
+    assert query["bool"]["must"]["bool"]["should"] == [
+        {"match": {"arxiv_eprints.value.raw": "1703.00001"}},
+        {"match": {"arxiv_eprints.value.raw": "1703.99999"}},
+    ]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_does_not_use_a_stale_snapshot(es_mock, app, snapshot_path):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+    record = {"arxiv_eprints": [{"value": "1703.00001"}]}
+
+    app.config["MATCHER_SNAPSHOT_MAX_AGE"] = 0
+    try:
+        result = list(match(record, SNAPSHOT_CONFIG))
+    finally:
+        app.config["MATCHER_SNAPSHOT_MAX_AGE"] = 86400
+
+    assert result == [{"_id": "1"}]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_does_not_use_the_snapshot_in_steps_with_validators(
+    es_mock, snapshot_path
+):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+    config = dict(SNAPSHOT_CONFIG)
+    config["algorithm"] = [
+        dict(
+            SNAPSHOT_CONFIG["algorithm"][0],
+            validator="inspire_matcher.validators:default_validator",
+        )
+    ]
+    record = {"arxiv_eprints": [{"value": "1703.00001"}]}
+
+    assert list(match(record, config)) == [{"_id": "1"}]
+    assert es_mock.search.call_count == 1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_batch_looks_up_exact_queries_in_the_snapshot(es_mock, snapshot_path):
+    records = [
+        {"arxiv_eprints": [{"value": "1703.00001"}]},
+        {"arxiv_eprints": [{"value": "1703.00002"}]},
+    ]
+    es_mock.msearch.return_value = {
+        "responses": [{"hits": {"hits": [{"_id": "2"}]}}],
+    }
+
+    result = list(match_batch(records, SNAPSHOT_CONFIG))
+
+    assert [hits for _, hits in result] == [
+        [{"_index": "records-hep", "_source": {"control_number": 1}}],
+        [{"_id": "2"}],
+    ]
+    assert len(es_mock.msearch.call_args[1]["body"]) == 2
+
+
+@pytest.fixture
+def negative_filter_path(app, tmpdir):
+    path = str(tmpdir.join("identifiers.filter"))
+    IdentifierFilter.build([{"dois": [{"value": "10.1000/present"}]}]).save(path)
+
+    app.config["MATCHER_NEGATIVE_FILTER_PATH"] = path
+    matcher = app.extensions["inspire-matcher"]
+    with mock.patch.object(matcher, "updates_negative_filter", True):
+        yield path
+    app.config["MATCHER_NEGATIVE_FILTER_PATH"] = None
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_skips_exact_queries_for_absent_identifiers(
+    es_mock, negative_filter_path
+):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+    config = dict(SNAPSHOT_CONFIG, snapshot=False)
+    record = {
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "dois": [{"value": "10.1000/missing"}, {"value": "10.1000/present"}],
+    }
+
+    result = list(match(record, config))
+
+    assert result == [{"_id": "1"}]
+    assert es_mock.search.call_count == 1
+    query = es_mock.search.call_args[1]["body"]["query"]
+    assert query["bool"]["must"]["bool"]["should"] == [
+        {"match": {"dois.value.raw": "10.1000/missing"}},
+        {"match": {"dois.value.raw": "10.1000/present"}},
+    ]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_queries_records_indexed_after_the_negative_filter_was_built(
+    es_mock, app, negative_filter_path
+):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "2"}]}}
+    config = dict(SNAPSHOT_CONFIG, snapshot=False)
+    record = {"dois": [{"value": "10.1000/indexed-later"}]}
+
+    assert list(match(record, config)) == []
+    es_mock.search.assert_not_called()
+
+    app.extensions["inspire-matcher"]._on_before_record_index(app, json=record)
+
+    assert list(match(record, config)) == [{"_id": "2"}]
+    assert es_mock.search.call_count == 1
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_ignores_a_stale_negative_filter(es_mock, app, negative_filter_path):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "2"}]}}
+    config = dict(SNAPSHOT_CONFIG, snapshot=False)
+    record = {"dois": [{"value": "10.1000/indexed-later"}]}
+
+    app.config["MATCHER_NEGATIVE_FILTER_MAX_AGE"] = 0
+    try:
+        assert list(match(record, config)) == [{"_id": "2"}]
+    finally:
+        app.config["MATCHER_NEGATIVE_FILTER_MAX_AGE"] = 3600
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_ignores_a_negative_filter_not_updated_on_indexing(
+    es_mock, app, negative_filter_path
+):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "2"}]}}
+    config = dict(SNAPSHOT_CONFIG, snapshot=False)
+    record = {"dois": [{"value": "10.1000/indexed-later"}]}
+
+    matcher = app.extensions["inspire-matcher"]
+    with mock.patch.object(matcher, "updates_negative_filter", False):
+        assert list(match(record, config)) == [{"_id": "2"}]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_does_not_send_a_combined_step_of_absent_identifiers(
+    es_mock, negative_filter_path
+):
+    config = dict(SNAPSHOT_CONFIG, snapshot=False)
+    config["algorithm"] = [dict(config["algorithm"][0], combine_queries=True)]
+    record = {
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "dois": [{"value": "10.1000/missing"}],
+    }
+
+    assert list(match(record, config)) == []
+    es_mock.search.assert_not_called()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import mock
+import pytest
+
+from inspire_matcher.bloom import BloomFilter, IdentifierFilter
+
+RECORDS = [
+    {
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "dois": [{"value": "10.1000/first"}],
+    },
+    {
+        "arxiv_eprints": [{"value": "1703.00002"}],
+        "persistent_identifiers": [{"value": "hdl:1234/5678"}],
+    },
+]
+
+
+def test_bloom_filter_contains_the_added_values():
+    bloom_filter = BloomFilter(1000, 0.01)
+    values = ["value-%d" % i for i in range(1000)]
+    for value in values:
+        bloom_filter.add(value)
+
+    assert all(value in bloom_filter for value in values)
+    assert len(bloom_filter) == 1000
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom_filter = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom_filter.add("value-%d" % i)
+
+    false_positives = sum("other-%d" % i in bloom_filter for i in range(10000))
+
+    assert false_positives < 300
+
+
+def test_bloom_filter_raises_on_malformed_error_rate():
+    with pytest.raises(ValueError, match="Malformed Bloom filter"):
+        BloomFilter(1000, 1.5)
+
+
+def test_identifier_filter_build():
+    negative_filter = IdentifierFilter.build(RECORDS)
+
+    assert negative_filter.might_contain("arxiv_eprints.value.raw", "1703.00001")
+    assert negative_filter.might_contain("dois.value.raw", "10.1000/first")
+    assert negative_filter.might_contain(
+        "persistent_identifiers.value", "hdl:1234/5678"
+    )
+    assert not negative_filter.might_contain("dois.value.raw", "10.1000/missing")
+
+
+def test_identifier_filter_might_contain_values_of_search_paths_not_covered():
+    negative_filter = IdentifierFilter.build(RECORDS)
+
+    assert not negative_filter.covers("titles.title.raw")
+    assert negative_filter.might_contain("titles.title.raw", "Some title")
+
+
+def test_identifier_filter_add_record():
+    negative_filter = IdentifierFilter.build(RECORDS)
+    negative_filter.add_record({"arxiv_eprints": [{"value": "1703.00003"}]})
+
+    assert negative_filter.might_contain("arxiv_eprints.value.raw", "1703.00003")
+
+
+def test_identifier_filter_save_and_load(tmpdir):
+    path = str(tmpdir.join("identifiers.filter"))
+    IdentifierFilter.build(RECORDS, index="records-hep", error_rate=0.001).save(path)
+
+    negative_filter = IdentifierFilter.load(path)
+
+    assert negative_filter.index == "records-hep"
+    assert negative_filter.path == path
+    assert negative_filter.filters["dois.value.raw"].error_rate == 0.001
+    assert negative_filter.filters["arxiv_eprints.value.raw"].count == 2
+    assert negative_filter.might_contain("arxiv_eprints.value.raw", "1703.00002")
+    assert not negative_filter.might_contain("dois.value.raw", "10.1000/missing")
+    assert not [f for f in tmpdir.listdir() if f.basename.startswith(".filter-")]
+
+
+def test_identifier_filter_update_adds_records_to_the_saved_filters(tmpdir):
+    path = str(tmpdir.join("identifiers.filter"))
+    negative_filter = IdentifierFilter.build(RECORDS)
+    negative_filter.created = 1000.0
+    negative_filter.save(path)
+
+    loaded = IdentifierFilter.load(path)
+    IdentifierFilter.update(path, [{"dois": [{"value": "10.1000/new"}]}])
+    updated = IdentifierFilter.load(path)
+
+    assert updated.might_contain("dois.value.raw", "10.1000/new")
+    assert updated.might_contain("arxiv_eprints.value.raw", "1703.00002")
+    assert updated.created == 1000.0
+    assert not loaded.might_contain("dois.value.raw", "10.1000/new")
+    loaded.refresh()
+    assert loaded.might_contain("dois.value.raw", "10.1000/new")
+
+
+def test_identifier_filter_save_drops_the_journal_older_than_the_scan(tmpdir):
+    path = str(tmpdir.join("identifiers.filter"))
+    IdentifierFilter.build(RECORDS).save(path)
+    with mock.patch("inspire_matcher.bloom.time.time", return_value=1000.0):
+        IdentifierFilter.update(path, [{"dois": [{"value": "10.1000/old"}]}])
+    IdentifierFilter.update(path, [{"dois": [{"value": "10.1000/new"}]}])
+
+    IdentifierFilter.build(RECORDS).save(path)
+    rebuilt = IdentifierFilter.load(path)
+
+    assert "10.1000/old" not in tmpdir.join("identifiers.filter.journal").read()
+    assert rebuilt.might_contain("dois.value.raw", "10.1000/new")
+
+
+def test_identifier_filter_is_stale():
+    negative_filter = IdentifierFilter.build(RECORDS)
+
+    assert not negative_filter.is_stale(60)
+    assert not negative_filter.is_stale(None)
+    negative_filter.created -= 120
+    assert negative_filter.is_stale(60)
+
+
+def test_identifier_filter_load_raises_on_malformed_file(tmpdir):
+    path = tmpdir.join("identifiers.filter")
+    path.write("not a filter")
+
+    with pytest.raises(ValueError, match="Malformed negative filter"):
+        IdentifierFilter.load(str(path))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from inspire_matcher.cache import ResultCache, make_cache_key
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_make_cache_key_does_not_depend_on_key_order():
+    first = {
+        "index": "records-hep",
+        "size": 10,
+        "body": {"query": {"match": {"dois.value.raw": "10.1/a"}}, "min_score": 1},
+    }
+    second = {
+        "body": {"min_score": 1, "query": {"match": {"dois.value.raw": "10.1/a"}}},
+        "size": 10,
+        "index": "records-hep",
+    }
+
+    assert make_cache_key(first) == make_cache_key(second)
+
+
+def test_make_cache_key_depends_on_size_and_source():
+    query_config = {"index": "records-hep", "size": 10, "body": {}}
+
+    assert make_cache_key(query_config) != make_cache_key(dict(query_config, size=1))
+    assert make_cache_key(query_config) != make_cache_key(
+        dict(query_config, _source=["control_number"])
+    )
+
+
+def test_result_cache_counts_hits_and_misses():
+    cache = ResultCache(maxsize=2, ttl=10)
+
+    assert cache.get("key") is None
+    cache.set("key", {"hits": {"hits": []}})
+    assert cache.get("key") == {"hits": {"hits": []}}
+
+    assert cache.stats == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_result_cache_returns_copies():
+    cache = ResultCache(maxsize=2, ttl=10)
+    result = {"hits": {"hits": [{"_id": "1"}]}}
+
+    cache.set("key", result)
+    result["hits"]["hits"].append({"_id": "2"})
+    cache.get("key")["hits"]["hits"].append({"_id": "3"})
+
+    assert cache.get("key") == {"hits": {"hits": [{"_id": "1"}]}}
+
+
+def test_result_cache_evicts_the_least_recently_used_result():
+    cache = ResultCache(maxsize=2, ttl=10)
+
+    cache.set("first", 1)
+    cache.set("second", 2)
+    cache.get("first")
+    cache.set("third", 3)
+
+    assert cache.get("first") == 1
+    assert cache.get("second") is None
+    assert cache.get("third") == 3
+    assert len(cache) == 2
+
+
+def test_result_cache_expires_results():
+    timer = FakeTimer()
+    cache = ResultCache(maxsize=2, ttl=10, timer=timer)
+
+    cache.set("key", 1)
+    timer.now = 9
+    assert cache.get("key") == 1
+    timer.now = 10
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_result_cache_clear():
+    cache = ResultCache(maxsize=2, ttl=10)
+    cache.set("key", 1)
+    cache.get("key")
+
+    cache.clear()
+
+    assert cache.stats == {"hits": 0, "misses": 0, "size": 0}
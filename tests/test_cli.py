@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from inspire_matcher.cli import RunStatistics, main
+
+RECORDS = [
+    {"control_number": 1, "arxiv_eprints": [{"value": "1703.00001"}]},
+    {"control_number": 2, "dois": [{"value": "10.1000/second"}]},
+]
+
+
+@pytest.fixture
+def records_path(tmpdir):
+    path = tmpdir.join("records.jsonl")
+    path.write("\n".join(json.dumps(record) for record in RECORDS) + "\n")
+    return str(path)
+
+
+def test_main_streams_the_hits_of_each_record(records_path):
+    lines = [
+        json.dumps({"dois": [{"value": "10.1000/second"}]}),
+        "",
+        json.dumps({"arxiv_eprints": [{"value": "1703.00001"}]}),
+        json.dumps({"arxiv_eprints": [{"value": "1703.99999"}]}),
+    ]
+
+    result = CliRunner().invoke(
+        main,
+        ["--records", records_path, "--concurrency", "2", "--no-stats"],
+        input="\n".join(lines) + "\n",
+    )
+
+    assert result.exit_code == 0
+    output = [json.loads(line) for line in result.output.splitlines()]
+    assert [result["line"] for result in output] == [1, 3, 4]
+    assert [
+        [hit["_source"]["control_number"] for hit in result["hits"]]
+        for result in output
+    ] == [[2], [1], []]
+
+
+def test_main_reports_malformed_lines(records_path):
+    input_ = json.dumps({"arxiv_eprints": [{"value": "1703.00001"}]}) + "\nnot json\n"
+
+    result = CliRunner().invoke(main, ["--records", records_path], input=input_)
+
+    assert result.exit_code == 1
+    assert "Line 2: " in result.output
+    assert "records: 2 (1 matched, 1 errors)" in result.output
+
+
+def test_main_uses_the_given_configuration(records_path, tmpdir):
+    config = tmpdir.join("config.yml")
+    config.write(
+        "\n".join(
+            [
+                "index: records-hep",
+                "algorithm:",
+                "  - queries:",
+                "      - type: exact",
+                "        path: dois.value",
+                "        search_path: dois.value.raw",
+            ]
+        )
+    )
+    input_ = json.dumps({"arxiv_eprints": [{"value": "1703.00001"}]}) + "\n"
+
+    result = CliRunner().invoke(
+        main,
+        ["--records", records_path, "--config", str(config), "--no-stats"],
+        input=input_,
+    )
+
+    assert json.loads(result.output) == {"hits": [], "line": 1}
+
+
+def test_run_statistics():
+    run_statistics = RunStatistics(sample_size=10)
+    for i in range(100):
+        run_statistics.add(i / 1000.0, hits=i % 2)
+    run_statistics.add(0.5)
+
+    assert run_statistics.records == 101
+    assert run_statistics.matched == 50
+    assert run_statistics.errors == 1
+    assert run_statistics.max_latency == 0.5
+    assert len(run_statistics._sample) == 10
+    assert "records: 101 (50 matched, 1 errors)" in run_statistics.format()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import mock
+
+from inspire_matcher.api import match
+from inspire_matcher.context import RecordContext, call_validator, uses_record_context
+
+
+def test_record_context_features():
+    record = {
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "authors": [{"full_name": "Smith, John"}],
+        "external_system_identifiers": [
+            {"schema": "CDS", "value": "123"},
+            {"schema": "SPIRES", "value": "456"},
+        ],
+        "persistent_identifiers": [{"schema": "HDL", "value": "1234/5678"}],
+        "titles": [{"title": "The $H$ boson"}, {"title": "The Higgs boson"}],
+    }
+    context = RecordContext(record)
+
+    assert context.authors == [{"full_name": "Smith, John"}]
+    assert context.author_keys == [[("name", "smith", "j")]]
+    assert (
+        context.title_scorer.score(
+            ["The Higgs boson"], threshold=0.5, math_threshold=0.3
+        )
+        == 1.0
+    )
+    assert context.arxiv_eprints == {"1703.00001"}
+    assert context.cds_identifiers == {"123"}
+    assert context.persistent_identifiers == {frozenset(["HDL", "1234/5678"])}
+
+
+def test_record_context_computes_features_once():
+    context = RecordContext({"titles": [{"title": "The Higgs boson"}]})
+
+    assert context.title_scorer is context.title_scorer
+
+
+def test_record_context_of_empty_record():
+    context = RecordContext({})
+
+    assert context.authors == []
+    assert context.author_keys == []
+    assert context.arxiv_eprints == set()
+
+
+def test_call_validator_passes_the_context_if_the_validator_uses_it():
+    @uses_record_context
+    def validator(record, result, context=None):
+        return context
+
+    context = RecordContext({})
+
+    assert call_validator(validator, {}, {}, context) is context
+    assert call_validator(lambda record, result: True, {}, {}, context)
+    assert call_validator(mock.Mock(return_value=False), {}, {}, context) is False
+
+
+def test_call_validator_does_not_pass_the_context_to_permissive_callables():
+    class Validator(object):
+        def __getattr__(self, name):
+            return True
+
+        def __call__(self, record, result):
+            return result
+
+    assert call_validator(Validator(), {}, "result", RecordContext({})) == "result"
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_shares_the_context_among_the_hits(es_mock):
+    es_mock.search.return_value = {
+        "hits": {"hits": [{"_id": "1"}, {"_id": "2"}]},
+    }
+    contexts = []
+
+    @uses_record_context
+    def validator(record, result, context=None):
+        contexts.append(context)
+        return True
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "dois.value",
+                        "search_path": "dois.value.raw",
+                    },
+                ],
+                "validator": validator,
+            },
+        ],
+        "index": "records-hep",
+    }
+    record = {"dois": [{"value": "10.1000/first"}]}
+
+    assert len(list(match(record, config))) == 2
+    assert contexts[0] is contexts[1]
+    assert contexts[0].record is record
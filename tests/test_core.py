@@ -22,14 +22,18 @@
 
 from __future__ import absolute_import, division, print_function
 
+import mock
 import pytest
+from inspire_utils.name import ParsedName
 
 from inspire_matcher.core import (
+    _authors_query_cache,
     _compile_authors_query,
     _compile_exact,
     _compile_fuzzy,
     _compile_nested,
     _compile_nested_prefix,
+    combine,
     compile,
 )
 
@@ -726,6 +730,56 @@ def test_compile_authors_query():
     assert result == expected
 
 
+def test_compile_authors_query_caches_the_query_of_a_name():
+    _authors_query_cache.clear()
+    query = {"type": "author-names", "inner_hits": {"_source": ["authors.full_name"]}}
+
+    with mock.patch(
+        "inspire_matcher.core.ParsedName", wraps=ParsedName
+    ) as parsed_name_mock:
+        first = _compile_authors_query(query, {"full_name": "Smith, John"})
+        second = _compile_authors_query(query, {"full_name": " Smith,  John"})
+        without_inner_hits = _compile_authors_query(
+            {"type": "author-names"}, {"full_name": "Smith, John"}
+        )
+
+    parsed_name_mock.assert_called_once_with("Smith, John")
+    assert first == second
+    assert first["query"]["nested"]["inner_hits"] == {"_source": ["authors.full_name"]}
+    assert "inner_hits" not in without_inner_hits["query"]["nested"]
+
+
+def test_compile_authors_query_returns_a_copy_of_the_cached_query():
+    _authors_query_cache.clear()
+    query = {"type": "author-names"}
+
+    first = compile(query, {"full_name": "Smith,   J."})
+    first["query"]["bool"]["must"]["nested"]["inner_hits"] = {}
+    second = compile(query, {"full_name": "Smith, J."})
+
+    assert "inner_hits" not in second["query"]["bool"]["must"]["nested"]
+
+
+def test_compile_authors_query_cache_is_bounded(app):
+    _authors_query_cache.clear()
+    query = {"type": "author-names"}
+
+    app.config["MATCHER_AUTHORS_QUERY_CACHE_SIZE"] = 2
+    try:
+        for name in ["Smith, John", "Doe, Jane", "Roe, Richard"]:
+            _compile_authors_query(query, {"full_name": name})
+        with mock.patch(
+            "inspire_matcher.core.ParsedName", wraps=ParsedName
+        ) as parsed_name_mock:
+            _compile_authors_query(query, {"full_name": "Roe, Richard"})
+            _compile_authors_query(query, {"full_name": "Smith, John"})
+    finally:
+        app.config["MATCHER_AUTHORS_QUERY_CACHE_SIZE"] = 10000
+        _authors_query_cache.clear()
+
+    parsed_name_mock.assert_called_once_with("Smith, John")
+
+
 def test_nested_query_uses_correct_path_if_only_one_search_path_provided():
     query = {
         "type": "nested",
@@ -791,3 +845,57 @@ def test_nested_query_with_and_operator():
     }
     result = _compile_nested(query, author_data)
     assert result == expected
+
+
+def test_combine():
+    named_queries = [
+        ("query-0", {"query": {"match": {"arxiv_eprints.value.raw": "1601.02340"}}}),
+        ("query-1", {"query": {"match": {"dois.value.raw": "10.1103/a"}}}),
+    ]
+
+    expected = {
+        "query": {
+            "bool": {
+                "must": {
+                    "bool": {
+                        "should": [
+                            {
+                                "bool": {
+                                    "must": {
+                                        "match": {
+                                            "arxiv_eprints.value.raw": "1601.02340"
+                                        },
+                                    },
+                                    "_name": "query-0",
+                                },
+                            },
+                            {
+                                "bool": {
+                                    "must": {
+                                        "match": {"dois.value.raw": "10.1103/a"},
+                                    },
+                                    "_name": "query-1",
+                                },
+                            },
+                        ],
+                    },
+                },
+                "filter": {
+                    "bool": {
+                        "must_not": {
+                            "match": {
+                                "deleted": True,
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    }
+    result = combine(named_queries)
+
+    assert expected == result
+
+
+def test_combine_returns_none_without_queries():
+    assert combine([]) is None
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+from inspire_matcher.api import match
+from inspire_matcher.core import _compile_collections, compile
+from inspire_matcher.memory import InMemorySearchClient, _Evaluator
+
+RECORDS = [
+    {
+        "control_number": 1,
+        "_collections": ["Literature"],
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "dois": [{"value": "10.1000/first"}],
+        "titles": [{"title": "Search for supersymmetry in proton collisions"}],
+        "authors": [
+            {"full_name": "Smith, John", "affiliations": [{"value": "CERN"}]},
+            {"full_name": "Doe, Jane", "affiliations": [{"value": "DESY"}]},
+        ],
+    },
+    {
+        "control_number": 2,
+        "_collections": ["Literature"],
+        "arxiv_eprints": [{"value": "1703.00002"}],
+        "titles": [{"title": "Dark matter constraints from cosmic rays"}],
+        "authors": [{"full_name": "Smithson, Anna"}],
+    },
+    {
+        "control_number": 3,
+        "_collections": ["Literature"],
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "titles": [{"title": "Search for supersymmetry in proton collisions"}],
+        "deleted": True,
+    },
+    {
+        "control_number": 4,
+        "_collections": ["Conferences"],
+        "titles": [{"title": "Search for supersymmetry in proton collisions"}],
+    },
+]
+
+
+@pytest.fixture
+def client():
+    return InMemorySearchClient(RECORDS)
+
+
+def _search_ids(client, query, record, **kwargs):
+    body = compile(query, record, **kwargs)
+    result = client.search(index="records-hep", body=body, size=10)
+    return [hit["_id"] for hit in result["hits"]["hits"]]
+
+
+def test_search_exact_query(client):
+    query = {
+        "type": "exact",
+        "path": "arxiv_eprints.value",
+        "search_path": "arxiv_eprints.value.raw",
+    }
+    record = {"arxiv_eprints": [{"value": "1703.00001"}]}
+
+    assert _search_ids(client, query, record) == [1]
+    assert sorted(_search_ids(client, query, record, match_deleted=True)) == [1, 3]
+
+
+def test_search_exact_query_restricted_to_collections(client):
+    query = {
+        "type": "exact",
+        "path": "titles.title",
+        "search_path": "titles.title.raw",
+    }
+    record = {"titles": [{"title": "Search for supersymmetry in proton collisions"}]}
+
+    assert _search_ids(client, query, record, collections=["Conferences"]) == [4]
+
+
+def test_search_checks_filters_without_copying_their_documents(client):
+    query = {
+        "type": "exact",
+        "path": "arxiv_eprints.value",
+        "search_path": "arxiv_eprints.value.raw",
+    }
+    record = {"arxiv_eprints": [{"value": "1703.00001"}]}
+    collection = client._collection
+    evaluator = _Evaluator(collection)
+
+    documents = evaluator._get_filter(
+        {"bool": {"should": _compile_collections(["Literature"])}}
+    )
+
+    assert _search_ids(client, query, record, collections=["Literature"]) == [1]
+    postings = collection.get_keyword_index("_collections")["Literature"]
+    assert documents.sets[0].sets[0] is postings
+
+
+def test_search_text_match_query_with_and_operator(client):
+    body = {
+        "query": {
+            "match": {
+                "titles.title": {"query": "dark matter rays", "operator": "AND"},
+            },
+        },
+    }
+    result = client.search(body=body)
+
+    assert [hit["_id"] for hit in result["hits"]["hits"]] == [2]
+    assert result["hits"]["total"] == {"value": 1, "relation": "eq"}
+
+
+def test_search_nested_query_returns_inner_hits(client):
+    query = {
+        "type": "nested",
+        "paths": ["authors.full_name"],
+        "search_paths": ["authors.full_name"],
+        "operator": "AND",
+        "inner_hits": {"_source": ["authors.full_name"]},
+    }
+    record = {"authors": {"full_name": "Doe, Jane"}}
+
+    result = client.search(body=compile(query, record))
+    (hit,) = result["hits"]["hits"]
+
+    assert hit["_id"] == 1
+    inner_hits = hit["inner_hits"]["authors"]["hits"]["hits"]
+    assert [inner["_source"] for inner in inner_hits] == [
+        {"authors": {"full_name": "Doe, Jane"}},
+    ]
+
+
+def test_search_match_phrase_prefix_query(client):
+    body = {"query": {"match_phrase_prefix": {"authors.full_name": "smith"}}}
+    result = client.search(body=body)
+
+    assert sorted(hit["_id"] for hit in result["hits"]["hits"]) == [1, 2]
+
+
+def test_search_fuzzy_query(client):
+    query = {
+        "type": "fuzzy",
+        "clauses": [{"path": "titles"}],
+    }
+    record = {"titles": [{"title": "Supersymmetry searches with proton collisions"}]}
+
+    assert sorted(_search_ids(client, query, record)) == [1, 4]
+
+
+def test_search_bool_should_query_reports_matched_queries(client):
+    body = {
+        "query": {
+            "bool": {
+                "should": [
+                    {"bool": {"must": {"term": {"control_number": 1}}, "_name": "a"}},
+                    {"bool": {"must": {"term": {"control_number": 2}}, "_name": "b"}},
+                ],
+            },
+        },
+    }
+    result = client.search(body=body)
+
+    assert sorted(
+        (hit["_id"], hit["matched_queries"]) for hit in result["hits"]["hits"]
+    ) == [(1, ["a"]), (2, ["b"])]
+
+
+def test_search_filters_the_source(client):
+    body = {"query": {"term": {"control_number": 2}}}
+    result = client.search(body=body, _source=["control_number", "titles.title"])
+
+    assert result["hits"]["hits"][0]["_source"] == {
+        "control_number": 2,
+        "titles": [{"title": "Dark matter constraints from cosmic rays"}],
+    }
+
+
+def test_search_raises_on_unsupported_query(client):
+    with pytest.raises(NotImplementedError):
+        client.search(body={"query": {"regexp": {"titles.title": ".*"}}})
+
+
+def test_msearch(client):
+    body = [
+        {"index": "records-hep"},
+        {"query": {"term": {"control_number": 1}}, "size": 10},
+        {"index": "records-hep"},
+        {"query": {"term": {"control_number": 5}}, "size": 10},
+    ]
+    result = client.msearch(body=body)
+
+    assert [len(response["hits"]["hits"]) for response in result["responses"]] == [
+        1,
+        0,
+    ]
+
+
+def test_from_jsonl(tmpdir):
+    path = tmpdir.join("records.jsonl")
+    path.write("\n".join(json.dumps(record) for record in RECORDS) + "\n")
+    client = InMemorySearchClient.from_jsonl(str(path))
+
+    result = client.search(body={"query": {"term": {"control_number": 4}}})
+
+    assert [hit["_id"] for hit in result["hits"]["hits"]] == [4]
+
+
+def test_match_with_in_memory_search_client(app, client):
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+    record = {"arxiv_eprints": [{"value": "1703.00001"}]}
+
+    app.config["MATCHER_SEARCH_CLIENT"] = client
+    try:
+        result = list(match(record, config))
+    finally:
+        app.config["MATCHER_SEARCH_CLIENT"] = None
+
+    assert [hit["_id"] for hit in result] == [1]
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import mock
+import pytest
+from flask import Flask
+
+from inspire_matcher import InspireMatcher
+from inspire_matcher.api import match, match_batch
+from inspire_matcher.metrics import MatchMetrics, MetricsRegistry, render
+from inspire_matcher.signals import (
+    match_executed,
+    query_executed,
+    request_executed,
+    step_executed,
+)
+
+
+def test_render_counters_and_histograms():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Number of\nrequests.", ("path",))
+    histogram = registry.histogram(
+        "latency_seconds", "Latency.", ("path",), buckets=(0.1, 1)
+    )
+
+    counter.inc(path='a "b"')
+    counter.inc(2, path='a "b"')
+    histogram.observe(0.05, path="a")
+    histogram.observe(0.5, path="a")
+    histogram.observe(3, path="a")
+
+    assert render(registry) == (
+        "# HELP requests_total Number of\\nrequests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="a \\"b\\""} 3\n'
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{path="a",le="0.1"} 1\n'
+        'latency_seconds_bucket{path="a",le="1.0"} 2\n'
+        'latency_seconds_bucket{path="a",le="+Inf"} 3\n'
+        'latency_seconds_sum{path="a"} 3.55\n'
+        'latency_seconds_count{path="a"} 3\n'
+    )
+    assert histogram.get(path="a") == (3, 3.55)
+
+
+def test_metrics_reject_malformed_labels_and_names():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Number of requests.", ("path",))
+
+    with pytest.raises(ValueError, match="Malformed labels"):
+        counter.inc(method="GET")
+    with pytest.raises(ValueError, match="Malformed registry"):
+        registry.counter("requests_total", "Number of requests.")
+
+
+def test_match_metrics_count_the_signals(app):
+    metrics = MatchMetrics()
+    metrics.connect(app)
+    try:
+        query = {
+            "config": "records-hep",
+            "step": 0,
+            "query": 0,
+            "cached": False,
+            "accepted": {"default_validator": 1},
+            "rejected": {"default_validator": 2},
+        }
+        query_executed.send(app, **query)
+        query_executed.send(app, **dict(query, cached=True, accepted={}))
+        query_executed.send(app, **dict(query, batched=True, accepted={}))
+        query_executed.send(app, **dict(query, batched=True, accepted={}))
+        request_executed.send(app, config="records-hep", step=0, queries=2)
+        step_executed.send(
+            app,
+            config="records-hep",
+            step=0,
+            compile_time=0.001,
+            search_time=0.02,
+            validation_time=0.004,
+        )
+        match_executed.send(app, config="records-hep", hits=1)
+        match_executed.send(app, config="records-hep", hits=0)
+    finally:
+        metrics.disconnect(app)
+
+    assert metrics.matches.get(config="records-hep") == 2
+    assert metrics.matched_records.get(config="records-hep") == 1
+    assert metrics.search_requests.get(config="records-hep", step=0) == 2
+    assert metrics.search_queries.get(config="records-hep", step=0) == 3
+    assert metrics.cache_hits.get(config="records-hep", step=0) == 1
+    assert metrics.step_duration.get(config="records-hep", step=0)[0] == 1
+    verdicts = metrics.validator_verdicts
+    labels = {"config": "records-hep", "step": 0, "validator": "default_validator"}
+    assert verdicts.get(verdict="accepted", **labels) == 1
+    assert verdicts.get(verdict="rejected", **labels) == 8
+    assert 'inspire_matcher_matches_total{config="records-hep"} 2\n' in metrics.render()
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_extension_keeps_the_metrics_of_match(es_mock):
+    es_mock.search.return_value = {"hits": {"hits": [{"_id": "1"}]}}
+    es_mock.msearch.return_value = {"responses": [{"hits": {"hits": []}}]}
+    app = Flask(__name__)
+    app.config["MATCHER_METRICS_ENABLED"] = True
+    InspireMatcher(app)
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+        "name": "arxiv",
+    }
+    record = {"arxiv_eprints": [{"value": "1601.02340"}]}
+    metrics = app.extensions["inspire-matcher"].metrics
+
+    try:
+        with app.app_context():
+            list(match(record, config))
+            list(match_batch([record], config))
+    finally:
+        metrics.disconnect(app)
+
+    assert metrics.matches.get(config="arxiv") == 2
+    assert metrics.matched_records.get(config="arxiv") == 1
+    assert metrics.search_requests.get(config="arxiv", step=0) == 2
+    assert metrics.step_duration.get(config="arxiv", step=0)[0] == 2
+    assert (
+        metrics.validator_verdicts.get(
+            config="arxiv", step=0, validator="default_validator", verdict="accepted"
+        )
+        == 1
+    )
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_metrics_count_an_msearch_request_once(es_mock, app):
+    es_mock.msearch.return_value = {"responses": [{"hits": {"hits": []}}] * 5}
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+    records = [{"arxiv_eprints": [{"value": "1601.0234%d" % i}]} for i in range(5)]
+    metrics = MatchMetrics()
+    metrics.connect(app)
+    try:
+        list(match_batch(records, config))
+    finally:
+        metrics.disconnect(app)
+
+    assert es_mock.msearch.call_count == 1
+    assert metrics.search_requests.get(config="records-hep", step=0) == 1
+    assert metrics.search_queries.get(config="records-hep", step=0) == 5
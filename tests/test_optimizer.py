@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+
+import mock
+
+from inspire_matcher.api import match
+from inspire_matcher.core import compile
+from inspire_matcher.memory import InMemorySearchClient
+from inspire_matcher.optimizer import optimize
+
+EXACT_QUERY = {
+    "type": "exact",
+    "path": "dois.value",
+    "search_path": "dois.value.raw",
+}
+
+
+def test_optimize_exact_query_with_filters():
+    record = {
+        "dois": [
+            {"value": "10.1000/first"},
+            {"value": "10.1000/second"},
+            {"value": "10.1000/first"},
+        ],
+    }
+    body = compile(EXACT_QUERY, record, collections=["Literature", "HAL Hidden"])
+
+    assert optimize(body) == {
+        "query": {
+            "bool": {
+                "must": {
+                    "bool": {
+                        "should": [
+                            {
+                                "terms": {
+                                    "dois.value.raw": [
+                                        "10.1000/first",
+                                        "10.1000/second",
+                                    ],
+                                },
+                            },
+                        ],
+                    },
+                },
+                "filter": {
+                    "bool": {
+                        "should": [
+                            {"terms": {"_collections": ["Literature", "HAL Hidden"]}},
+                        ],
+                        "must_not": {"term": {"deleted": True}},
+                    },
+                },
+            },
+        },
+    }
+
+
+def test_optimize_does_not_modify_the_body():
+    body = compile(EXACT_QUERY, {"dois": [{"value": "10.1000/first"}]})
+    expected = copy.deepcopy(body)
+
+    optimize(body)
+
+    assert body == expected
+
+
+def test_optimize_keeps_analyzed_fields_and_named_clauses():
+    body = {
+        "min_score": 1,
+        "query": {
+            "bool": {
+                "should": [
+                    {"match": {"titles.title": "Higgs"}},
+                    {"match": {"titles.title": "boson"}},
+                    {
+                        "bool": {
+                            "must": {"match": {"arxiv_eprints.value.raw": "1"}},
+                            "_name": "query-0",
+                        },
+                    },
+                ],
+            },
+        },
+    }
+
+    assert optimize(body) == {
+        "min_score": 1,
+        "query": {
+            "bool": {
+                "should": [
+                    {"match": {"titles.title": "Higgs"}},
+                    {"match": {"titles.title": "boson"}},
+                    {
+                        "bool": {
+                            "must": {"term": {"arxiv_eprints.value.raw": "1"}},
+                            "_name": "query-0",
+                        },
+                    },
+                ],
+            },
+        },
+    }
+
+
+def test_optimize_does_not_merge_terms_with_minimum_should_match():
+    body = {
+        "query": {
+            "bool": {
+                "should": [
+                    {"match": {"dois.value.raw": "10.1000/first"}},
+                    {"match": {"dois.value.raw": "10.1000/second"}},
+                ],
+                "minimum_should_match": 2,
+            },
+        },
+    }
+
+    assert optimize(body)["query"]["bool"]["should"] == [
+        {"term": {"dois.value.raw": "10.1000/first"}},
+        {"term": {"dois.value.raw": "10.1000/second"}},
+    ]
+
+
+def test_optimize_nested_and_dis_max_queries():
+    body = {
+        "query": {
+            "dis_max": {
+                "queries": [
+                    {
+                        "nested": {
+                            "path": "authors",
+                            "query": {
+                                "bool": {
+                                    "must": [
+                                        {"match": {"authors.ids.value.raw": "A"}},
+                                        {"match": {"authors.ids.value.raw": "A"}},
+                                    ],
+                                },
+                            },
+                        },
+                    },
+                ],
+                "tie_breaker": 0.3,
+            },
+        },
+    }
+
+    assert optimize(body) == {
+        "query": {
+            "dis_max": {
+                "queries": [
+                    {
+                        "nested": {
+                            "path": "authors",
+                            "query": {
+                                "bool": {
+                                    "must": [{"term": {"authors.ids.value.raw": "A"}}],
+                                },
+                            },
+                        },
+                    },
+                ],
+                "tie_breaker": 0.3,
+            },
+        },
+    }
+
+
+def test_optimize_returns_none_for_none():
+    assert optimize(None) is None
+
+
+def test_optimized_query_returns_the_same_hits():
+    client = InMemorySearchClient(
+        [
+            {"control_number": 1, "dois": [{"value": "10.1000/first"}]},
+            {"control_number": 2, "dois": [{"value": "10.1000/second"}]},
+            {
+                "control_number": 3,
+                "dois": [{"value": "10.1000/first"}],
+                "deleted": True,
+            },
+            {"control_number": 4, "dois": [{"value": "10.1000/third"}]},
+        ]
+    )
+    record = {"dois": [{"value": "10.1000/first"}, {"value": "10.1000/second"}]}
+    body = compile(EXACT_QUERY, record)
+
+    def _get_ids(body):
+        return sorted(hit["_id"] for hit in client.search(body=body)["hits"]["hits"])
+
+    assert _get_ids(optimize(body)) == _get_ids(body) == [1, 2]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_match_optimizes_the_queries_if_enabled(es_mock, app):
+    es_mock.search.return_value = {"hits": {"hits": []}}
+    config = {"algorithm": [{"queries": [EXACT_QUERY]}], "index": "records-hep"}
+    record = {"dois": [{"value": "10.1000/first"}]}
+
+    app.config["MATCHER_OPTIMIZE_QUERIES"] = True
+    try:
+        list(match(record, config))
+    finally:
+        app.config["MATCHER_OPTIMIZE_QUERIES"] = False
+
+    query = es_mock.search.call_args[1]["body"]["query"]
+    assert query["bool"]["must"]["bool"]["should"] == [
+        {"term": {"dois.value.raw": "10.1000/first"}},
+    ]
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+import pytest
+
+from inspire_matcher.plan import MatchPlan, _plan_cache, get_match_plan
+from inspire_matcher.validators import (
+    default_validator,
+    persistent_identifier_validator,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_plan_cache():
+    _plan_cache.clear()
+    yield
+    _plan_cache.clear()
+
+
+def test_match_plan_resolves_the_configuration(app):
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "path": "persistent_identifiers.value",
+                        "search_path": "persistent_identifiers.value",
+                        "type": "exact",
+                    },
+                ],
+                "validator": [
+                    "inspire_matcher.validators:persistent_identifier_validator",
+                    "not.existing:validator",
+                ],
+            },
+        ],
+        "index": "records-hep",
+        "size": 5,
+        "source": ["control_number"],
+    }
+
+    app.config["SEARCH_INDEX_PREFIX"] = "test-"
+    try:
+        plan = MatchPlan(config)
+    finally:
+        del app.config["SEARCH_INDEX_PREFIX"]
+
+    assert plan.query_config == {
+        "index": "test-records-hep",
+        "size": 5,
+        "_source": ["control_number"],
+    }
+    assert plan.match_deleted is False
+    assert plan.collections is None
+    assert len(plan.steps) == 1
+    assert plan.steps[0].validators == [
+        persistent_identifier_validator,
+        default_validator,
+    ]
+
+
+def test_match_plan_normalizes_deprecated_query_keys():
+    query = {
+        "match": "arxiv_eprints.value",
+        "search": "arxiv_eprints.value.raw",
+        "type": "exact",
+    }
+    config = {
+        "algorithm": [{"queries": [query]}],
+        "index": "records-hep",
+    }
+
+    with pytest.warns(DeprecationWarning, match="deprecated"):
+        plan = MatchPlan(config)
+
+    assert plan.steps[0].queries == [
+        {
+            "path": "arxiv_eprints.value",
+            "search_path": "arxiv_eprints.value.raw",
+            "type": "exact",
+        },
+    ]
+    assert "path" not in query
+
+
+def test_get_match_plan_caches_plans_by_content():
+    config = {
+        "algorithm": [{"queries": []}],
+        "index": "records-hep",
+    }
+
+    plan = get_match_plan(config)
+
+    assert get_match_plan(config) is plan
+    assert get_match_plan(dict(config)) is plan
+    assert get_match_plan(plan) is plan
+
+    config["size"] = 1
+
+    assert get_match_plan(config) is not plan
+    assert get_match_plan(config).query_config["size"] == 1
+
+
+def test_get_match_plan_evicts_the_least_recently_used_plan(app):
+    configs = [{"algorithm": [], "index": "records-%d" % i} for i in range(3)]
+
+    app.config["MATCHER_PLAN_CACHE_SIZE"] = 2
+    try:
+        first, second = get_match_plan(configs[0]), get_match_plan(configs[1])
+        get_match_plan(configs[0])
+        get_match_plan(configs[2])
+
+        assert get_match_plan(configs[0]) is first
+        assert get_match_plan(configs[1]) is not second
+    finally:
+        app.config["MATCHER_PLAN_CACHE_SIZE"] = 128
+
+
+def test_match_plan_raises_when_combining_fuzzy_queries():
+    config = {
+        "algorithm": [
+            {
+                "queries": [{"type": "fuzzy", "clauses": []}],
+                "combine_queries": True,
+            },
+        ],
+        "index": "records-hep",
+    }
+
+    with pytest.raises(ValueError, match="step 0 cannot combine fuzzy queries"):
+        MatchPlan(config)
+
+
+def test_match_plan_raises_when_combining_inner_hits_of_the_same_name():
+    nested_query = {
+        "type": "nested",
+        "paths": ["first_name", "last_name"],
+        "search_paths": ["authors.first_name", "authors.last_name"],
+        "inner_hits": {"_source": ["authors.full_name"]},
+    }
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    nested_query,
+                    {"type": "author-names", "inner_hits": {}},
+                ],
+                "combine_queries": True,
+            },
+        ],
+        "index": "records-hep",
+    }
+
+    with pytest.raises(ValueError, match="inner hits of the same name 'authors'"):
+        MatchPlan(config)
+
+    config["algorithm"][0]["queries"][1]["inner_hits"] = {"name": "names"}
+    assert MatchPlan(config).steps[0].combine_queries
+
+
+def test_match_plan_adds_the_source_fields_of_the_validators(app):
+    config = dict(app.config["MATCHER_DEFAULT_CONFIGURATION"])
+    config["source"] = ["control_number"]
+
+    plan = MatchPlan(config)
+
+    assert [step.query_config["_source"] for step in plan.steps] == [
+        ["control_number"],
+        ["control_number", "persistent_identifiers"],
+        ["control_number", "external_system_identifiers"],
+    ]
+    assert plan.query_config["_source"] == ["control_number"]
+
+
+def test_match_plan_returns_the_source_of_the_default_configuration(app):
+    plan = MatchPlan(app.config["MATCHER_DEFAULT_CONFIGURATION"])
+
+    source = ["control_number", "external_system_identifiers", "persistent_identifiers"]
+    assert [step.query_config["_source"] for step in plan.steps] == [source] * 3
+
+
+def test_match_plan_does_not_add_source_fields_already_included():
+    config = {
+        "algorithm": [
+            {
+                "queries": [{"type": "fuzzy", "clauses": [{"path": "titles"}]}],
+                "validator": "inspire_matcher.validators:authors_titles_validator",
+            },
+        ],
+        "index": "records-hep",
+        "source": ["control_number", "authors"],
+    }
+
+    plan = MatchPlan(config)
+
+    assert plan.steps[0].query_config["_source"] == [
+        "control_number",
+        "authors",
+        "titles.title",
+    ]
+
+
+def test_match_plan_keeps_the_source_if_a_validator_does_not_declare_fields():
+    def validator(record, result):
+        return True
+
+    config = {
+        "algorithm": [
+            {
+                "queries": [{"type": "fuzzy", "clauses": [{"path": "titles"}]}],
+                "validator": [validator, persistent_identifier_validator],
+            },
+        ],
+        "index": "records-hep",
+        "source": ["control_number"],
+    }
+
+    plan = MatchPlan(config)
+
+    assert plan.steps[0].query_config["_source"] == ["control_number"]
+
+
+def test_match_plan_keeps_the_whole_source_if_the_configuration_has_none():
+    config = {
+        "algorithm": [
+            {
+                "queries": [{"type": "fuzzy", "clauses": [{"path": "titles"}]}],
+                "validator": persistent_identifier_validator,
+            },
+        ],
+        "index": "records-hep",
+    }
+
+    plan = MatchPlan(config)
+
+    assert "_source" not in plan.steps[0].query_config
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import logging
+
+import mock
+import pytest
+from flask import Flask
+
+from inspire_matcher import InspireMatcher
+from inspire_matcher.api import match, match_batch
+from inspire_matcher.signals import query_executed
+from inspire_matcher.slowlog import (
+    SlowQueryLog,
+    get_query_fingerprint,
+    get_query_shape,
+)
+
+
+def _measurements(**kwargs):
+    measurements = {
+        "config": "records-hep",
+        "step": 0,
+        "query": 1,
+        "body": {"query": {"match": {"titles.title": "Dark matter"}}},
+        "compile_time": 0.001,
+        "search_time": 0.5,
+        "took": 480,
+        "cached": False,
+        "hits": 2,
+        "valid_hits": 1,
+        "rejected": {},
+        "validation_time": 0.002,
+    }
+    measurements.update(kwargs)
+    return measurements
+
+
+def test_get_query_shape_redacts_the_values():
+    body = {
+        "query": {
+            "bool": {
+                "should": [
+                    {"term": {"dois.value.raw": "10.1103/PhysRevD.93.063518"}},
+                    {"term": {"dois.value.raw": "10.1016/j.physletb.2016.01.001"}},
+                    {
+                        "terms": {
+                            "arxiv_eprints.value.raw": ["1601.02340", "1703.04525"]
+                        }
+                    },
+                ],
+                "minimum_should_match": 1,
+            },
+        },
+        "size": 10,
+        "_source": None,
+    }
+
+    assert get_query_shape(body) == {
+        "query": {
+            "bool": {
+                "should": [
+                    {"term": {"dois.value.raw": "?"}},
+                    {"terms": {"arxiv_eprints.value.raw": ["?"]}},
+                ],
+                "minimum_should_match": "?",
+            },
+        },
+        "size": "?",
+        "_source": None,
+    }
+
+
+def test_get_query_fingerprint_only_depends_on_the_shape():
+    first = {"query": {"match": {"titles.title": "Dark matter"}, "boost": 2}}
+    second = {"query": {"boost": 1, "match": {"titles.title": "Gravitational waves"}}}
+    other = {"query": {"match": {"abstracts.value": "Dark matter"}, "boost": 2}}
+
+    fingerprint = get_query_fingerprint(get_query_shape(first))
+
+    assert fingerprint == get_query_fingerprint(get_query_shape(second))
+    assert fingerprint != get_query_fingerprint(get_query_shape(other))
+
+
+def test_slow_query_log_logs_the_queries_above_the_threshold(app):
+    logger = mock.Mock()
+    slow_query_log = SlowQueryLog(0.1, logger=logger)
+    slow_query_log.connect(app)
+    try:
+        query_executed.send(app, **_measurements())
+        query_executed.send(app, **_measurements(search_time=0.05))
+        query_executed.send(app, **_measurements(cached=True))
+    finally:
+        slow_query_log.disconnect(app)
+
+    logger.warning.assert_called_once()
+    entry = json.loads(logger.warning.call_args[0][1])
+    assert entry["shape"] == {"query": {"match": {"titles.title": "?"}}}
+    assert entry["fingerprint"] == get_query_fingerprint(entry["shape"])
+    assert (entry["step"], entry["query"], entry["hits"]) == (0, 1, 2)
+    assert entry["search_time"] == 0.5
+    assert "Dark matter" not in logger.warning.call_args[0][1]
+
+
+def test_slow_query_log_samples_the_slow_queries(app):
+    logger = mock.Mock()
+    slow_query_log = SlowQueryLog(0.1, sample_rate=0.5, logger=logger)
+    slow_query_log.connect(app)
+    try:
+        with mock.patch("inspire_matcher.slowlog.random.random") as random_mock:
+            random_mock.side_effect = [0.2, 0.7, 0.4]
+            for _ in range(3):
+                query_executed.send(app, **_measurements())
+    finally:
+        slow_query_log.disconnect(app)
+
+    assert logger.warning.call_count == 2
+
+
+def test_slow_query_log_writes_to_a_rotating_file(tmpdir):
+    path = str(tmpdir.join("slow.log"))
+    slow_query_log = SlowQueryLog(0, path=path, max_bytes=1000, backup_count=1)
+    try:
+        for _ in range(5):
+            slow_query_log._on_query_executed(None, **_measurements())
+    finally:
+        slow_query_log.close()
+
+    assert sorted(tmpdir.listdir()) == [
+        tmpdir.join("slow.log"),
+        tmpdir.join("slow.log.1"),
+    ]
+    assert "Slow matcher query" in tmpdir.join("slow.log").read()
+
+
+def test_slow_query_log_rejects_a_malformed_configuration():
+    with pytest.raises(ValueError, match="Malformed slow-query log"):
+        SlowQueryLog(0.1, sample_rate=2)
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_extension_logs_the_slow_queries_of_match(es_mock, caplog):
+    es_mock.search.return_value = {"took": 1, "hits": {"hits": []}}
+    app = Flask(__name__)
+    app.config["MATCHER_SLOW_QUERY_LOG_THRESHOLD"] = 0
+    InspireMatcher(app)
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+    record = {"arxiv_eprints": [{"value": "1601.02340"}]}
+
+    try:
+        with app.app_context(), caplog.at_level(logging.WARNING):
+            list(match(record, config))
+    finally:
+        app.extensions["inspire-matcher"].slow_query_log.disconnect(app)
+
+    messages = [
+        r.getMessage() for r in caplog.records if "Slow matcher" in r.getMessage()
+    ]
+    assert len(messages) == 1
+    assert '"arxiv_eprints.value.raw": "?"' in messages[0]
+    assert "1601.02340" not in messages[0]
+
+
+@mock.patch("inspire_matcher.api.es")
+def test_slow_query_log_logs_an_msearch_request_once(es_mock, app):
+    es_mock.msearch.return_value = {
+        "responses": [{"took": 30, "hits": {"hits": []}}] * 3,
+    }
+    logger = mock.Mock()
+    slow_query_log = SlowQueryLog(0, logger=logger)
+    config = {
+        "algorithm": [
+            {
+                "queries": [
+                    {
+                        "type": "exact",
+                        "path": "arxiv_eprints.value",
+                        "search_path": "arxiv_eprints.value.raw",
+                    },
+                ],
+            },
+        ],
+        "index": "records-hep",
+    }
+    records = [{"arxiv_eprints": [{"value": "1601.0234%d" % i}]} for i in range(3)]
+
+    slow_query_log.connect(app)
+    try:
+        list(match_batch(records, config))
+    finally:
+        slow_query_log.disconnect(app)
+
+    logger.warning.assert_called_once()
+    assert logger.warning.call_args[0][0] == "Slow matcher request: %s"
+    entry = json.loads(logger.warning.call_args[0][1])
+    assert (entry["step"], entry["queries"], entry["took"]) == (0, 3, 30)
+    assert len(entry["shapes"]) == 1
+    assert entry["shapes"][0]["count"] == 3
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import time
+
+import pytest
+
+from inspire_matcher.snapshot import IdentifierSnapshot, build_snapshot
+
+RECORDS = [
+    {
+        "control_number": 1,
+        "arxiv_eprints": [{"value": "1703.00001"}],
+        "dois": [{"value": "10.1000/first"}, {"value": "10.1000/shared"}],
+    },
+    {
+        "control_number": 2,
+        "dois": [{"value": "10.1000/shared"}],
+    },
+    {
+        "control_number": 3,
+        "arxiv_eprints": [{"value": "1703.00003"}],
+        "deleted": True,
+    },
+]
+
+
+@pytest.fixture
+def snapshot(tmpdir):
+    path = str(tmpdir.join("identifiers.snapshot"))
+    build_snapshot(path, RECORDS)
+    snapshot = IdentifierSnapshot(path)
+    yield snapshot
+    snapshot.close()
+
+
+def test_build_snapshot_returns_the_number_of_entries(tmpdir):
+    path = str(tmpdir.join("identifiers.snapshot"))
+
+    assert build_snapshot(path, RECORDS) == 4
+    assert tmpdir.listdir() == [tmpdir.join("identifiers.snapshot")]
+
+
+def test_snapshot_lookup(snapshot):
+    assert snapshot.lookup("arxiv_eprints.value.raw", "1703.00001") == [1]
+    assert snapshot.lookup("dois.value.raw", "10.1000/shared") == [1, 2]
+
+
+def test_snapshot_lookup_misses(snapshot):
+    assert snapshot.lookup("arxiv_eprints.value.raw", "10.1000/first") == []
+    assert snapshot.lookup("arxiv_eprints.value.raw", "1703.00003") == []
+
+
+def test_snapshot_metadata(snapshot):
+    assert len(snapshot) == 4
+    assert snapshot.index == "records-hep"
+    assert snapshot.search_paths == {"arxiv_eprints.value.raw", "dois.value.raw"}
+
+
+def test_snapshot_is_stale(snapshot):
+    assert not snapshot.is_stale(None)
+    assert not snapshot.is_stale(3600)
+
+    snapshot.created = time.time() - 7200
+    assert snapshot.is_stale(3600)
+
+
+def test_snapshot_raises_on_malformed_file(tmpdir):
+    path = tmpdir.join("identifiers.snapshot")
+    path.write("not a snapshot")
+
+    with pytest.raises(ValueError, match="Malformed snapshot"):
+        IdentifierSnapshot(str(path))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from flask import Flask
+
+from inspire_matcher.signals import query_executed, step_executed
+from inspire_matcher.stats import MatchStatistics
+
+
+def _measurements(**kwargs):
+    measurements = {
+        "config": "records-hep",
+        "step": 0,
+        "query": 0,
+        "compile_time": 0.001,
+        "search_time": 0.01,
+        "took": 3,
+        "cached": False,
+        "hits": 2,
+        "valid_hits": 1,
+        "rejected": {"default_validator": 1},
+        "validation_time": 0.002,
+    }
+    measurements.update(kwargs)
+    return measurements
+
+
+def test_match_statistics_aggregates_queries(app):
+    statistics = MatchStatistics()
+    statistics.connect(app)
+    try:
+        query_executed.send(app, **_measurements())
+        query_executed.send(app, **_measurements(search_time=0.03, cached=True))
+        query_executed.send(app, **_measurements(query=1, took=None))
+    finally:
+        statistics.disconnect(app)
+
+    queries = statistics.get_queries()
+
+    assert [(query["step"], query["query"]) for query in queries] == [(0, 0), (0, 1)]
+    assert queries[0]["count"] == 2
+    assert queries[0]["cached"] == 1
+    assert queries[0]["took"] == 6
+    assert queries[0]["hits"] == 4
+    assert queries[0]["valid_hits"] == 2
+    assert queries[0]["rejected"] == {"default_validator": 2}
+    assert queries[0]["max_search_time"] == 0.03
+    assert queries[1]["took"] == 0
+
+
+def test_match_statistics_aggregates_steps(app):
+    statistics = MatchStatistics()
+    statistics.connect(app)
+    try:
+        measurements = _measurements(queries=2, cached=1)
+        del measurements["query"]
+        step_executed.send(app, **measurements)
+        step_executed.send(app, **measurements)
+    finally:
+        statistics.disconnect(app)
+
+    steps = statistics.get_steps()
+
+    assert len(steps) == 1
+    assert steps[0]["count"] == 4
+    assert steps[0]["hits"] == 4
+    assert steps[0]["cached"] == 2
+
+
+def test_match_statistics_sorts_steps_and_queries_by_number(app):
+    statistics = MatchStatistics()
+    statistics.connect(app)
+    try:
+        for step, query in [(10, 0), (2, 1), (2, None), (2, 0)]:
+            query_executed.send(app, **_measurements(step=step, query=query))
+    finally:
+        statistics.disconnect(app)
+
+    assert [(query["step"], query["query"]) for query in statistics.get_queries()] == [
+        (2, None),
+        (2, 0),
+        (2, 1),
+        (10, 0),
+    ]
+
+
+def test_match_statistics_ignores_other_apps(app):
+    statistics = MatchStatistics()
+    statistics.connect(app)
+    try:
+        query_executed.send(Flask("other"), **_measurements())
+    finally:
+        statistics.disconnect(app)
+
+    assert statistics.get_queries() == []
+
+
+def test_match_statistics_reset(app):
+    statistics = MatchStatistics()
+    statistics.connect(app)
+    try:
+        query_executed.send(app, **_measurements())
+    finally:
+        statistics.disconnect(app)
+
+    statistics.reset()
+
+    assert statistics.get_queries() == []
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of INSPIRE.
+# Copyright (C) 2014-2017 CERN.
+#
+# INSPIRE is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# INSPIRE is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with INSPIRE. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this license, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from inspire_matcher.core import compile
+from inspire_matcher.templates import QueryTemplate
+
+QUERIES = [
+    {"type": "exact", "path": "dois.value", "search_path": "dois.value.raw"},
+    {"type": "exact", "path": "control_number", "search_path": "control_number"},
+    {
+        "type": "fuzzy",
+        "clauses": [
+            {"path": "abstracts", "boost": 20},
+            {"path": "authors[:3]", "boost": 10},
+            {"path": "titles"},
+        ],
+    },
+    {
+        "type": "nested",
+        "paths": ["first_name", "last_name"],
+        "search_paths": ["authors.first_name", "authors.last_name"],
+        "operator": "AND",
+        "inner_hits": {"_source": ["authors.full_name"]},
+    },
+    {
+        "type": "nested-prefix",
+        "paths": [
+            "reference.publication_info.journal_title",
+            "reference.publication_info.journal_volume",
+        ],
+        "search_paths": [
+            "publication_info.journal_title",
+            "publication_info.journal_volume",
+        ],
+        "prefix_search_path": "publication_info.journal_title",
+    },
+    {"type": "author-names", "inner_hits": {"_source": ["authors.full_name"]}},
+]
+
+RECORDS = [
+    {},
+    {
+        "abstracts": [{"value": "We search for new phenomena."}],
+        "authors": [{"full_name": "Smith, John"}, {"full_name": "Doe, Jane"}],
+        "control_number": 1,
+        "dois": [{"value": "10.1000/first"}, {"value": "10.1000/second"}],
+        "first_name": "John",
+        "full_name": "Smith, John",
+        "last_name": "Smith",
+        "reference": {
+            "publication_info": {
+                "journal_title": "Phys.Rev.D.",
+                "journal_volume": "94",
+            },
+        },
+        "titles": [{"title": "Search for new phenomena"}],
+    },
+]
+
+
+@pytest.mark.parametrize(
+    ("collections", "match_deleted"),
+    [
+        (None, False),
+        (None, True),
+        (["Literature"], False),
+        (["Literature", "HAL Hidden"], True),
+    ],
+)
+@pytest.mark.parametrize("query", QUERIES)
+def test_query_template_fills_the_body_of_compile(query, collections, match_deleted):
+    template = QueryTemplate(query, collections, match_deleted)
+
+    for record in RECORDS:
+        if query["type"] == "author-names" and "full_name" not in record:
+            continue
+        assert template.fill(record) == compile(
+            query, record, collections=collections, match_deleted=match_deleted
+        )
+
+
+def test_query_template_shares_the_filter_among_bodies():
+    template = QueryTemplate(QUERIES[0], collections=["Literature"])
+
+    first = template.fill({"dois": [{"value": "10.1000/first"}]})
+    second = template.fill({"dois": [{"value": "10.1000/second"}]})
+
+    assert first["query"]["bool"]["filter"] is second["query"]["bool"]["filter"]
+    assert first["query"]["bool"]["must"] != second["query"]["bool"]["must"]
+
+
+def test_query_template_raises_on_malformed_nested_query():
+    query = {
+        "type": "nested",
+        "paths": ["first_name", "last_name"],
+        "search_paths": ["authors.first_name"],
+    }
+
+    with pytest.raises(ValueError, match="same length"):
+        QueryTemplate(query)
+
+
+def test_query_template_raises_on_fuzzy_path_with_a_dot():
+    template = QueryTemplate({"type": "fuzzy", "clauses": [{"path": "titles.title"}]})
+
+    assert template.fill({}) is None
+    with pytest.raises(ValueError, match="can't contain dots"):
+        template.fill({"titles": [{"title": "Search for new phenomena"}]})
+
+
+def test_query_template_raises_on_unknown_type():
+    template = QueryTemplate({"type": "unknown"})
+
+    with pytest.raises(NotImplementedError):
+        template.fill({})
@@ -24,7 +24,9 @@ from __future__ import absolute_import, division, print_function
 
 import pytest
 
+from inspire_matcher.config import MATCHER_AUTHOR_BLOCKING_THRESHOLD
 from inspire_matcher.utils import (
+    TitleScorer,
     compute_author_match_score,
     compute_jaccard_index,
     compute_title_score,
@@ -51,6 +53,108 @@ def test_get_number_of_author_matches():
     assert expected == result
 
 
+COLLABORATION_LAST_NAMES = [
+    "Aad",
+    "Abbott",
+    "Abdallah",
+    "Bach",
+    "Chen",
+    "García",
+    "Ivanov",
+    "Kim",
+    "Li",
+    "Müller",
+    "Novak",
+    "Rossi",
+    "Smith",
+    "Wang",
+    "Zhang",
+]
+COLLABORATION_FIRST_NAMES = ["Anna", "Bo", "Carlos", "Jie", "Maria", "Peter", "Wei"]
+
+
+def _get_collaboration_authors():
+    x_authors, y_authors = [], []
+    for i, last_name in enumerate(COLLABORATION_LAST_NAMES):
+        for j, first_name in enumerate(COLLABORATION_FIRST_NAMES):
+            if (i + j) % 3 == 0:
+                continue
+            x_authors.append({"full_name": "%s, %s" % (last_name, first_name)})
+            if (i + j) % 5 == 0:
+                continue
+            if (i + j) % 4 == 0:
+                first_name = first_name[0] + "."
+            author = {"full_name": "%s, %s" % (last_name, first_name)}
+            if j == 0:
+                author["ids"] = [{"schema": "ORCID", "value": "0000-%04d" % i}]
+                x_authors[-1]["ids"] = author["ids"]
+            y_authors.append(author)
+
+    return x_authors, list(reversed(y_authors))
+
+
+def test_get_number_of_author_matches_in_blocks(app):
+    x_authors, y_authors = _get_collaboration_authors()
+
+    app.config["MATCHER_AUTHOR_BLOCKING_THRESHOLD"] = None
+    try:
+        expected = get_number_of_author_matches(x_authors, y_authors)
+    finally:
+        app.config["MATCHER_AUTHOR_BLOCKING_THRESHOLD"] = 10
+
+    try:
+        result = get_number_of_author_matches(x_authors, y_authors)
+    finally:
+        app.config["MATCHER_AUTHOR_BLOCKING_THRESHOLD"] = (
+            MATCHER_AUTHOR_BLOCKING_THRESHOLD
+        )
+
+    assert len(x_authors) > 10
+    assert result == expected
+
+
+def test_get_number_of_author_matches_compares_paper_author_lists_in_full():
+    last_names = [
+        "Anderson", "Bertolini", "Castellano", "Dominguez", "Eriksson",
+        "Fitzgerald", "Gonzalez", "Hoffmann", "Ivanova", "Jorgensen",
+        "Kowalski", "Lindqvist", "Martinelli", "Nakamura", "Oliveira",
+        "Petersen", "Quintana", "Rasmussen", "Schneider", "Takahashi",
+        "Underwood", "Valentini", "Wojciechowski", "Yamamoto", "Zimmermann",
+    ]  # fmt: skip
+    x_authors = [{"full_name": "%s, John" % name} for name in last_names]
+    y_authors = [{"full_name": "%sx, John" % name} for name in last_names]
+
+    assert len(x_authors) > 20
+    assert get_number_of_author_matches(x_authors, y_authors) > 0
+
+
+def test_get_number_of_author_matches_in_blocks_matches_identifiers(app):
+    x_authors = [
+        {
+            "full_name": "Smith, John",
+            "ids": [{"schema": "INSPIRE BAI", "value": "J.Smith.1"}],
+        },
+        {"full_name": "Doe, Jane"},
+    ]
+    y_authors = [
+        {
+            "full_name": "Smith-Jones, J.",
+            "ids": [{"schema": "INSPIRE BAI", "value": "J.Smith.1"}],
+        },
+        {"full_name": "Roe, Richard"},
+    ]
+
+    app.config["MATCHER_AUTHOR_BLOCKING_THRESHOLD"] = 1
+    try:
+        result = get_number_of_author_matches(x_authors, y_authors)
+    finally:
+        app.config["MATCHER_AUTHOR_BLOCKING_THRESHOLD"] = (
+            MATCHER_AUTHOR_BLOCKING_THRESHOLD
+        )
+
+    assert result == 1
+
+
 def test_compute_author_match_score_matching_authors():
     x_authors = [
         {"full_name": "Cabibbo, Nicola"},
@@ -220,3 +324,25 @@ def test_compute_title_score_below_math_threshold():
     result = compute_title_score(title1, title2, threshold=0.5, math_threshold=0.3)
 
     assert result == 0.0
+
+
+TITLES = [
+    "Search for new phenomena in dijet events",
+    "Search for new phenomena in dijet events at 13 TeV",
+    "Measurement of the $W$ boson mass",
+    "Measurement of the <math>W</math> boson mass with the ATLAS detector",
+    "A completely unrelated title",
+    "",
+]
+
+
+@pytest.mark.parametrize("record_titles", [TITLES[:1], TITLES[1:3], TITLES])
+def test_title_scorer_gives_the_scores_of_compute_title_score(record_titles):
+    scorer = TitleScorer(record_titles)
+
+    for title in TITLES:
+        expected = max(
+            compute_title_score(record_title, title, 0.5, 0.3)
+            for record_title in record_titles
+        )
+        assert scorer.score([title], threshold=0.5, math_threshold=0.3) == expected